@@ -1,23 +1,29 @@
 from typing import List, Optional
 from uuid import UUID
 from datetime import date, datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination import Page, paginate
 
-from app.core.database import get_db_session
+from app.core.database import (
+    get_db_session, get_read_db_session, get_primary_read_db_session,
+    get_async_db_session, get_async_read_db_session, mark_read_your_writes
+)
 from app.schemas.appointment import (
     Appointment, AppointmentCreate, AppointmentUpdate,
     AvailableSlot, DailySchedule, DoctorScheduleRequest
 )
-from app.services.appointment_service import AppointmentService
+from app.schemas.change_feed import ChangeFeed
+from app.services.appointment_service import AppointmentService, AsyncAppointmentService
+from app.services.change_feed import ChangeFeedService, ChangeCursorExpiredError
 from app.api.deps import get_current_active_user, get_current_doctor
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
 @router.get("/", response_model=Page[Appointment])
 def read_appointments(
-    db: Session = Depends(get_db_session),
+    db: Session = Depends(get_read_db_session),
     skip: int = 0,
     limit: int = 100,
     patient_id: Optional[UUID] = Query(None),
@@ -56,25 +62,46 @@ def read_appointments(
     appointments = query.offset(skip).limit(limit).all()
     return paginate(appointments)
 
+@router.get("/changes", response_model=ChangeFeed[Appointment])
+def read_appointment_changes(
+    since: int = Query(0, ge=0, description="Курсор из предыдущего ответа"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_primary_read_db_session),
+    current_user: dict = Depends(get_current_active_user),
+):
+    """
+    Изменения записей после курсора (дельта-синхронизация).
+    Ответ 410 - курсор устарел, нужно заново загрузить список.
+    """
+    from app.models.appointment import Appointment as AppointmentModel
+    
+    try:
+        return ChangeFeedService(db).get_changes(AppointmentModel, since, limit)
+    except ChangeCursorExpiredError:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="История изменений устарела, требуется полная загрузка"
+        )
+
 @router.get("/available-slots/{doctor_id}")
-def get_available_slots(
+async def get_available_slots(
     doctor_id: UUID,
     target_date: date = Query(default_factory=date.today),
     duration_minutes: int = Query(30, ge=15, le=120),
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_async_read_db_session),
     current_user: dict = Depends(get_current_active_user),
 ) -> List[AvailableSlot]:
     """
     Получить доступные слоты для записи у врача.
     """
-    appointment_service = AppointmentService(db)
-    slots = appointment_service.find_available_slots(
+    appointment_service = AsyncAppointmentService(db)
+    slots = await appointment_service.find_available_slots(
         str(doctor_id), target_date, duration_minutes
     )
     
     # Получаем информацию о враче
     from app.models.doctor import Doctor
-    doctor = db.query(Doctor).get(doctor_id)
+    doctor = await db.get(Doctor, doctor_id)
     
     return [
         AvailableSlot(
@@ -87,18 +114,19 @@ def get_available_slots(
     ]
 
 @router.post("/", response_model=Appointment, status_code=status.HTTP_201_CREATED)
-def create_appointment(
+async def create_appointment(
     appointment_in: AppointmentCreate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db_session),
+    response: Response,
+    db: AsyncSession = Depends(get_async_db_session),
     current_user: dict = Depends(get_current_active_user),
 ):
     """
     Создать новую запись на прием.
     """
-    appointment_service = AppointmentService(db)
+    appointment_service = AsyncAppointmentService(db)
     
-    success, appointment, message = appointment_service.create_appointment(
+    success, appointment, message = await appointment_service.create_appointment(
         patient_id=str(appointment_in.patient_id),
         doctor_id=str(appointment_in.doctor_id),
         scheduled_start=appointment_in.scheduled_start,
@@ -119,6 +147,9 @@ def create_appointment(
         appointment_id=str(appointment.id)
     )
     
+    # Регистратура сразу открывает список записей - читаем его с основной, пока реплика не догонит
+    mark_read_your_writes(response)
+    
     return appointment
 
 @router.post("/check-availability")
@@ -210,17 +241,17 @@ def update_appointment(
     return appointment
 
 @router.post("/doctor-schedule", response_model=dict)
-def get_doctor_schedule(
+async def get_doctor_schedule(
     schedule_request: DoctorScheduleRequest,
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_async_read_db_session),
     current_doctor: dict = Depends(get_current_doctor),
 ):
     """
     Получить расписание врача на период.
     """
-    appointment_service = AppointmentService(db)
+    appointment_service = AsyncAppointmentService(db)
     
-    schedule = appointment_service.get_doctor_schedule(
+    schedule = await appointment_service.get_doctor_schedule(
         str(schedule_request.doctor_id),
         schedule_request.start_date,
         schedule_request.end_date
@@ -273,7 +304,7 @@ def cancel_appointment(
 @router.get("/upcoming")
 def get_upcoming_appointments(
     days_ahead: int = Query(7, ge=1, le=30),
-    db: Session = Depends(get_db_session),
+    db: Session = Depends(get_read_db_session),
     current_user: dict = Depends(get_current_active_user),
 ) -> List[Appointment]:
     """
@@ -2,28 +2,52 @@ from typing import List, Optional, Dict, Any
 from uuid import UUID
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Response
+import json
+import os
+import re
+import shutil
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Request, UploadFile, File
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination import Page, paginate
 
-from app.core.database import get_db_session
+from app.core.config import settings
+from app.core.database import (
+    get_db_session, get_read_db_session, get_primary_read_db_session,
+    get_report_db_session, get_async_db_session
+)
 from app.schemas.finance import (
     Invoice, InvoiceCreate, InvoiceUpdate, InvoiceItem,
     Payment, PaymentCreate, PaymentLinkRequest, PaymentLinkResponse,
-    FinancialReportRequest, AgingReportResponse, Service, ServiceCreate
+    FinancialReportRequest, AgingReportResponse, Service, ServiceCreate,
+    ExportJobRequest, ExportJob
 )
-from app.services.payment_service import PaymentService
-from app.services.report_service import ReportService
+from app.schemas.change_feed import ChangeFeed
+from app.services.change_feed import ChangeFeedService, ChangeCursorExpiredError
+from app.services.payment_service import PaymentService, AsyncPaymentService
+from app.services.payment_gateway import GatewayUnavailableError
+from app.services.report_service import ReportService, AsyncReportService, EXPORT_CHUNK_SIZE
+from app.services.webhook_inbox import WebhookInbox
+from app.services.export_jobs import ExportJobService, ExportJobStatus, EXPORT_FORMATS, FINISHED_STATUSES, job_channel
+from app.core.redis_client import async_redis_client
+from app.core.local_cache import two_tier_cache
+from app.services.report_cache import ReportCache
 from app.api.deps import get_current_active_user, get_current_admin
 
 router = APIRouter(prefix="/finance", tags=["finance"])
 
+# Прайс запрашивается на каждом экране записи и счета, а меняется редко
+SERVICES_CACHE_TTL = 3600
+SERVICES_CACHE_TAG = "services"
+
 # === ИНВОЙСЫ ===
 
 @router.get("/invoices", response_model=Page[Invoice])
 def read_invoices(
-    db: Session = Depends(get_db_session),
+    db: Session = Depends(get_read_db_session),
     skip: int = 0,
     limit: int = 100,
     patient_id: Optional[UUID] = Query(None),
@@ -61,10 +85,31 @@ def read_invoices(
     invoices = query.offset(skip).limit(limit).all()
     return paginate(invoices)
 
+@router.get("/invoices/changes", response_model=ChangeFeed[Invoice])
+def read_invoice_changes(
+    since: int = Query(0, ge=0, description="Курсор из предыдущего ответа"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_primary_read_db_session),
+    current_user: dict = Depends(get_current_active_user),
+):
+    """
+    Изменения счетов после курсора (дельта-синхронизация).
+    Ответ 410 - курсор устарел, нужно заново загрузить список.
+    """
+    from app.models.finance import Invoice as InvoiceModel
+    
+    try:
+        return ChangeFeedService(db).get_changes(InvoiceModel, since, limit)
+    except ChangeCursorExpiredError:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="История изменений устарела, требуется полная загрузка"
+        )
+
 @router.get("/invoices/{invoice_id}", response_model=Invoice)
 def read_invoice(
     invoice_id: UUID,
-    db: Session = Depends(get_db_session),
+    db: Session = Depends(get_read_db_session),
     current_user: dict = Depends(get_current_active_user),
 ):
     """
@@ -131,6 +176,8 @@ def create_invoice(
     db.commit()
     db.refresh(invoice)
     
+    ReportCache.invalidate_for_invoice(invoice)
+    
     return invoice
 
 @router.put("/invoices/{invoice_id}", response_model=Invoice)
@@ -168,6 +215,10 @@ def update_invoice(
     db.commit()
     db.refresh(invoice)
     
+    ReportCache.invalidate_for_invoice(invoice)
+    if invoice_in.status:
+        PaymentService.invalidate_payment_links(invoice.id)
+    
     return invoice
 
 # === ПЛАТЕЖИ ===
@@ -209,27 +260,31 @@ def create_payment(
     
     db.add(payment)
     
-    # Обновляем счет
-    invoice.add_payment(payment_in.amount, payment_in.payment_method, payment_in.notes)
+    # Обновляем счет (запись Payment уже создана выше)
+    invoice.apply_payment(payment_in.amount)
     
     db.commit()
     db.refresh(payment)
     
+    ReportCache.invalidate_for_invoice(invoice)
+    PaymentService.invalidate_payment_links(invoice.id)
+    
     return payment
 
 @router.post("/payment-link", response_model=PaymentLinkResponse)
-def create_payment_link(
+async def create_payment_link(
     link_request: PaymentLinkRequest,
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_async_db_session),
     current_user: dict = Depends(get_current_active_user),
 ):
     """
     Создать ссылку для онлайн оплаты.
+    Ожидание платежного шлюза не занимает поток (async сессия и клиент шлюза).
     """
-    payment_service = PaymentService(db)
+    payment_service = AsyncPaymentService(db)
     
     try:
-        result = payment_service.create_payment_link(
+        result = await payment_service.create_payment_link(
             invoice_id=str(link_request.invoice_id),
             amount=link_request.amount,
             success_url=link_request.success_url,
@@ -244,6 +299,12 @@ def create_payment_link(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except GatewayUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Платежный шлюз недоступен, повторите попытку позже: {str(e)}",
+            headers={"Retry-After": str(int(settings.GATEWAY_BREAKER_RESET))}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -251,39 +312,42 @@ def create_payment_link(
         )
 
 @router.post("/payment-webhook")
-async def handle_payment_webhook(
+def handle_payment_webhook(
     payload: Dict[str, Any],
-    db: Session = Depends(get_db_session),
 ):
     """
     Вебхук для обработки уведомлений от платежной системы.
+    Событие проверяется и сохраняется во входящую очередь, платеж применяет воркер.
     """
-    payment_service = PaymentService(db)
-    
-    success, message = payment_service.process_webhook(payload)
-    
-    if not success:
+    if not PaymentService.verify_webhook_signature(payload):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=message
+            detail="Invalid signature"
         )
     
-    return {"status": "ok", "message": message}
+    entry_id = WebhookInbox.append(payload)
+    
+    # Не ждем beat, чтобы платеж отразился быстрее (при всплеске - один запуск на несколько секунд)
+    if WebhookInbox.request_drain():
+        from app.tasks.payment_tasks import drain_payment_webhooks
+        drain_payment_webhooks.delay()
+    
+    return {"status": "ok", "message": "accepted", "event_id": entry_id}
 
 # === ОТЧЕТЫ ===
 
 @router.post("/reports/financial")
-def get_financial_report(
+async def get_financial_report(
     report_request: FinancialReportRequest,
-    db: Session = Depends(get_db_session),
     current_user: dict = Depends(get_current_admin),
 ):
     """
     Получить финансовый отчет.
+    Кэш (AsyncRedisService) и секции (AsyncSession на каждую) не занимают потоки.
     """
-    report_service = ReportService(db)
+    report_service = AsyncReportService()
     
-    report = report_service.get_financial_overview(
+    report = await report_service.get_cached_financial_overview(
         start_date=report_request.start_date,
         end_date=report_request.end_date,
         group_by=report_request.group_by
@@ -293,7 +357,7 @@ def get_financial_report(
 
 @router.get("/reports/aging", response_model=AgingReportResponse)
 def get_aging_report(
-    db: Session = Depends(get_db_session),
+    db: Session = Depends(get_report_db_session),
     current_user: dict = Depends(get_current_admin),
 ):
     """
@@ -301,7 +365,7 @@ def get_aging_report(
     """
     report_service = ReportService(db)
     
-    report = report_service.generate_aging_report()
+    report = report_service.get_cached_aging_report()
     
     return AgingReportResponse(**report)
 
@@ -309,8 +373,8 @@ def get_aging_report(
 def export_financial_report(
     start_date: date = Query(default_factory=lambda: date.today() - timedelta(days=30)),
     end_date: date = Query(default_factory=date.today),
-    format: str = Query("excel", regex="^(excel|csv)$"),
-    db: Session = Depends(get_db_session),
+    format: str = Query("excel", regex="^(excel|csv|ndjson)$"),
+    db: Session = Depends(get_report_db_session),
     current_user: dict = Depends(get_current_admin),
 ):
     """
@@ -318,40 +382,248 @@ def export_financial_report(
     """
     report_service = ReportService(db)
     
-    excel_file = report_service.export_to_excel(start_date, end_date, "financial")
-    
     if format == "excel":
+        # Потоковая выгрузка без лимита строк и без сборки файла в памяти
         return StreamingResponse(
-            excel_file,
+            report_service.stream_financial_excel(start_date, end_date),
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={"Content-Disposition": f"attachment; filename=financial_report_{date.today()}.xlsx"}
         )
-    else:
-        # Конвертация в CSV
-        import pandas as pd
-        df = pd.read_excel(excel_file)
-        csv_data = df.to_csv(index=False)
-        
-        return Response(
-            content=csv_data,
-            media_type="text/csv",
+    elif format == "csv":
+        # CSV пишется напрямую из курсора, без промежуточного Excel
+        return StreamingResponse(
+            report_service.stream_financial_csv(start_date, end_date),
+            media_type="text/csv; charset=utf-8",
             headers={"Content-Disposition": f"attachment; filename=financial_report_{date.today()}.csv"}
         )
+    else:
+        return StreamingResponse(
+            report_service.stream_financial_ndjson(start_date, end_date),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename=financial_report_{date.today()}.ndjson"}
+        )
+
+# === ФОНОВЫЕ ВЫГРУЗКИ ===
+
+@router.post("/export-jobs", response_model=ExportJob, status_code=status.HTTP_202_ACCEPTED)
+def create_export_job(
+    job_request: ExportJobRequest,
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Поставить выгрузку финансового отчета в очередь.
+    Возвращает ID задачи для опроса статуса и скачивания.
+    """
+    from app.tasks.export_tasks import run_export_job
+    
+    job = ExportJobService.create_job(
+        "financial", job_request.format, job_request.start_date, job_request.end_date
+    )
+    run_export_job.delay(job["job_id"])
+    
+    return job
+
+@router.get("/export-jobs/{job_id}", response_model=ExportJob)
+def read_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Получить статус и прогресс выгрузки.
+    """
+    job = ExportJobService.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача выгрузки не найдена"
+        )
+    
+    return job
+
+@router.get("/export-jobs/{job_id}/events")
+async def export_job_events(
+    job_id: str,
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Подписка на прогресс выгрузки (Server-Sent Events).
+    Поток закрывается после завершения или ошибки задачи.
+    """
+    job = await run_in_threadpool(ExportJobService.get_job, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача выгрузки не найдена"
+        )
+    
+    async def event_stream():
+        pubsub = async_redis_client.pubsub()
+        await pubsub.subscribe(job_channel(job_id))
+        try:
+            # Состояние после подписки, чтобы не пропустить завершение между запросами
+            current = await run_in_threadpool(ExportJobService.get_job, job_id)
+            yield f"data: {json.dumps(current)}\n\n"
+            if not current or current["status"] in FINISHED_STATUSES:
+                return
+            
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=15)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                yield f"data: {message['data']}\n\n"
+                if json.loads(message["data"]).get("status") in FINISHED_STATUSES:
+                    break
+        finally:
+            await pubsub.reset()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/export-jobs/{job_id}/download")
+def download_export_job(
+    job_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Скачать готовый файл выгрузки (поддерживаются Range-запросы для докачки).
+    """
+    job = ExportJobService.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача выгрузки не найдена"
+        )
+    
+    if job["status"] != ExportJobStatus.DONE:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Выгрузка еще не готова (статус: {job['status']})"
+        )
+    
+    path = ExportJobService.file_path(job_id, job["format"])
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Файл выгрузки удален по сроку хранения"
+        )
+    
+    _, media_type = EXPORT_FORMATS[job["format"]]
+    return _file_range_response(path, request.headers.get("range"), media_type, job["filename"])
+
+def _file_range_response(path: str, range_header: Optional[str], media_type: str, filename: str):
+    """Отдача файла целиком или одного диапазона байт (206 Partial Content)"""
+    file_size = os.path.getsize(path)
+    start, end = 0, file_size - 1
+    status_code = status.HTTP_200_OK
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename={filename}"
+    }
+    
+    if range_header:
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+        if match and match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), file_size - 1) if match.group(2) else file_size - 1
+        elif match and match.group(2):
+            # Суффиксный диапазон: последние N байт
+            start = max(0, file_size - int(match.group(2)))
+        
+        if not match or not (match.group(1) or match.group(2)) or start > end:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Некорректный диапазон",
+                headers={"Content-Range": f"bytes */{file_size}"}
+            )
+        
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    
+    headers["Content-Length"] = str(end - start + 1)
+    
+    def iter_file():
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(EXPORT_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    
+    return StreamingResponse(iter_file(), status_code=status_code, media_type=media_type, headers=headers)
+
+# === СВЕРКА С ВЫПИСКАМИ ===
+
+@router.post("/reconciliation", status_code=status.HTTP_202_ACCEPTED)
+def upload_reconciliation_statement(
+    statement: UploadFile = File(...),
+    statement_format: str = Query("csv", regex="^(csv|mt940)$"),
+    date_tolerance_days: int = Query(2, ge=0, le=10),
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Загрузить выписку банка или эквайера и поставить сверку в очередь.
+    """
+    from app.tasks.payment_tasks import reconcile_statement
+    
+    upload_dir = os.path.join(settings.RECONCILIATION_DIR, "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f"{uuid.uuid4().hex}.{statement_format}")
+    
+    with open(path, "wb") as f:
+        shutil.copyfileobj(statement.file, f, EXPORT_CHUNK_SIZE)
+    
+    task = reconcile_statement.delay(path, statement_format, date_tolerance_days)
+    
+    return {"task_id": task.id, "status": "queued"}
+
+@router.get("/reconciliation/{task_id}")
+def read_reconciliation(
+    task_id: str,
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Получить статус сверки и сводку: совпавшие, неоднозначные и несопоставленные строки.
+    """
+    from app.tasks.payment_tasks import reconcile_statement
+    
+    result = reconcile_statement.AsyncResult(task_id)
+    if result.failed():
+        return {"task_id": task_id, "status": "failed", "error": str(result.result)}
+    if not result.ready():
+        return {"task_id": task_id, "status": "running"}
+    
+    return {"task_id": task_id, "status": "done", **result.result}
 
 # === УСЛУГИ ===
 
 @router.get("/services", response_model=List[Service])
 def read_services(
-    db: Session = Depends(get_db_session),
+    db: Session = Depends(get_primary_read_db_session),
     category: Optional[str] = Query(None),
     active_only: bool = Query(True),
     current_user: dict = Depends(get_current_active_user),
 ):
     """
     Получить список услуг.
+    Кэш заполняется с основной БД: отстающая реплика сразу после create_service вернула бы
+    прайс без новой услуги на SERVICES_CACHE_TTL. При попадании в кэш соединение не берется.
     """
     from app.models.finance import Service as ServiceModel
     
+    cache_key = f"services:{category or '*'}:{int(active_only)}"
+    cached = two_tier_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     query = db.query(ServiceModel)
     
     if category:
@@ -360,7 +632,8 @@ def read_services(
     if active_only:
         query = query.filter(ServiceModel.is_active == True)
     
-    services = query.order_by(ServiceModel.name).all()
+    services = [Service.model_validate(s).model_dump() for s in query.order_by(ServiceModel.name).all()]
+    two_tier_cache.set(cache_key, services, ttl=SERVICES_CACHE_TTL, tags=[SERVICES_CACHE_TAG])
     return services
 
 @router.post("/services", response_model=Service, status_code=status.HTTP_201_CREATED)
@@ -399,4 +672,6 @@ def create_service(
     db.commit()
     db.refresh(service)
     
+    two_tier_cache.invalidate_tags(SERVICES_CACHE_TAG)
+    
     return service
\ No newline at end of file
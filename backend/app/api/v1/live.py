@@ -0,0 +1,54 @@
+import asyncio
+from uuid import UUID
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.live_events import CLINIC_CHANNEL, doctor_channel, live_hub
+from app.api.deps import get_current_active_user
+
+router = APIRouter(prefix="/live", tags=["live"])
+
+def _event_stream(request: Request, channel: str) -> StreamingResponse:
+    async def stream():
+        queue = live_hub.subscribe(channel)
+        try:
+            # Клиент переподключается через 3 секунды после обрыва
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    data = await asyncio.wait_for(queue.get(), timeout=settings.LIVE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {data}\n\n"
+        finally:
+            live_hub.unsubscribe(channel, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/clinic")
+async def clinic_events(
+    request: Request,
+    current_user: dict = Depends(get_current_active_user),
+):
+    """
+    События клиники (Server-Sent Events): записи, счета и платежи.
+    Событие resync означает, что часть событий пропущена и данные нужно перечитать.
+    """
+    return _event_stream(request, CLINIC_CHANNEL)
+
+@router.get("/doctors/{doctor_id}")
+async def doctor_events(
+    doctor_id: UUID,
+    request: Request,
+    current_user: dict = Depends(get_current_active_user),
+):
+    """
+    События расписания врача (Server-Sent Events): создание, перенос, отмена и смена статуса записей.
+    """
+    return _event_stream(request, doctor_channel(doctor_id))
\ No newline at end of file
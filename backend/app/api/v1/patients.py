@@ -2,18 +2,21 @@ from typing import Any, List
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination import Page, add_pagination, paginate
 
-from app.core.database import get_db_session
-from app.crud.patient import patient as patient_crud
+from app.core.database import get_db_session, get_primary_read_db_session, get_async_read_db_session
+from app.crud.patient import patient as patient_crud, async_patient
 from app.schemas.patient import Patient, PatientCreate, PatientUpdate, PatientWithStats
+from app.schemas.change_feed import ChangeFeed
+from app.services.change_feed import ChangeFeedService, ChangeCursorExpiredError
 from app.api.deps import get_current_active_user
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 
 @router.get("/", response_model=Page[Patient])
-def read_patients(
-    db: Session = Depends(get_db_session),
+async def read_patients(
+    db: AsyncSession = Depends(get_async_read_db_session),
     skip: int = 0,
     limit: int = 100,
     search: str = Query(None, description="Поиск по имени, фамилии, телефону или email"),
@@ -23,27 +26,43 @@ def read_patients(
     """
     Получить список пациентов с пагинацией и поиском.
     """
-    patients = patient_crud.get_multi(
+    patients = await async_patient.get_multi(
         db, skip=skip, limit=limit, search=search, is_active=is_active
     )
     return paginate(patients)
 
+@router.get("/changes", response_model=ChangeFeed[Patient])
+def read_patient_changes(
+    since: int = Query(0, ge=0, description="Курсор из предыдущего ответа"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_primary_read_db_session),
+    current_user: dict = Depends(get_current_active_user),
+):
+    """
+    Изменения пациентов после курсора (дельта-синхронизация).
+    Ответ 410 - курсор устарел, нужно заново загрузить список.
+    """
+    from app.models.patient import Patient as PatientModel
+    
+    try:
+        return ChangeFeedService(db).get_changes(PatientModel, since, limit)
+    except ChangeCursorExpiredError:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="История изменений устарела, требуется полная загрузка"
+        )
+
 @router.get("/{patient_id}", response_model=PatientWithStats)
-def read_patient(
+async def read_patient(
     patient_id: UUID,
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_async_read_db_session),
     current_user: dict = Depends(get_current_active_user),
 ):
     """
     Получить пациента по ID со статистикой.
     """
-    stats = patient_crud.get_stats(db, patient_id=patient_id)
-    if not stats["patient"]:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пациент не найден"
-        )
-    return stats
+    # Для несуществующего пациента get_stats сам отвечает 404
+    return await async_patient.get_stats(db, patient_id=patient_id)
 
 @router.post("/", response_model=Patient, status_code=status.HTTP_201_CREATED)
 def create_patient(
@@ -0,0 +1,243 @@
+import pickle
+import struct
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+import lz4.frame
+import msgpack
+import orjson
+import zstandard
+
+from app.core.config import settings
+
+# Заголовок записи кэша: маркер, версия схемы, сериализатор, сжатие.
+# Запись без маркера (старый pickle), другой версии или неизвестного формата считается промахом.
+CACHE_MAGIC = 0xCA
+_HEADER = struct.Struct(">BHBB")
+
+class CacheSerializer:
+    """Сериализатор значений кэша; id пишется в заголовок записи и не должен меняться"""
+
+    id: int
+    name: str
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+# Типы расширений msgpack
+_EXT_DECIMAL = 1
+_EXT_DATE = 2
+_EXT_DATETIME = 3
+_EXT_TIME = 4
+_EXT_UUID = 5
+
+def _msgpack_default(obj):
+    # datetime проверяется раньше date: он его подкласс
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, date):
+        return msgpack.ExtType(_EXT_DATE, obj.isoformat().encode())
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(obj).encode())
+    if isinstance(obj, UUID):
+        return msgpack.ExtType(_EXT_UUID, obj.bytes)
+    if isinstance(obj, time):
+        return msgpack.ExtType(_EXT_TIME, obj.isoformat().encode())
+    raise TypeError(f"Тип {type(obj).__name__} не поддерживается кэшем")
+
+def _msgpack_ext_hook(code: int, data: bytes):
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == _EXT_UUID:
+        return UUID(bytes=data)
+    if code == _EXT_TIME:
+        return time.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+class MsgpackSerializer(CacheSerializer):
+    """msgpack с расширениями для Decimal, date, datetime, time и UUID (типы восстанавливаются)"""
+
+    id = 1
+    name = "msgpack"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        # strict_map_key=False: в отчетах встречаются словари с ключами-датами и числами
+        return msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+
+_JSON_TYPES = {
+    "decimal": Decimal,
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "time": time.fromisoformat,
+}
+
+def _orjson_default(obj):
+    if isinstance(obj, Decimal):
+        return {"$decimal": str(obj)}
+    if isinstance(obj, datetime):
+        return {"$datetime": obj.isoformat()}
+    if isinstance(obj, date):
+        return {"$date": obj.isoformat()}
+    if isinstance(obj, time):
+        return {"$time": obj.isoformat()}
+    raise TypeError(f"Тип {type(obj).__name__} не поддерживается кэшем")
+
+def _restore_json(value):
+    if isinstance(value, dict):
+        if len(value) == 1:
+            (tag, raw), = value.items()
+            if tag[:1] == "$" and tag[1:] in _JSON_TYPES:
+                return _JSON_TYPES[tag[1:]](raw)
+        return {key: _restore_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_restore_json(item) for item in value]
+    return value
+
+class OrjsonSerializer(CacheSerializer):
+    """
+    JSON через orjson: значения читаемы в redis-cli.
+    Decimal и даты восстанавливаются по тегам, UUID и ключи словарей возвращаются строками.
+    """
+
+    id = 2
+    name = "orjson"
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(
+            value,
+            default=_orjson_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+
+    def loads(self, data: bytes) -> Any:
+        value = orjson.loads(data)
+        # Обход для восстановления типов нужен, только если в записи есть теги
+        return _restore_json(value) if b'{"$' in data else value
+
+class PickleSerializer(CacheSerializer):
+    """Прежний формат: любые объекты, но чтение из общего Redis исполняет чужой код"""
+
+    id = 3
+    name = "pickle"
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+class CacheCompressor:
+    id: int
+    name: str
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+class ZstdCompressor(CacheCompressor):
+    id = 1
+    name = "zstd"
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.compress(data, 3)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zstandard.decompress(data)
+
+class Lz4Compressor(CacheCompressor):
+    id = 2
+    name = "lz4"
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4.frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4.frame.decompress(data)
+
+SERIALIZERS: Dict[str, CacheSerializer] = {
+    serializer.name: serializer for serializer in (MsgpackSerializer(), OrjsonSerializer(), PickleSerializer())
+}
+COMPRESSORS: Dict[str, CacheCompressor] = {
+    compressor.name: compressor for compressor in (ZstdCompressor(), Lz4Compressor())
+}
+_NO_COMPRESSION = 0
+
+class CacheCodec:
+    """
+    Кодирование значений кэша с заголовком.
+    Читаются записи любого известного сериализатора и сжатия, поэтому смена
+    настроек не требует очистки Redis; pickle читается, только если он выбран явно.
+    """
+
+    def __init__(
+        self,
+        serializer: str = "msgpack",
+        compression: str = "zstd",
+        compress_min_bytes: int = 2048,
+        schema_version: int = 1
+    ):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Неизвестный сериализатор кэша: {serializer}")
+        if compression != "none" and compression not in COMPRESSORS:
+            raise ValueError(f"Неизвестное сжатие кэша: {compression}")
+
+        self.serializer = SERIALIZERS[serializer]
+        self.compressor = COMPRESSORS.get(compression)
+        self.compress_min_bytes = compress_min_bytes
+        self.schema_version = schema_version
+
+        self._serializers = {
+            s.id: s for s in SERIALIZERS.values()
+            if not isinstance(s, PickleSerializer) or s is self.serializer
+        }
+        self._compressors = {c.id: c for c in COMPRESSORS.values()}
+
+    def encode(self, value: Any) -> bytes:
+        payload = self.serializer.dumps(value)
+        compression = _NO_COMPRESSION
+        if self.compressor and len(payload) >= self.compress_min_bytes:
+            compressed = self.compressor.compress(payload)
+            if len(compressed) < len(payload):
+                payload, compression = compressed, self.compressor.id
+        return _HEADER.pack(CACHE_MAGIC, self.schema_version, self.serializer.id, compression) + payload
+
+    def decode(self, data: bytes) -> Optional[Any]:
+        """Значение записи или None, если запись чужой версии или формата (промах кэша)"""
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, serializer_id, compression = _HEADER.unpack_from(data)
+        if magic != CACHE_MAGIC or version != self.schema_version:
+            return None
+
+        serializer = self._serializers.get(serializer_id)
+        if serializer is None:
+            return None
+
+        payload = data[_HEADER.size:]
+        if compression != _NO_COMPRESSION:
+            compressor = self._compressors.get(compression)
+            if compressor is None:
+                return None
+            payload = compressor.decompress(payload)
+        return serializer.loads(payload)
+
+cache_codec = CacheCodec(
+    serializer=settings.CACHE_SERIALIZER,
+    compression=settings.CACHE_COMPRESSION,
+    compress_min_bytes=settings.CACHE_COMPRESS_MIN_BYTES,
+    schema_version=settings.CACHE_SCHEMA_VERSION
+)
\ No newline at end of file
@@ -0,0 +1,28 @@
+from sqlalchemy import column, event, func, table
+
+# Таблицы, изменения которых попадают в ленту для синхронизации клиентов
+TRACKED_TABLES = {"patients", "appointments", "invoices"}
+
+# Только нужные для вставки колонки change_log: модель в app.models не импортируется,
+# чтобы app.core.database не тянул за собой пакет моделей
+_change_log = table("change_log", column("txid"), column("entity_type"), column("entity_id"), column("op"))
+
+def _record_changes(session, flush_context) -> None:
+    rows = []
+    for objects, op in ((session.new, "upsert"), (session.dirty, "upsert"), (session.deleted, "delete")):
+        for obj in objects:
+            table_name = getattr(obj, "__tablename__", None)
+            if table_name not in TRACKED_TABLES:
+                continue
+            if op == "upsert" and obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            rows.append({"entity_type": table_name, "entity_id": str(obj.id), "op": op})
+
+    if rows:
+        # Пишем в той же транзакции, что и само изменение
+        insert = _change_log.insert().values(txid=func.txid_current())
+        session.connection().execute(insert, rows)
+
+def track_changes(session_factory) -> None:
+    """Запись изменений пациентов, записей и счетов в change_log"""
+    event.listen(session_factory, "after_flush", _record_changes)
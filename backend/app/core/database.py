@@ -1,9 +1,20 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from contextlib import contextmanager
-from typing import Generator
+from fastapi import Request, Response
+from itertools import count
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional, Tuple
+import logging
+import threading
+import time
+from .change_log import track_changes
 from .config import settings
+from .live_events import publish_events_async, track_live_events
+from .monitoring import apply_deltas_async, track_business_metrics
 
 # Исправляю ошибку пула соединений из vivag3.0
 engine = create_engine(
@@ -16,6 +27,163 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Реплики только для чтения: отчеты, дашборды и списки не конкурируют с записью
+replica_engines = [
+    create_engine(url, pool_size=20, max_overflow=30, pool_pre_ping=True, echo=False)
+    for url in settings.DATABASE_REPLICA_URLS
+]
+
+READ_YOUR_WRITES_COOKIE = "read_primary"
+
+class ReplicaLagMonitor:
+    """Отставание реплик с кэшированием на REPLICA_LAG_CHECK_INTERVAL секунд"""
+
+    def __init__(self, max_lag: float = None, check_interval: float = None):
+        self.max_lag = settings.REPLICA_MAX_LAG if max_lag is None else max_lag
+        self.check_interval = settings.REPLICA_LAG_CHECK_INTERVAL if check_interval is None else check_interval
+        self._checked: Dict[int, Tuple[float, float]] = {}  # id(engine) -> (время проверки, отставание)
+        self._lock = threading.Lock()
+
+    def lag(self, replica) -> float:
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(id(replica))
+        if checked and now - checked[0] < self.check_interval:
+            return checked[1]
+
+        lag = self._measure(replica)
+        with self._lock:
+            self._checked[id(replica)] = (now, lag)
+        return lag
+
+    def is_usable(self, replica) -> bool:
+        return self.lag(replica) <= self.max_lag
+
+    @staticmethod
+    def _measure(replica) -> float:
+        try:
+            with replica.connect() as conn:
+                if conn.dialect.name != "postgresql":
+                    return 0.0  # SQLite-файлы в локальной проверке не реплицируются
+                # Проигранный до конца WAL означает отсутствие отставания, только пока приемник WAL
+                # подключен: после обрыва оба LSN замирают равными. Иначе (и когда статус не виден
+                # без pg_read_all_stats) отставание - время с последней проигранной транзакции.
+                lag = conn.execute(text(
+                    "SELECT CASE WHEN EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') "
+                    "AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )).scalar()
+                return float("inf") if lag is None else float(lag)
+        except Exception as e:
+            logging.getLogger(__name__).warning("Реплика %s недоступна: %s", replica.url, e)
+            return float("inf")
+
+replica_lag_monitor = ReplicaLagMonitor()
+
+class RoutingSession(Session):
+    """
+    Сессия чтения: SELECT уходят на реплику, запись и все после нее - на основную БД.
+    Реплика выбирается один раз на сессию, чтобы все запросы видели один снимок;
+    отстающие или недоступные реплики пропускаются, без реплик - чтение с основной.
+    """
+
+    _round_robin = count()
+
+    def __init__(self, primary=None, replicas: Optional[List] = None,
+                 lag_monitor: Optional[ReplicaLagMonitor] = None, use_primary: bool = False,
+                 read_only: bool = False, deferrable: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.primary = engine if primary is None else primary
+        self.replicas = replica_engines if replicas is None else replicas
+        self.lag_monitor = replica_lag_monitor if lag_monitor is None else lag_monitor
+        self.use_primary = use_primary
+        self.info["read_only"] = read_only
+        self.info["deferrable"] = deferrable
+        self._replica = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or getattr(clause, "is_dml", False):
+            # После записи сессия читает свои же изменения только с основной
+            self.use_primary = True
+        if self.use_primary:
+            return self.primary
+        if self._replica is None:
+            self._replica = self._choose_replica()
+        return self._replica
+
+    def _choose_replica(self):
+        if self.replicas:
+            start = next(self._round_robin)
+            for i in range(len(self.replicas)):
+                replica = self.replicas[(start + i) % len(self.replicas)]
+                if self.lag_monitor.is_usable(replica):
+                    return replica
+        return self.primary
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+def _begin_read_only(session, transaction, connection):
+    if not session.info.get("read_only") or connection.dialect.name != "postgresql":
+        return
+    if session.info.get("deferrable") and connection.engine is getattr(session, "primary", None):
+        # Длинный отчет ждет безопасный снимок и дальше не держит блокировок SSI и не может быть отменен
+        # из-за конфликта сериализации; на реплике SERIALIZABLE недоступен и не нужен
+        connection.exec_driver_sql("SET TRANSACTION ISOLATION LEVEL SERIALIZABLE, READ ONLY, DEFERRABLE")
+    else:
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+def _forbid_flush(session, flush_context, instances):
+    if session.info.get("read_only"):
+        raise InvalidRequestError("Сессия только для чтения: изменения не сохраняются")
+
+def enforce_read_only(session_factory) -> None:
+    """Сессии с info["read_only"] открывают READ ONLY транзакции и не выполняют flush"""
+    event.listen(session_factory, "after_begin", _begin_read_only)
+    event.listen(session_factory, "before_flush", _forbid_flush)
+
+# Асинхронный движок (asyncpg) для async эндпоинтов - не занимает потоки Starlette
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1),
+    pool_size=20,
+    max_overflow=30,
+    pool_pre_ping=True,
+    echo=False
+)
+
+class AsyncBridgeSession(Session):
+    """Синхронная сессия внутри AsyncSession; на нее вешаются те же события, что и на SessionLocal"""
+
+class AppAsyncSession(AsyncSession):
+    """
+    AsyncSession, которая после коммита сама отправляет бизнес-метрики и live-события
+    через redis.asyncio: синхронные обработчики after_commit выполнялись бы в event loop.
+    """
+
+    async def commit(self) -> None:
+        await super().commit()
+        await apply_deltas_async(self.sync_session)
+        await publish_events_async(self.sync_session)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AppAsyncSession,
+    autoflush=False,
+    expire_on_commit=False,  # В async нельзя лениво перечитать атрибуты после коммита
+    sync_session_class=AsyncBridgeSession
+)
+
+for session_factory in (SessionLocal, RoutingSession, AsyncBridgeSession):
+    # Для AsyncSession отправку после коммита выполняет AppAsyncSession.commit
+    on_commit = session_factory is not AsyncBridgeSession
+    # Счетчики пациентов, записей и выручки обновляются по факту коммитов
+    track_business_metrics(session_factory, on_commit=on_commit)
+    # Изменения записей, счетов и платежей уходят в каналы live:* для экранов регистратуры
+    track_live_events(session_factory, on_commit=on_commit)
+    # Лента изменений для дельта-синхронизации клиентов
+    track_changes(session_factory)
+    # GET-эндпоинты и отчеты работают в READ ONLY транзакциях
+    enforce_read_only(session_factory)
+
 @contextmanager
 def get_db() -> Generator[Session, None, None]:
     """Контекстный менеджер для сессий БД (исправляю утечки соединений)"""
@@ -32,4 +200,147 @@ def get_db() -> Generator[Session, None, None]:
 # Dependency для FastAPI
 def get_db_session():
     with get_db() as db:
-        yield db
\ No newline at end of file
+        yield db
+
+@contextmanager
+def get_read_db(use_primary: bool = False, deferrable: bool = False) -> Generator[Session, None, None]:
+    """
+    Сессия только для чтения: READ ONLY транзакция на реплике (use_primary - на основной).
+    Без commit: при закрытии соединение возвращается в пул, откат делает пул.
+    """
+    db = ReadSessionLocal(use_primary=use_primary, read_only=True, deferrable=deferrable)
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency для списков и карточек
+def get_read_db_session(request: Request):
+    # Клиент, только что записавший данные, читает с основной, пока реплика не догонит
+    with get_read_db(use_primary=READ_YOUR_WRITES_COOKIE in request.cookies) as db:
+        yield db
+
+# Dependency для чтения, которому нужна основная БД (ленты изменений)
+def get_primary_read_db_session():
+    with get_read_db(use_primary=True) as db:
+        yield db
+
+# Dependency для длинных отчетов и выгрузок
+def get_report_db_session(request: Request):
+    with get_read_db(use_primary=READ_YOUR_WRITES_COOKIE in request.cookies, deferrable=True) as db:
+        yield db
+
+def mark_read_your_writes(response: Response) -> None:
+    """Ближайшие READ_YOUR_WRITES_WINDOW секунд чтения клиента идут на основную БД"""
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE, "1",
+        max_age=settings.READ_YOUR_WRITES_WINDOW,
+        httponly=True,
+        samesite="lax"
+    )
+
+# Dependency для async эндпоинтов
+async def get_async_db_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+# Dependency для async эндпоинтов, которые только читают
+async def get_async_read_db_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal(info={"read_only": True}) as db:
+        yield db
+
+# Пул потоков для независимых агрегатов одного запроса (каждый на своем соединении)
+_section_executor = ThreadPoolExecutor(
+    max_workers=settings.PARALLEL_SECTION_WORKERS,
+    thread_name_prefix="db-section"
+)
+
+def _run_section(
+    section: Callable[[Session], Any],
+    timeout: Optional[float],
+    use_primary: bool,
+    started: Dict[str, float],
+    name: str
+) -> Any:
+    # С этого момента отсчитывается срок секции в run_parallel_sections
+    started[name] = time.monotonic()
+    db = ReadSessionLocal(use_primary=use_primary, read_only=True)
+    try:
+        if timeout and db.get_bind().dialect.name == "postgresql":
+            # Запрос, не уложившийся в срок, отменяет сам Postgres и соединение возвращается в пул
+            db.execute(text(f"SET LOCAL statement_timeout = {int(timeout * 1000)}"))
+        return section(db)
+    finally:
+        db.close()
+
+# SQLSTATE query_canceled: запрос отменен по statement_timeout
+_QUERY_CANCELED = "57014"
+
+def run_parallel_sections(
+    sections: Dict[str, Callable[[Session], Any]],
+    timeout: Optional[float] = None,
+    use_primary: bool = False
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Параллельное выполнение независимых секций отчета на отдельных сессиях чтения
+    (реплика, если есть; use_primary - основная БД).
+    Возвращает (результаты, ошибки): упавшая или не уложившаяся в timeout секция
+    попадает в ошибки и не роняет остальные.
+    Срок отсчитывается от начала выполнения секции, а не от постановки в общий пул:
+    секция, ждавшая за секциями других запросов, не считается просроченной. Но и ждать
+    в пуле она может не дольше timeout, поэтому вызов занимает не больше 2 * timeout.
+    Отданная как "timeout" секция дорабатывает в фоне до statement_timeout, ее результат отбрасывается.
+    """
+    timeout = settings.PARALLEL_SECTION_TIMEOUT if timeout is None else timeout
+    started: Dict[str, float] = {}
+    submitted = time.monotonic()
+    futures = {
+        name: _section_executor.submit(_run_section, section, timeout, use_primary, started, name)
+        for name, section in sections.items()
+    }
+
+    timed_out = set()
+    pending = set(futures.values())
+    while pending and timeout:
+        now = time.monotonic()
+        next_deadline = None
+        for name, future in futures.items():
+            if future not in pending:
+                continue
+            if future.done():
+                pending.discard(future)
+                continue
+            deadline = started.get(name, submitted) + timeout
+            if deadline <= now:
+                # Еще не начавшаяся секция снимается с очереди и не займет соединение
+                future.cancel()
+                pending.discard(future)
+                timed_out.add(name)
+            elif next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+        if pending:
+            _, pending = wait(pending, timeout=next_deadline - now, return_when=FIRST_COMPLETED)
+    if pending:
+        wait(pending)  # timeout=0: срок не ограничен
+
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for name, future in futures.items():
+        if name in timed_out:
+            errors[name] = "timeout"
+            continue
+        error = future.exception()
+        if error is None:
+            results[name] = future.result()
+        elif getattr(getattr(error, "orig", None), "pgcode", None) == _QUERY_CANCELED:
+            errors[name] = "timeout"
+        else:
+            logging.getLogger(__name__).warning("Секция %s завершилась с ошибкой: %s", name, error)
+            errors[name] = str(error)
+
+    return results, errors
\ No newline at end of file
@@ -0,0 +1,41 @@
+from decimal import Decimal
+from typing import Optional
+
+# Суммы позиции счета. Общие для свойств InvoiceItem и пакетной обработки строк
+# из запросов (чеки, реестры), чтобы чек и реестр не разошлись со счетом в копейках
+CENT = Decimal('0.01')
+
+def line_subtotal(quantity: Decimal, unit_price: Decimal) -> Decimal:
+    """Сумма без скидок и налогов"""
+    return (quantity * unit_price).quantize(CENT)
+
+def line_discount(subtotal: Decimal, discount_percent: Optional[Decimal], discount_amount: Optional[Decimal]) -> Decimal:
+    """Скидка: процент, но не больше фиксированной суммы, если она задана"""
+    discount_percent = discount_percent or Decimal('0')
+    discount_amount = discount_amount or Decimal('0')
+    if discount_percent > 0:
+        discount = (subtotal * discount_percent / 100).quantize(CENT)
+        return min(discount, discount_amount if discount_amount > 0 else discount)
+    return discount_amount.quantize(CENT)
+
+def line_tax_base(subtotal: Decimal, discount: Decimal) -> Decimal:
+    """База для расчета налога"""
+    return (subtotal - discount).quantize(CENT)
+
+def line_tax(tax_base: Decimal, tax_rate: Optional[Decimal]) -> Decimal:
+    """Сумма налога"""
+    if tax_rate and tax_rate > 0:
+        return (tax_base * tax_rate / 100).quantize(CENT)
+    return Decimal('0.00')
+
+def line_total(
+    quantity: Decimal,
+    unit_price: Decimal,
+    discount_percent: Optional[Decimal],
+    discount_amount: Optional[Decimal],
+    tax_rate: Optional[Decimal]
+) -> Decimal:
+    """Итоговая сумма позиции по значениям колонок, без загрузки ORM-объектов"""
+    subtotal = line_subtotal(quantity, unit_price)
+    tax_base = line_tax_base(subtotal, line_discount(subtotal, discount_percent, discount_amount))
+    return (tax_base + line_tax(tax_base, tax_rate)).quantize(CENT)
\ No newline at end of file
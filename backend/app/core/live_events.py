@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import event, inspect
+
+from app.core.config import settings
+from app.core.redis_client import redis_client, async_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Каналы Redis pub/sub: вся клиника и расписание отдельного врача
+LIVE_CHANNEL_PREFIX = "live:"
+CLINIC_CHANNEL = "live:clinic"
+
+def doctor_channel(doctor_id) -> str:
+    return f"live:doctor:{doctor_id}"
+
+def _value(value):
+    value = getattr(value, "value", value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    return str(value)
+
+def _changed(obj, attr: str) -> bool:
+    return inspect(obj).attrs[attr].history.has_changes()
+
+def _old_value(obj, attr: str):
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else None
+
+def _appointment_event(obj, kind: str) -> Dict[str, Any]:
+    return {
+        "type": f"appointment.{kind}",
+        "id": _value(obj.id),
+        "doctor_id": _value(obj.doctor_id),
+        "patient_id": _value(obj.patient_id),
+        "status": _value(obj.status),
+        "scheduled_start": _value(obj.scheduled_start),
+        "scheduled_end": _value(obj.scheduled_end),
+    }
+
+def _appointment_kind(obj) -> Optional[str]:
+    if _changed(obj, "status"):
+        return "cancelled" if _value(obj.status) == "cancelled" else "status_changed"
+    if _changed(obj, "scheduled_start") or _changed(obj, "scheduled_end") or _changed(obj, "doctor_id"):
+        return "rescheduled"
+    return None
+
+def _collect_events(session, flush_context) -> None:
+    """
+    События для экранов регистратуры из сохраненных записей, счетов и платежей.
+    Значения снимаются в момент flush, публикуются после коммита.
+    """
+    events: List[tuple] = session.info.setdefault("live_events", [])
+
+    for obj, kind in [(obj, "created") for obj in session.new] + [(obj, None) for obj in session.dirty]:
+        table = getattr(obj, "__tablename__", None)
+        if table == "appointments":
+            kind = kind or _appointment_kind(obj)
+            if kind is None:
+                continue
+            payload = _appointment_event(obj, kind)
+            channels = {CLINIC_CHANNEL, doctor_channel(obj.doctor_id)}
+            if kind == "rescheduled" and _old_value(obj, "doctor_id") is not None:
+                # Запись ушла к другому врачу - старое расписание тоже должно обновиться
+                channels.add(doctor_channel(_old_value(obj, "doctor_id")))
+            events.extend((channel, payload) for channel in channels)
+        elif table == "invoices":
+            if kind is None and not (_changed(obj, "status") or _changed(obj, "paid_amount") or _changed(obj, "total_amount")):
+                continue
+            events.append((CLINIC_CHANNEL, {
+                "type": f"invoice.{kind or 'updated'}",
+                "id": _value(obj.id),
+                "invoice_number": obj.invoice_number,
+                "patient_id": _value(obj.patient_id),
+                "status": _value(obj.status),
+                "total_amount": _value(obj.total_amount),
+                "paid_amount": _value(obj.paid_amount),
+            }))
+        elif table == "payments":
+            if kind is None and not _changed(obj, "status"):
+                continue
+            events.append((CLINIC_CHANNEL, {
+                "type": f"payment.{kind or 'updated'}",
+                "id": _value(obj.id),
+                "invoice_id": _value(obj.invoice_id),
+                "amount": _value(obj.amount),
+                "status": _value(obj.status),
+            }))
+
+    for obj in session.deleted:
+        if getattr(obj, "__tablename__", None) == "appointments":
+            payload = _appointment_event(obj, "deleted")
+            events.extend((channel, payload) for channel in (CLINIC_CHANNEL, doctor_channel(obj.doctor_id)))
+
+def _publish_events(session) -> None:
+    events = session.info.pop("live_events", None)
+    if not events:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for channel, payload in events:
+            pipe.publish(channel, json.dumps(payload))
+        pipe.execute()
+    except Exception as e:
+        # Клиенты получат актуальное состояние при следующем переподключении
+        logger.warning("Не удалось опубликовать события: %s", e)
+
+async def publish_events_async(session) -> None:
+    """Публикация событий после коммита AsyncSession - без блокировки event loop"""
+    events = session.info.pop("live_events", None)
+    if not events:
+        return
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for channel, payload in events:
+                pipe.publish(channel, json.dumps(payload))
+            await pipe.execute()
+    except Exception as e:
+        logger.warning("Не удалось опубликовать события: %s", e)
+
+def _drop_events(session) -> None:
+    session.info.pop("live_events", None)
+
+def track_live_events(session_factory, on_commit: bool = True) -> None:
+    """
+    Подписка фабрики сессий на публикацию событий записей и оплат.
+    on_commit=False - события после коммита публикует вызывающий (publish_events_async).
+    """
+    event.listen(session_factory, "after_flush", _collect_events)
+    if on_commit:
+        event.listen(session_factory, "after_commit", _publish_events)
+    event.listen(session_factory, "after_rollback", _drop_events)
+
+class LiveHub:
+    """
+    Раздача событий подписчикам SSE внутри одного воркера.
+    На воркер одна подписка Redis (PSUBSCRIBE live:*), а каждый клиент -
+    только asyncio.Queue, поэтому тысячи простаивающих подключений почти ничего не стоят.
+    Отставшему клиенту очередь очищается и отправляется событие resync.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(channel)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[channel]
+
+    def _dispatch(self, channel: str, data: str) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(json.dumps({"type": "resync"}))
+
+    def _resync_all(self) -> None:
+        for channel in list(self._subscribers):
+            self._dispatch(channel, json.dumps({"type": "resync"}))
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = async_redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{LIVE_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Подписка на события прервана: %s", e)
+                # За время разрыва события могли потеряться
+                self._resync_all()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+live_hub = LiveHub()
\ No newline at end of file
@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+
+from app.core.cache_serialization import cache_codec
+from app.core.config import settings
+from app.core.monitoring import CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+from app.core.redis_client import redis_client, RedisService
+
+logger = logging.getLogger(__name__)
+
+# Канал, по которому воркеры узнают о записи и сбросе ключей кэша
+CACHE_INVALIDATE_CHANNEL = "cache:invalidate"
+
+class LocalCache:
+    """
+    Кэш в памяти процесса: LRU с TTL и ограничением по объему.
+    Объем считается по размеру записи в Redis - приблизительно, зато без обхода объектов.
+    Значения общие для всех запросов воркера, изменять их нельзя.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # ключ -> (срок по monotonic, размер, значение); порядок - от давно использованных к недавним
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        # Растет при каждом сбросе, даже если ключа в памяти не было
+        self._generation = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                CACHE_EVICTIONS.labels(tier="local", reason="expired").inc()
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value: Any, ttl: float, size: int, generation: Optional[int] = None) -> None:
+        """generation - значение self.generation до чтения из Redis; после сброса запись не сохраняется"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._remove(key)
+            # Крупная запись вытеснила бы большую часть кэша - такие читаются только из Redis
+            if ttl <= 0 or size > self.max_bytes // 4:
+                return
+
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                CACHE_EVICTIONS.labels(tier="local", reason="size").inc()
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            self._generation += 1
+            removed = sum(1 for key in keys if self._remove(key))
+        if removed:
+            CACHE_EVICTIONS.labels(tier="local", reason="invalidated").inc(removed)
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._size -= entry[1]
+        return True
+
+class TwoTierCache:
+    """
+    Двухуровневый кэш: память воркера (L1) перед Redis (L2), ключи как у RedisService.
+    Запись и сброс идут в Redis и рассылаются в канал cache:invalidate,
+    по которому остальные воркеры удаляют свои копии из L1.
+    Пока подписка на канал не активна, L1 не используется.
+    """
+
+    def __init__(self, local: LocalCache, local_ttl: float):
+        self.local = local
+        self.local_ttl = local_ttl
+        self._instance = uuid.uuid4().hex
+        self._listener_pid: Optional[int] = None
+        self._listener_lock = threading.Lock()
+        self._subscribed = False
+
+    def get(self, key: str) -> Optional[Any]:
+        use_local = self._local_enabled()
+        if use_local:
+            value = self.local.get(key)
+            if value is not None:
+                CACHE_HITS.labels(tier="local").inc()
+                return value
+            CACHE_MISSES.labels(tier="local").inc()
+            # Сброс, пришедший во время чтения из Redis, не должен быть перезаписан старым значением
+            generation = self.local.generation
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(f"cache:{key}")
+            pipe.pttl(f"cache:{key}")
+            data, pttl = pipe.execute()
+            value = cache_codec.decode(data) if data else None
+        except Exception:
+            return None
+
+        if value is None:
+            CACHE_MISSES.labels(tier="redis").inc()
+            return None
+
+        CACHE_HITS.labels(tier="redis").inc()
+        if use_local:
+            # Копия в памяти не переживает запись в Redis
+            ttl = self.local_ttl if pttl < 0 else min(self.local_ttl, pttl / 1000)
+            self.local.set(key, value, ttl, len(data), generation)
+        return value
+
+    def set(self, key: str, value: Any, ttl: int = 300, tags: Optional[Iterable[str]] = None) -> bool:
+        try:
+            data = cache_codec.encode(value)
+            RedisService.cache_set_encoded(key, data, ttl, tags)
+        except Exception:
+            return False
+
+        # Прежнее значение могло остаться в памяти других воркеров
+        self._publish([key])
+        if self._local_enabled():
+            self.local.set(key, value, min(ttl, self.local_ttl), len(data))
+        return True
+
+    def invalidate(self, *keys: str) -> None:
+        """
+        Сброс ключей. Вызывается после записи в БД, поэтому ошибка Redis только логируется:
+        копия в памяти сбрасывается в любом случае (после Redis, чтобы параллельное чтение
+        не вернуло в нее старое значение).
+        """
+        if not keys:
+            return
+        try:
+            redis_client.unlink(*[f"cache:{key}" for key in keys])
+        except Exception as e:
+            logger.warning("Не удалось сбросить ключи кэша в Redis: %s", e)
+        self.local.delete(*keys)
+        self._publish(list(keys))
+
+    def invalidate_tags(self, *tags: str) -> None:
+        """Сброс записей с тегами в Redis и в памяти всех воркеров"""
+        try:
+            keys = RedisService.invalidate_tags(*tags)
+        except Exception as e:
+            # Ключи с тегами известны только Redis - сбрасываем всю копию в памяти
+            logger.warning("Не удалось сбросить теги кэша %s в Redis: %s", tags, e)
+            self.local.clear()
+            return
+        if keys:
+            self.local.delete(*keys)
+            self._publish(keys)
+
+    def _origin(self) -> str:
+        # pid различает воркеры, созданные fork'ом из одного процесса
+        return f"{self._instance}:{os.getpid()}"
+
+    def _publish(self, keys: list) -> None:
+        try:
+            redis_client.publish(CACHE_INVALIDATE_CHANNEL, json.dumps({"origin": self._origin(), "keys": keys}))
+        except Exception as e:
+            # Без сообщения копии в других воркерах доживут до LOCAL_CACHE_TTL
+            logger.warning("Не удалось разослать сброс кэша: %s", e)
+
+    def _local_enabled(self) -> bool:
+        self._ensure_listener()
+        return self._subscribed
+
+    def _ensure_listener(self) -> None:
+        """Слушатель запускается в каждом процессе при первом обращении (потоки не переживают fork)"""
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._subscribed = False
+            self.local.clear()
+            threading.Thread(target=self._listen, name="cache-invalidate", daemon=True).start()
+            self._listener_pid = os.getpid()
+
+    def _listen(self) -> None:
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                pubsub.subscribe(CACHE_INVALIDATE_CHANNEL)
+                while True:
+                    # get_message с таймаутом не упирается в socket_timeout клиента
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "subscribe":
+                        # Сообщения до подписки или за время обрыва не восстановить - начинаем с пустого L1
+                        self.local.clear()
+                        self._subscribed = True
+                    elif message["type"] == "message":
+                        self._apply(message["data"])
+            except Exception as e:
+                self._subscribed = False
+                logger.warning("Подписка на сброс кэша прервана: %s", e)
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+    def _apply(self, data) -> None:
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            return
+        if payload.get("origin") != self._origin():
+            self.local.delete(*payload.get("keys", []))
+
+two_tier_cache = TwoTierCache(LocalCache(settings.LOCAL_CACHE_MAX_BYTES), settings.LOCAL_CACHE_TTL)
\ No newline at end of file
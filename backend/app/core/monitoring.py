@@ -1,9 +1,15 @@
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, REGISTRY
 from prometheus_client.exposition import MetricsHandler
 import time
+from collections import Counter as DeltaCounter
+from decimal import Decimal
 from functools import wraps
 from fastapi import Request, Response
-from typing import Callable
+from sqlalchemy import event, inspect
+from typing import Callable, Dict
+import logging
+
+from app.core.redis_client import redis_client, async_redis_client
 
 # Метрики для запросов
 REQUEST_COUNT = Counter(
@@ -55,6 +61,38 @@ REVENUE_TOTAL = Gauge(
     'Total revenue'
 )
 
+REVENUE_COLLECTED = Gauge(
+    'revenue_collected_total',
+    'Total collected payments'
+)
+
+# Метрики кэша: tier - local (память воркера) или redis
+CACHE_HITS = Counter(
+    'cache_hits_total',
+    'Cache hits',
+    ['tier']
+)
+
+CACHE_MISSES = Counter(
+    'cache_misses_total',
+    'Cache misses',
+    ['tier']
+)
+
+CACHE_EVICTIONS = Counter(
+    'cache_evictions_total',
+    'Entries removed from the in-process cache',
+    ['tier', 'reason']
+)
+
+REDIS_EVICTED_KEYS = Gauge(
+    'cache_redis_evicted_keys',
+    'Keys evicted by Redis maxmemory policy'
+)
+
+# Бизнес-счетчики общие для всех воркеров: хэш в Redis, суммы в копейках
+BUSINESS_METRICS_KEY = "metrics:business"
+
 def monitor_request(func: Callable):
     """Декоратор для мониторинга HTTP запросов"""
     @wraps(func)
@@ -102,40 +140,145 @@ def monitor_db_query(operation: str, table: str):
         return wrapper
     return decorator
 
-def update_business_metrics(db):
-    """Обновление бизнес-метрик"""
-    from app.models.patient import Patient
-    from app.models.appointment import Appointment
-    from app.models.finance import Invoice
-    
+def _cents(value) -> int:
+    return int(Decimal(str(value or 0)) * 100)
+
+def _status_value(status):
+    return getattr(status, "value", status)
+
+def _history(obj, attr: str, default=None):
+    """(старое, новое) значение атрибута в текущем flush; без изменений - (default, default)"""
+    history = inspect(obj).attrs[attr].history
+    if not history.added:
+        return default, default
+    return (history.deleted[0] if history.deleted else default), history.added[0]
+
+def _collect_deltas(session, flush_context) -> None:
+    """
+    Изменения бизнес-счетчиков из сохраненных объектов.
+    Копятся в сессии и уходят в Redis только после коммита.
+    """
+    deltas = session.info.setdefault("business_metric_deltas", DeltaCounter())
+
+    for obj in session.new:
+        table = getattr(obj, "__tablename__", None)
+        if table == "patients":
+            deltas["patients"] += 0 if obj.is_active is False else 1
+        elif table == "appointments":
+            deltas[f"appointments:{_status_value(obj.status) or 'scheduled'}"] += 1
+        elif table == "invoices":
+            deltas["revenue_cents"] += _cents(obj.total_amount)
+            deltas["collected_cents"] += _cents(obj.paid_amount)
+
+    for obj in session.dirty:
+        table = getattr(obj, "__tablename__", None)
+        if table == "patients":
+            old, new = _history(obj, "is_active", True)
+            deltas["patients"] += int(new is not False) - int(old is not False)
+        elif table == "appointments":
+            old, new = (_status_value(value) for value in _history(obj, "status"))
+            if old is not None and old != new:
+                deltas[f"appointments:{old}"] -= 1
+                deltas[f"appointments:{new}"] += 1
+        elif table == "invoices":
+            for attr, field in (("total_amount", "revenue_cents"), ("paid_amount", "collected_cents")):
+                old, new = _history(obj, attr)
+                if old is not None:
+                    deltas[field] += _cents(new) - _cents(old)
+
+    for obj in session.deleted:
+        table = getattr(obj, "__tablename__", None)
+        if table == "patients":
+            deltas["patients"] -= 0 if obj.is_active is False else 1
+        elif table == "appointments":
+            deltas[f"appointments:{_status_value(obj.status)}"] -= 1
+        elif table == "invoices":
+            deltas["revenue_cents"] -= _cents(obj.total_amount)
+            deltas["collected_cents"] -= _cents(obj.paid_amount)
+
+def _apply_deltas(session) -> None:
+    deltas = session.info.pop("business_metric_deltas", None)
+    if not deltas:
+        return
     try:
-        # Количество пациентов
-        patient_count = db.query(Patient).filter(Patient.is_active == True).count()
-        PATIENT_COUNT.set(patient_count)
-        
-        # Количество записей по статусам
-        from sqlalchemy import func
-        status_counts = db.query(
-            Appointment.status,
-            func.count(Appointment.id)
-        ).group_by(Appointment.status).all()
-        
-        for status, count in status_counts:
-            APPOINTMENT_COUNT.labels(status=status).set(count)
-        
-        # Общая выручка
-        total_revenue = db.query(func.sum(Invoice.total_amount)).scalar() or 0
-        REVENUE_TOTAL.set(float(total_revenue))
-        
+        pipe = redis_client.pipeline(transaction=False)
+        for field, delta in deltas.items():
+            if delta:
+                pipe.hincrby(BUSINESS_METRICS_KEY, field, delta)
+        pipe.execute()
+    except Exception as e:
+        # Потерянное изменение исправит сверка reconcile_business_metrics
+        logging.getLogger(__name__).warning("Не удалось обновить бизнес-метрики: %s", e)
+
+async def apply_deltas_async(session) -> None:
+    """Отправка накопленных изменений после коммита AsyncSession - без блокировки event loop"""
+    deltas = session.info.pop("business_metric_deltas", None)
+    if not deltas:
+        return
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for field, delta in deltas.items():
+                if delta:
+                    pipe.hincrby(BUSINESS_METRICS_KEY, field, delta)
+            await pipe.execute()
+    except Exception as e:
+        logging.getLogger(__name__).warning("Не удалось обновить бизнес-метрики: %s", e)
+
+def _drop_deltas(session) -> None:
+    session.info.pop("business_metric_deltas", None)
+
+def track_business_metrics(session_factory, on_commit: bool = True) -> None:
+    """
+    Подписка фабрики сессий на изменения пациентов, записей и счетов.
+    on_commit=False - изменения после коммита отправляет вызывающий (apply_deltas_async).
+    """
+    event.listen(session_factory, "after_flush", _collect_deltas)
+    if on_commit:
+        event.listen(session_factory, "after_commit", _apply_deltas)
+    event.listen(session_factory, "after_rollback", _drop_deltas)
+
+def set_business_metrics(totals: Dict[str, int]) -> None:
+    """Перезапись счетчиков точными значениями (сверка с итоговыми представлениями)"""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(BUSINESS_METRICS_KEY)
+    pipe.hset(BUSINESS_METRICS_KEY, mapping=totals)
+    pipe.execute()
+
+def update_business_metrics():
+    """Обновление бизнес-метрик из счетчиков в Redis (без запросов к БД)"""
+    try:
+        counters = redis_client.hgetall(BUSINESS_METRICS_KEY)
     except Exception as e:
         # Логируем ошибку, но не падаем
-        print(f"Error updating metrics: {e}")
+        logging.getLogger(__name__).warning("Error updating metrics: %s", e)
+        return
+
+    for field, value in counters.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        value = int(value)
+        if field == "patients":
+            PATIENT_COUNT.set(value)
+        elif field == "revenue_cents":
+            REVENUE_TOTAL.set(value / 100)
+        elif field == "collected_cents":
+            REVENUE_COLLECTED.set(value / 100)
+        elif field.startswith("appointments:"):
+            APPOINTMENT_COUNT.labels(status=field.split(":", 1)[1]).set(value)
+
+def update_cache_metrics():
+    """Вытеснения на стороне Redis считает сам сервер (INFO stats)"""
+    try:
+        REDIS_EVICTED_KEYS.set(redis_client.info("stats").get("evicted_keys", 0))
+    except Exception as e:
+        logging.getLogger(__name__).warning("Error updating cache metrics: %s", e)
 
 class MetricsEndpoint:
     """Endpoint для Prometheus метрик"""
     @staticmethod
     async def get_metrics():
         """Возвращает метрики в формате Prometheus"""
+        update_business_metrics()
+        update_cache_metrics()
         return Response(
             content=generate_latest(REGISTRY),
             media_type="text/plain"
@@ -1,24 +1,90 @@
 import redis
+import redis.asyncio
 from redis.lock import Lock
-from typing import Optional
-import pickle
+from typing import Optional, Any, Iterable, List
 import json
 from datetime import timedelta
 
+from app.core.cache_serialization import cache_codec
 from app.core.config import settings
 
 # Создаем подключение к Redis
 redis_client = redis.Redis.from_url(
     settings.REDIS_URL,
-    decode_responses=False,  # Для pickle объектов
+    decode_responses=False,  # Значения кэша - бинарные записи cache_serialization
     socket_timeout=5,
     socket_connect_timeout=5,
     retry_on_timeout=True
 )
 
+# Асинхронный клиент для подписок (pub/sub) из async эндпоинтов
+async_redis_client = redis.asyncio.Redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    socket_connect_timeout=5
+)
+
+# Асинхронный клиент кэша (тот же формат записей, что и у RedisService)
+async_cache_client = redis.asyncio.Redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=False,
+    socket_timeout=5,
+    socket_connect_timeout=5
+)
+
+# Теги кэша: множество tag:{тег} хранит ключи записей, сбрасываемых вместе
+# (например, все отчеты, период которых включает день счета).
+# Скрипты обращаются к ключам записей из множеств, поэтому рассчитаны на один экземпляр Redis, не на кластер.
+_SET_WITH_TAGS = """
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[1])
+local ttl = tonumber(ARGV[1])
+for i = 2, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    -- Тег живет не меньше самой долгой своей записи
+    if redis.call('TTL', KEYS[i]) < ttl then
+        redis.call('EXPIRE', KEYS[i], ttl)
+    end
+end
+return 1
+"""
+
+# Возвращает ключи удаленных записей, чтобы их можно было сбросить и в кэше воркеров
+_INVALIDATE_TAGS = """
+local removed = {}
+for _, tag in ipairs(KEYS) do
+    local members = redis.call('SMEMBERS', tag)
+    for i = 1, #members, 500 do
+        redis.call('UNLINK', unpack(members, i, math.min(i + 499, #members)))
+    end
+    for _, member in ipairs(members) do
+        removed[#removed + 1] = member
+    end
+    redis.call('UNLINK', tag)
+end
+return removed
+"""
+
+# Сколько ключей удалять одной командой при очистке по шаблону
+SCAN_BATCH_SIZE = 500
+
+def _tag_keys(tags: Iterable[str]) -> list:
+    return [f"tag:{tag}" for tag in tags]
+
+def _cache_keys(members: Iterable) -> List[str]:
+    """Ключи записей (без префикса cache:) из ответа скрипта сброса тегов"""
+    keys = []
+    for member in members:
+        if isinstance(member, bytes):
+            member = member.decode()
+        keys.append(member[len("cache:"):] if member.startswith("cache:") else member)
+    return keys
+
 class RedisService:
     """Сервис для работы с Redis (кэш, блокировки, очереди)"""
     
+    _set_with_tags = redis_client.register_script(_SET_WITH_TAGS)
+    _invalidate_tags = redis_client.register_script(_INVALIDATE_TAGS)
+    
     @staticmethod
     def get_lock(key: str, timeout: int = 10) -> Lock:
         """Получение блокировки для предотвращения race condition"""
@@ -34,27 +100,92 @@ class RedisService:
         try:
             data = redis_client.get(f"cache:{key}")
             if data:
-                return pickle.loads(data)
+                return cache_codec.decode(data)
+        except Exception:
+            pass
+        return None
+    
+    @staticmethod
+    def cache_set(key: str, value: Any, ttl: int = 300, tags: Optional[Iterable[str]] = None) -> bool:
+        """Сохранение данных в кэш; запись с тегами сбрасывается через invalidate_tags"""
+        try:
+            RedisService.cache_set_encoded(key, cache_codec.encode(value), ttl, tags)
+            return True
+        except Exception:
+            return False
+    
+    @staticmethod
+    def cache_set_encoded(key: str, data: bytes, ttl: int, tags: Optional[Iterable[str]] = None) -> None:
+        """Сохранение уже закодированной записи (ошибки Redis не перехватываются)"""
+        if tags:
+            RedisService._set_with_tags(keys=[f"cache:{key}", *_tag_keys(tags)], args=[ttl, data])
+        else:
+            redis_client.setex(f"cache:{key}", ttl, data)
+    
+    @staticmethod
+    def invalidate_tags(*tags: str) -> List[str]:
+        """Удаление всех записей с указанными тегами одним скриптом; возвращает их ключи"""
+        if not tags:
+            return []
+        return _cache_keys(RedisService._invalidate_tags(keys=_tag_keys(tags)))
+    
+    @staticmethod
+    def invalidate_pattern(pattern: str) -> int:
+        """
+        Инвалидация кэша по паттерну для записей без тегов.
+        SCAN идет порциями и не блокирует Redis, в отличие от KEYS.
+        """
+        removed = 0
+        batch = []
+        for key in redis_client.scan_iter(match=f"cache:{pattern}", count=SCAN_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                removed += redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            removed += redis_client.unlink(*batch)
+        return removed
+
+class AsyncRedisService:
+    """Кэш и блокировки RedisService для async кода (ключи и формат совпадают)"""
+    
+    _set_with_tags = async_cache_client.register_script(_SET_WITH_TAGS)
+    _invalidate_tags = async_cache_client.register_script(_INVALIDATE_TAGS)
+    
+    @staticmethod
+    def get_lock(key: str, timeout: int = 10):
+        return async_cache_client.lock(
+            f"lock:{key}",
+            timeout=timeout,
+            blocking_timeout=timeout
+        )
+    
+    @staticmethod
+    async def cache_get(key: str) -> Optional[Any]:
+        try:
+            data = await async_cache_client.get(f"cache:{key}")
+            if data:
+                return cache_codec.decode(data)
         except Exception:
             pass
         return None
     
     @staticmethod
-    def cache_set(key: str, value: Any, ttl: int = 300) -> bool:
-        """Сохранение данных в кэш"""
+    async def cache_set(key: str, value: Any, ttl: int = 300, tags: Optional[Iterable[str]] = None) -> bool:
         try:
-            redis_client.setex(
-                f"cache:{key}",
-                ttl,
-                pickle.dumps(value)
-            )
+            if tags:
+                await AsyncRedisService._set_with_tags(
+                    keys=[f"cache:{key}", *_tag_keys(tags)],
+                    args=[ttl, cache_codec.encode(value)]
+                )
+            else:
+                await async_cache_client.setex(f"cache:{key}", ttl, cache_codec.encode(value))
             return True
         except Exception:
             return False
     
     @staticmethod
-    def invalidate_pattern(pattern: str) -> None:
-        """Инвалидация кэша по паттерну"""
-        keys = redis_client.keys(f"cache:{pattern}")
-        if keys:
-            redis_client.delete(*keys)
\ No newline at end of file
+    async def invalidate_tags(*tags: str) -> List[str]:
+        if not tags:
+            return []
+        return _cache_keys(await AsyncRedisService._invalidate_tags(keys=_tag_keys(tags)))
\ No newline at end of file
@@ -1,7 +1,8 @@
 from typing import Optional, List, Dict, Any
 from uuid import UUID
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, select
 from fastapi import HTTPException, status
 from datetime import date, datetime, timedelta
 
@@ -9,6 +10,25 @@ from app.models.patient import Patient
 from app.schemas.patient import PatientCreate, PatientUpdate
 from app.core.security import get_password_hash
 
+def _patient_filters(search: Optional[str], is_active: Optional[bool]) -> list:
+    """Условия поиска пациентов (общие для sync и async версий)"""
+    filters = []
+    if search:
+        search_term = f"%{search}%"
+        filters.append(
+            or_(
+                Patient.first_name.ilike(search_term),
+                Patient.last_name.ilike(search_term),
+                Patient.phone.ilike(search_term),
+                Patient.email.ilike(search_term)
+            )
+        )
+    
+    if is_active is not None:
+        filters.append(Patient.is_active == is_active)
+    
+    return filters
+
 class CRUDPatient:
     def get(self, db: Session, patient_id: UUID) -> Optional[Patient]:
         """Получение пациента по ID (безопасно, исправляю SQL-инъекции из VIVAD)"""
@@ -29,19 +49,7 @@ class CRUDPatient:
         """Получение списка пациентов с фильтрацией и поиском"""
         query = db.query(Patient)
         
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Patient.first_name.ilike(search_term),
-                    Patient.last_name.ilike(search_term),
-                    Patient.phone.ilike(search_term),
-                    Patient.email.ilike(search_term)
-                )
-            )
-        
-        if is_active is not None:
-            query = query.filter(Patient.is_active == is_active)
+        query = query.filter(*_patient_filters(search, is_active))
         
         return query.offset(skip).limit(limit).all()
     
@@ -54,7 +62,16 @@ class CRUDPatient:
                 detail="Пациент с таким телефоном уже существует"
             )
         
-        db_obj = Patient(
+        db_obj = self._build(obj_in)
+        
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+    
+    @staticmethod
+    def _build(obj_in: PatientCreate) -> Patient:
+        return Patient(
             first_name=obj_in.first_name,
             last_name=obj_in.last_name,
             middle_name=obj_in.middle_name,
@@ -63,11 +80,6 @@ class CRUDPatient:
             birth_date=obj_in.birth_date,
             gender=obj_in.gender
         )
-        
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj
     
     def update(
         self, 
@@ -104,7 +116,7 @@ class CRUDPatient:
     def get_stats(self, db: Session, patient_id: UUID) -> Dict[str, Any]:
         """Получение статистики по пациенту"""
         from app.models.appointment import Appointment
-        from app.models.finance import FinancialRecord
+        from app.models.finance import Invoice
         
         patient = self.get(db, patient_id)
         if not patient:
@@ -133,11 +145,11 @@ class CRUDPatient:
         
         # Финансовая статистика
         financial_stats = db.query(
-            func.sum(FinancialRecord.total_amount).label('total_spent'),
-            func.sum(FinancialRecord.paid_amount).label('total_paid'),
-            func.sum(FinancialRecord.balance).label('total_debt')
+            func.sum(Invoice.total_amount).label('total_spent'),
+            func.sum(Invoice.paid_amount).label('total_paid'),
+            func.sum(Invoice.total_amount - Invoice.paid_amount).label('total_debt')
         ).filter(
-            FinancialRecord.patient_id == patient_id
+            Invoice.patient_id == patient_id
         ).first()
         
         return {
@@ -150,4 +162,105 @@ class CRUDPatient:
             "total_debt": float(financial_stats.total_debt or 0),
         }
 
-patient = CRUDPatient()
\ No newline at end of file
+patient = CRUDPatient()
+
+class AsyncCRUDPatient:
+    """Async версия CRUDPatient для эндпоинтов на AsyncSession"""
+    
+    async def get(self, db: AsyncSession, patient_id: UUID) -> Optional[Patient]:
+        return await db.get(Patient, patient_id)
+    
+    async def get_by_phone(self, db: AsyncSession, phone: str) -> Optional[Patient]:
+        result = await db.execute(select(Patient).where(Patient.phone == phone))
+        return result.scalars().first()
+    
+    async def get_multi(
+        self,
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        search: Optional[str] = None,
+        is_active: Optional[bool] = None
+    ) -> List[Patient]:
+        stmt = select(Patient).where(*_patient_filters(search, is_active)).offset(skip).limit(limit)
+        result = await db.execute(stmt)
+        return list(result.scalars().all())
+    
+    async def create(self, db: AsyncSession, obj_in: PatientCreate) -> Patient:
+        if await self.get_by_phone(db, obj_in.phone):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Пациент с таким телефоном уже существует"
+            )
+        
+        db_obj = CRUDPatient._build(obj_in)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+    
+    async def update(self, db: AsyncSession, db_obj: Patient, obj_in: PatientUpdate) -> Patient:
+        for field, value in obj_in.model_dump(exclude_unset=True).items():
+            setattr(db_obj, field, value)
+        
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+    
+    async def deactivate(self, db: AsyncSession, patient_id: UUID) -> Patient:
+        patient = await self.get(db, patient_id)
+        if not patient:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Пациент не найден"
+            )
+        
+        patient.is_active = False
+        await db.commit()
+        await db.refresh(patient)
+        return patient
+    
+    async def get_stats(self, db: AsyncSession, patient_id: UUID) -> Dict[str, Any]:
+        from app.models.appointment import Appointment
+        from app.models.finance import Invoice
+        
+        patient = await self.get(db, patient_id)
+        if not patient:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Пациент не найден"
+            )
+        
+        # Все счетчики одним запросом вместо четырех последовательных
+        appointments = (await db.execute(
+            select(
+                func.count(Appointment.id).label('total'),
+                func.max(Appointment.scheduled_start).filter(
+                    Appointment.status == 'completed'
+                ).label('last_visit'),
+                func.count(Appointment.id).filter(
+                    Appointment.scheduled_start > datetime.now(),
+                    Appointment.status.in_(['scheduled', 'confirmed'])
+                ).label('upcoming')
+            ).where(Appointment.patient_id == patient_id)
+        )).one()
+        
+        financial_stats = (await db.execute(
+            select(
+                func.sum(Invoice.total_amount).label('total_spent'),
+                func.sum(Invoice.paid_amount).label('total_paid'),
+                func.sum(Invoice.total_amount - Invoice.paid_amount).label('total_debt')
+            ).where(Invoice.patient_id == patient_id)
+        )).one()
+        
+        return {
+            "patient": patient,
+            "total_appointments": appointments.total or 0,
+            "last_visit": appointments.last_visit,
+            "upcoming_appointments": appointments.upcoming or 0,
+            "total_spent": float(financial_stats.total_spent or 0),
+            "total_paid": float(financial_stats.total_paid or 0),
+            "total_debt": float(financial_stats.total_debt or 0),
+        }
+
+async_patient = AsyncCRUDPatient()
\ No newline at end of file
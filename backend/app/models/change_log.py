@@ -0,0 +1,29 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Index, func
+from .base import Base
+
+class ChangeLog(Base):
+    """
+    Лента изменений для дельта-синхронизации клиентов.
+    Строки пишет app.core.change_log.track_changes в транзакции самого изменения.
+    Лента упорядочена по txid транзакции-писателя: курсор клиента - последний полученный txid.
+    """
+    __tablename__ = "change_log"
+
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    txid = Column(BigInteger, nullable=False)  # txid_current() записавшей транзакции
+    entity_type = Column(String(20), nullable=False)
+    entity_id = Column(String(64), nullable=False)
+    op = Column(String(10), nullable=False)  # upsert, delete
+    changed_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+
+    # Выборка "после курсора" по одному типу сущностей - диапазон по индексу
+    __table_args__ = (
+        Index('ix_change_log_entity_txid', 'entity_type', 'txid', 'seq'),
+    )
+
+class ChangeLogHorizon(Base):
+    """Граница очищенной истории: курсор ниже нее пропустил удаленные изменения"""
+    __tablename__ = "change_log_horizon"
+
+    id = Column(Integer, primary_key=True)
+    pruned_through = Column(BigInteger, nullable=False, default=0)  # Наибольший удаленный txid
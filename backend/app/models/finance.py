@@ -6,6 +6,7 @@ import enum
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import date, datetime
 
+from app.core.line_amounts import line_discount, line_subtotal, line_tax, line_tax_base
 from .base import Base, TimestampMixin
 
 class PaymentStatus(enum.Enum):
@@ -134,8 +135,10 @@ class Invoice(Base, TimestampMixin):
         if self.is_overdue and self.status != PaymentStatus.PAID:
             self.status = PaymentStatus.OVERDUE
     
-    def add_payment(self, amount: Decimal, method: PaymentMethod, notes: str = None):
-        """Добавление платежа (с транзакцией)"""
+    def apply_payment(self, amount: Decimal) -> Decimal:
+        """
+        Зачет суммы уже записанного платежа в счет (без создания Payment).
+        """
         amount = Decimal(amount).quantize(Decimal('0.01'))
         
         if amount <= 0:
@@ -144,6 +147,15 @@ class Invoice(Base, TimestampMixin):
         if amount > self.balance_due:
             raise ValueError("Сумма платежа превышает остаток долга")
         
+        self.paid_amount += amount
+        self._update_status()
+        
+        return amount
+    
+    def add_payment(self, amount: Decimal, method: PaymentMethod, notes: str = None):
+        """Добавление платежа (с транзакцией)"""
+        amount = self.apply_payment(amount)
+        
         # Создаем запись платежа
         payment = Payment(
             invoice_id=self.id,
@@ -153,8 +165,6 @@ class Invoice(Base, TimestampMixin):
         )
         
         self.payments.append(payment)
-        self.paid_amount += amount
-        self._update_status()
         
         return payment
 
@@ -186,27 +196,22 @@ class InvoiceItem(Base, TimestampMixin):
     @property
     def subtotal(self) -> Decimal:
         """Сумма без скидок и налогов"""
-        return (self.quantity * self.unit_price).quantize(Decimal('0.01'))
+        return line_subtotal(self.quantity, self.unit_price)
     
     @property
     def discount_total(self) -> Decimal:
         """Общая скидка на позицию"""
-        if self.discount_percent > 0:
-            discount = (self.subtotal * self.discount_percent / 100).quantize(Decimal('0.01'))
-            return min(discount, self.discount_amount if self.discount_amount > 0 else discount)
-        return self.discount_amount.quantize(Decimal('0.01'))
+        return line_discount(self.subtotal, self.discount_percent, self.discount_amount)
     
     @property
     def tax_base(self) -> Decimal:
         """База для расчета налога"""
-        return (self.subtotal - self.discount_total).quantize(Decimal('0.01'))
+        return line_tax_base(self.subtotal, self.discount_total)
     
     @property
     def tax_total(self) -> Decimal:
         """Сумма налога"""
-        if self.tax_rate > 0:
-            return (self.tax_base * self.tax_rate / 100).quantize(Decimal('0.01'))
-        return Decimal('0.00')
+        return line_tax(self.tax_base, self.tax_rate)
     
     @property
     def total(self) -> Decimal:
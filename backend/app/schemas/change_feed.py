@@ -0,0 +1,10 @@
+from typing import Generic, List, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+class ChangeFeed(BaseModel, Generic[T]):
+    cursor: int  # Передать как since в следующем запросе
+    upserts: List[T]
+    deleted: List[str]
+    has_more: bool  # Есть еще изменения - запросить сразу
\ No newline at end of file
@@ -128,6 +128,31 @@ class FinancialReportRequest(BaseModel):
             raise ValueError('Максимальный период - 1 год')
         return v
 
+class ExportJobRequest(BaseModel):
+    start_date: date
+    end_date: date = Field(default_factory=date.today)
+    format: str = Field(default="excel", pattern="^(excel|csv|ndjson)$")
+    
+    @validator('end_date')
+    def validate_date_range(cls, v, values):
+        if 'start_date' in values and v < values['start_date']:
+            raise ValueError('Дата окончания должна быть позже даты начала')
+        return v
+
+class ExportJob(BaseModel):
+    job_id: str
+    report_type: str
+    format: str
+    start_date: date
+    end_date: date
+    status: str
+    progress: int = 0
+    rows: int = 0
+    total: int = 0
+    filename: str
+    error: Optional[str] = None
+    created_at: datetime
+
 class AgingReportResponse(BaseModel):
     report_date: date
     aging_summary: List[Dict[str, Any]]
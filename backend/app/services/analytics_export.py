@@ -0,0 +1,108 @@
+from datetime import datetime
+from typing import Dict, Optional
+
+import pyarrow as pa
+from sqlalchemy.orm import Session
+
+from app.models.finance import Invoice, InvoiceItem, Payment
+from app.services import parquet_export
+from app.services.report_service import EXPORT_BATCH_SIZE
+
+MONEY = pa.decimal128(10, 2)
+PERCENT = pa.decimal128(5, 2)
+
+# Факты для аналитики: колонка в Parquet, выражение SQLAlchemy, тип Arrow.
+# partition_by - колонка, по месяцу которой раскладываются файлы.
+FINANCE_FACTS = {
+    "invoices": {
+        "columns": [
+            ("id", Invoice.id, pa.string()),
+            ("invoice_number", Invoice.invoice_number, pa.string()),
+            ("patient_id", Invoice.patient_id, pa.string()),
+            ("appointment_id", Invoice.appointment_id, pa.string()),
+            ("issue_date", Invoice.issue_date, pa.date32()),
+            ("due_date", Invoice.due_date, pa.date32()),
+            ("paid_date", Invoice.paid_date, pa.date32()),
+            ("subtotal", Invoice.subtotal, MONEY),
+            ("discount_amount", Invoice.discount_amount, MONEY),
+            ("discount_percent", Invoice.discount_percent, PERCENT),
+            ("tax_amount", Invoice.tax_amount, MONEY),
+            ("tax_rate", Invoice.tax_rate, PERCENT),
+            ("total_amount", Invoice.total_amount, MONEY),
+            ("paid_amount", Invoice.paid_amount, MONEY),
+            ("status", Invoice.status, pa.string()),
+            ("payment_method", Invoice.payment_method, pa.string()),
+            ("created_at", Invoice.created_at, pa.timestamp("us")),
+            ("updated_at", Invoice.updated_at, pa.timestamp("us")),
+        ],
+        "updated_at": Invoice.updated_at,
+        "partition_by": "issue_date",
+    },
+    "invoice_items": {
+        "columns": [
+            ("id", InvoiceItem.id, pa.string()),
+            ("invoice_id", InvoiceItem.invoice_id, pa.string()),
+            ("service_id", InvoiceItem.service_id, pa.string()),
+            ("issue_date", Invoice.issue_date, pa.date32()),
+            ("description", InvoiceItem.description, pa.string()),
+            ("quantity", InvoiceItem.quantity, pa.decimal128(10, 3)),
+            ("unit_price", InvoiceItem.unit_price, MONEY),
+            ("unit", InvoiceItem.unit, pa.string()),
+            ("discount_percent", InvoiceItem.discount_percent, PERCENT),
+            ("discount_amount", InvoiceItem.discount_amount, MONEY),
+            ("tax_rate", InvoiceItem.tax_rate, PERCENT),
+            ("tax_amount", InvoiceItem.tax_amount, MONEY),
+            ("created_at", InvoiceItem.created_at, pa.timestamp("us")),
+            ("updated_at", InvoiceItem.updated_at, pa.timestamp("us")),
+        ],
+        "join": (Invoice, InvoiceItem.invoice_id == Invoice.id),
+        "updated_at": InvoiceItem.updated_at,
+        "partition_by": "issue_date",
+    },
+    "payments": {
+        "columns": [
+            ("id", Payment.id, pa.string()),
+            ("invoice_id", Payment.invoice_id, pa.string()),
+            ("amount", Payment.amount, MONEY),
+            ("payment_method", Payment.payment_method, pa.string()),
+            ("transaction_id", Payment.transaction_id, pa.string()),
+            ("reference_number", Payment.reference_number, pa.string()),
+            ("status", Payment.status, pa.string()),
+            ("created_at", Payment.created_at, pa.timestamp("us")),
+            ("updated_at", Payment.updated_at, pa.timestamp("us")),
+        ],
+        "updated_at": Payment.updated_at,
+        "partition_by": "created_at",
+    },
+}
+
+class AnalyticsExportService:
+    """
+    Колоночная выгрузка финансовых фактов в Parquet для аналитиков.
+    Данные читаются серверным курсором пачками и пишутся record batch'ами
+    в файлы, разложенные по месяцам: {fact}/month=YYYY-MM/part-{run}.parquet.
+    Инкрементальный запуск выгружает строки с updated_at после водяной отметки,
+    которая с запасом отстает от прошлого запуска, поэтому одна и та же строка
+    может встретиться в нескольких файлах - актуальная версия та, у которой больше updated_at.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def export_all(self, output_dir: str, incremental: bool = True) -> Dict[str, int]:
+        """Выгрузка всех фактов. Возвращает количество строк по каждому факту"""
+        return {
+            fact: self.export_fact(fact, output_dir, incremental=incremental)
+            for fact in FINANCE_FACTS
+        }
+
+    def export_fact(self, fact: str, output_dir: str, incremental: bool = True) -> int:
+        """Выгрузка одного факта; водяная отметка сдвигается только после успешной записи"""
+        return parquet_export.export_fact(
+            self.db, fact, FINANCE_FACTS[fact], output_dir, EXPORT_BATCH_SIZE, incremental=incremental
+        )
+
+    @staticmethod
+    def get_watermark(fact: str) -> Optional[datetime]:
+        """С какого updated_at читает следующий инкрементальный запуск"""
+        return parquet_export.get_watermark(fact)
\ No newline at end of file
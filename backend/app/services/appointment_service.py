@@ -1,14 +1,19 @@
+import asyncio
+import logging
 from datetime import datetime, timedelta, date, time
 from typing import List, Optional, Tuple, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, not_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, not_, func, select
 from sqlalchemy.exc import IntegrityError
 import pytz
 from redis.lock import Lock
 
 from app.models.appointment import Appointment, AppointmentStatus
 from app.models.doctor import Doctor
-from app.core.redis_client import redis_client
+from app.core.redis_client import redis_client, async_cache_client
+
+logger = logging.getLogger(__name__)
 
 class AppointmentService:
     """Сервис управления записями (решаю проблему дублирования записей из Vivad2.0)"""
@@ -35,51 +40,12 @@ class AppointmentService:
             with redis_client.lock(lock_key, timeout=5, blocking_timeout=5):
                 # Проверяем рабочее время врача
                 doctor = self.db.query(Doctor).get(doctor_id)
-                if not doctor or not doctor.is_active:
-                    return False
-                
-                # Проверяем рабочий день
-                day_of_week = start_time.strftime('%A').lower()
-                if not doctor.is_available_on_day(day_of_week):
-                    return False
-                
-                # Проверяем рабочее время
-                work_start_str, work_end_str = doctor.get_work_hours(day_of_week)
-                if not work_start_str or not work_end_str:
+                if not self._fits_work_schedule(doctor, start_time, end_time):
                     return False
                 
-                work_start = datetime.combine(start_time.date(), 
-                                            time.fromisoformat(work_start_str))
-                work_end = datetime.combine(start_time.date(), 
-                                          time.fromisoformat(work_end_str))
-                
-                if start_time < work_start or end_time > work_end:
-                    return False
-                
-                # Проверяем перерыв
-                schedule = doctor.work_schedule.get(day_of_week)
-                if schedule.get("break"):
-                    break_start_str, break_end_str = schedule["break"].split("-")
-                    break_start = datetime.combine(start_time.date(), 
-                                                 time.fromisoformat(break_start_str))
-                    break_end = datetime.combine(start_time.date(), 
-                                               time.fromisoformat(break_end_str))
-                    
-                    if (start_time < break_end and end_time > break_start):
-                        return False
-                
                 # Проверяем существующие записи (исправляю ошибку логики из vivag3.0)
                 query = self.db.query(Appointment).filter(
-                    Appointment.doctor_id == doctor_id,
-                    Appointment.status.in_([
-                        AppointmentStatus.SCHEDULED.value,
-                        AppointmentStatus.CONFIRMED.value
-                    ]),
-                    # Проверяем пересечение временных интервалов
-                    and_(
-                        Appointment.scheduled_start < end_time,
-                        Appointment.scheduled_end > start_time
-                    )
+                    *self._conflicts_filter(doctor_id, start_time, end_time)
                 )
                 
                 if exclude_appointment_id:
@@ -94,6 +60,60 @@ class AppointmentService:
             print(f"Error checking availability: {e}")
             return False
     
+    @staticmethod
+    def _fits_work_schedule(doctor: Optional[Doctor], start_time: datetime, end_time: datetime) -> bool:
+        """Интервал внутри рабочего времени активного врача и не задевает перерыв"""
+        if not doctor or not doctor.is_active:
+            return False
+        
+        # Проверяем рабочий день
+        day_of_week = start_time.strftime('%A').lower()
+        if not doctor.is_available_on_day(day_of_week):
+            return False
+        
+        # Проверяем рабочее время
+        work_start_str, work_end_str = doctor.get_work_hours(day_of_week)
+        if not work_start_str or not work_end_str:
+            return False
+        
+        work_start = datetime.combine(start_time.date(), 
+                                    time.fromisoformat(work_start_str))
+        work_end = datetime.combine(start_time.date(), 
+                                  time.fromisoformat(work_end_str))
+        
+        if start_time < work_start or end_time > work_end:
+            return False
+        
+        # Проверяем перерыв
+        schedule = doctor.work_schedule.get(day_of_week)
+        if schedule.get("break"):
+            break_start_str, break_end_str = schedule["break"].split("-")
+            break_start = datetime.combine(start_time.date(), 
+                                         time.fromisoformat(break_start_str))
+            break_end = datetime.combine(start_time.date(), 
+                                       time.fromisoformat(break_end_str))
+            
+            if (start_time < break_end and end_time > break_start):
+                return False
+        
+        return True
+    
+    @staticmethod
+    def _conflicts_filter(doctor_id: str, start_time: datetime, end_time: datetime) -> list:
+        """Условия пересекающихся активных записей врача"""
+        return [
+            Appointment.doctor_id == doctor_id,
+            Appointment.status.in_([
+                AppointmentStatus.SCHEDULED.value,
+                AppointmentStatus.CONFIRMED.value
+            ]),
+            # Проверяем пересечение временных интервалов
+            and_(
+                Appointment.scheduled_start < end_time,
+                Appointment.scheduled_end > start_time
+            )
+        ]
+    
     def find_available_slots(
         self,
         doctor_id: str,
@@ -105,15 +125,30 @@ class AppointmentService:
         Исправляю ошибку неправильного расчета слотов из Vivad2.0.
         """
         doctor = self.db.query(Doctor).get(doctor_id)
-        if not doctor or not doctor.is_active:
+        window = self._work_window(doctor, target_date)
+        if window is None:
             return []
         
+        # Получаем существующие записи
+        work_start, work_end = window[0], window[1]
+        existing_appointments = self.db.query(Appointment).filter(
+            *self._day_appointments_filter(doctor_id, work_start, work_end)
+        ).order_by(Appointment.scheduled_start).all()
+        
+        return self._free_slots(window, existing_appointments, duration_minutes)
+    
+    @staticmethod
+    def _work_window(doctor: Optional[Doctor], target_date: date) -> Optional[tuple]:
+        """(начало, конец, начало перерыва, конец перерыва) рабочего дня врача или None"""
+        if not doctor or not doctor.is_active:
+            return None
+        
         # Получаем расписание врача на этот день
         day_of_week = target_date.strftime('%A').lower()
         schedule = doctor.work_schedule.get(day_of_week)
         
         if not schedule or not schedule.get("start") or not schedule.get("end"):
-            return []
+            return None
         
         # Парсим рабочее время
         work_start = datetime.combine(target_date, 
@@ -131,8 +166,11 @@ class AppointmentService:
             break_end = datetime.combine(target_date, 
                                        time.fromisoformat(break_end_str))
         
-        # Получаем существующие записи
-        existing_appointments = self.db.query(Appointment).filter(
+        return work_start, work_end, break_start, break_end
+    
+    @staticmethod
+    def _day_appointments_filter(doctor_id: str, work_start: datetime, work_end: datetime) -> list:
+        return [
             Appointment.doctor_id == doctor_id,
             Appointment.scheduled_start >= work_start,
             Appointment.scheduled_start <= work_end,
@@ -140,7 +178,12 @@ class AppointmentService:
                 AppointmentStatus.SCHEDULED.value,
                 AppointmentStatus.CONFIRMED.value
             ])
-        ).order_by(Appointment.scheduled_start).all()
+        ]
+    
+    @staticmethod
+    def _free_slots(window: tuple, existing_appointments: List[Appointment], duration_minutes: int) -> List[datetime]:
+        """Свободные слоты рабочего дня с учетом перерыва и существующих записей"""
+        work_start, work_end, break_start, break_end = window
         
         # Генерируем слоты
         slots = []
@@ -224,7 +267,8 @@ class AppointmentService:
             self.db.rollback()
             return False, None, f"Ошибка создания записи: {str(e)}"
     
-    def _schedule_reminders(self, appointment: Appointment):
+    @staticmethod
+    def _schedule_reminders(appointment: Appointment):
         """Планирование напоминаний о записи"""
         from app.tasks.notification_tasks import send_appointment_reminder
         
@@ -282,6 +326,15 @@ class AppointmentService:
             Appointment.scheduled_start <= end_date
         ).order_by(Appointment.scheduled_start).all()
         
+        return self._schedule_by_day(doctor_id, appointments, start_date, end_date)
+    
+    @staticmethod
+    def _schedule_by_day(
+        doctor_id: str,
+        appointments: List[Appointment],
+        start_date: date,
+        end_date: date
+    ) -> Dict[str, Any]:
         # Группируем по дням для удобства отображения
         schedule_by_day = {}
         current_date = start_date
@@ -299,4 +352,137 @@ class AppointmentService:
             "start_date": start_date.isoformat(),
             "end_date": end_date.isoformat(),
             "schedule": schedule_by_day
-        }
\ No newline at end of file
+        }
+
+class AsyncAppointmentService:
+    """Async версия AppointmentService для эндпоинтов на AsyncSession (правила те же)"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def check_availability(
+        self,
+        doctor_id: str,
+        start_time: datetime,
+        end_time: datetime,
+        exclude_appointment_id: Optional[str] = None
+    ) -> bool:
+        lock_key = f"appointment_lock:{doctor_id}:{start_time.timestamp()}"
+        
+        try:
+            async with async_cache_client.lock(lock_key, timeout=5, blocking_timeout=5):
+                doctor = await self.db.get(Doctor, doctor_id)
+                if not AppointmentService._fits_work_schedule(doctor, start_time, end_time):
+                    return False
+                
+                stmt = select(func.count(Appointment.id)).where(
+                    *AppointmentService._conflicts_filter(doctor_id, start_time, end_time)
+                )
+                if exclude_appointment_id:
+                    stmt = stmt.where(Appointment.id != exclude_appointment_id)
+                
+                return (await self.db.scalar(stmt)) == 0
+                
+        except Exception as e:
+            # Если не удалось получить блокировку, считаем что время занято
+            logger.warning("Error checking availability: %s", e)
+            return False
+    
+    async def find_available_slots(
+        self,
+        doctor_id: str,
+        target_date: date,
+        duration_minutes: int = 30
+    ) -> List[datetime]:
+        doctor = await self.db.get(Doctor, doctor_id)
+        window = AppointmentService._work_window(doctor, target_date)
+        if window is None:
+            return []
+        
+        result = await self.db.execute(
+            select(Appointment).where(
+                *AppointmentService._day_appointments_filter(doctor_id, window[0], window[1])
+            ).order_by(Appointment.scheduled_start)
+        )
+        return AppointmentService._free_slots(window, list(result.scalars().all()), duration_minutes)
+    
+    async def create_appointment(
+        self,
+        patient_id: str,
+        doctor_id: str,
+        scheduled_start: datetime,
+        notes: Optional[str] = None,
+        appointment_type: Optional[str] = None
+    ) -> Tuple[bool, Appointment, str]:
+        doctor = await self.db.get(Doctor, doctor_id)
+        if not doctor:
+            return False, None, "Врач не найден"
+        
+        duration = doctor.appointment_duration or timedelta(minutes=30)
+        scheduled_end = scheduled_start + duration
+        
+        if not await self.check_availability(doctor_id, scheduled_start, scheduled_end):
+            return False, None, "Время занято или врач недоступен"
+        
+        try:
+            appointment = Appointment(
+                patient_id=patient_id,
+                doctor_id=doctor_id,
+                scheduled_start=scheduled_start,
+                scheduled_end=scheduled_end,
+                notes=notes,
+                appointment_type=appointment_type,
+                status=AppointmentStatus.SCHEDULED.value
+            )
+            
+            self.db.add(appointment)
+            await self.db.commit()
+            await self.db.refresh(appointment)
+            
+            # apply_async синхронно ходит в брокер - не в event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, AppointmentService._schedule_reminders, appointment
+            )
+            
+            return True, appointment, "Запись создана успешно"
+            
+        except IntegrityError as e:
+            await self.db.rollback()
+            return False, None, f"Ошибка создания записи: {str(e)}"
+    
+    async def update_appointment_status(
+        self,
+        appointment_id: str,
+        status: AppointmentStatus,
+        notes: Optional[str] = None
+    ) -> bool:
+        appointment = await self.db.get(Appointment, appointment_id)
+        if not appointment:
+            return False
+        
+        appointment.status = status.value
+        if notes:
+            appointment.notes = notes
+        
+        if status == AppointmentStatus.COMPLETED:
+            appointment.actual_end = datetime.now()
+        
+        await self.db.commit()
+        return True
+    
+    async def get_doctor_schedule(
+        self,
+        doctor_id: str,
+        start_date: date,
+        end_date: date
+    ) -> Dict[str, Any]:
+        result = await self.db.execute(
+            select(Appointment).where(
+                Appointment.doctor_id == doctor_id,
+                Appointment.scheduled_start >= start_date,
+                Appointment.scheduled_start <= end_date
+            ).order_by(Appointment.scheduled_start)
+        )
+        return AppointmentService._schedule_by_day(
+            doctor_id, list(result.scalars().all()), start_date, end_date
+        )
\ No newline at end of file
@@ -0,0 +1,91 @@
+from datetime import timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.change_log import ChangeLog, ChangeLogHorizon
+
+class ChangeCursorExpiredError(Exception):
+    """Курсор старше хранимой истории - клиенту нужна полная загрузка"""
+
+class ChangeFeedService:
+    """
+    Лента изменений для дельта-синхронизации клиентов.
+    Клиент передает курсор (txid последней полученной транзакции) и получает
+    текущие версии измененных объектов и id удаленных.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_changes(self, model, since: int, limit: int = 500) -> Dict[str, Any]:
+        if since > 0 and since < self._pruned_through():
+            raise ChangeCursorExpiredError()
+
+        # Отдаются только транзакции младше xmin текущего снимка - они уже завершены.
+        # Все еще открытые получат txid не меньше xmin, поэтому курсор их не перепрыгнет.
+        committed = ChangeLog.txid < func.txid_snapshot_xmin(func.txid_current_snapshot())
+        query = self.db.query(ChangeLog.txid, ChangeLog.entity_id, ChangeLog.op).filter(
+            ChangeLog.entity_type == model.__tablename__,
+            committed
+        )
+        entries = query.filter(ChangeLog.txid > since).order_by(
+            ChangeLog.txid, ChangeLog.seq
+        ).limit(limit + 1).all()
+
+        has_more = len(entries) > limit
+        if has_more:
+            # Транзакция не делится между страницами: курсор - txid целиком отданной транзакции
+            cut = entries[limit].txid
+            entries = [entry for entry in entries[:limit] if entry.txid != cut]
+            if not entries:
+                entries = query.filter(ChangeLog.txid == cut).order_by(ChangeLog.seq).all()
+
+        # Для каждого объекта важна только последняя операция
+        last_ops: Dict[str, str] = {}
+        for entry in entries:
+            last_ops[entry.entity_id] = entry.op
+
+        id_type = model.id.type.python_type
+        upsert_ids = [id_type(entity_id) for entity_id, op in last_ops.items() if op == "upsert"]
+        upserts: List[Any] = []
+        if upsert_ids:
+            upserts = self.db.query(model).filter(model.id.in_(upsert_ids)).all()
+
+        found = {str(obj.id) for obj in upserts}
+        deleted = [entity_id for entity_id in last_ops if entity_id not in found]
+
+        return {
+            "cursor": entries[-1].txid if entries else since,
+            "upserts": upserts,
+            "deleted": deleted,
+            "has_more": has_more
+        }
+
+    def prune(self, retention_days: int) -> int:
+        """
+        Удаление истории старше retention_days.
+        Удаляются транзакции целиком до границы, граница сохраняется для проверки курсоров -
+        в том числе когда лента очищена полностью.
+        """
+        horizon = self.db.query(func.max(ChangeLog.txid)).filter(
+            ChangeLog.changed_at < func.now() - timedelta(days=retention_days)
+        ).scalar()
+        if horizon is None:
+            return 0
+
+        deleted = self.db.query(ChangeLog).filter(
+            ChangeLog.txid <= horizon
+        ).delete(synchronize_session=False)
+
+        state = self.db.get(ChangeLogHorizon, 1, with_for_update=True)
+        if state is None:
+            self.db.add(ChangeLogHorizon(id=1, pruned_through=horizon))
+        else:
+            state.pruned_through = max(state.pruned_through, horizon)
+        self.db.commit()
+        return deleted
+
+    def _pruned_through(self) -> int:
+        return self.db.query(ChangeLogHorizon.pruned_through).filter(ChangeLogHorizon.id == 1).scalar() or 0
\ No newline at end of file
@@ -0,0 +1,97 @@
+from datetime import date
+from typing import Any, Callable, Dict, Optional, Tuple
+import threading
+import time
+
+from redis.exceptions import LockError
+
+from app.core.config import settings
+from app.core.local_cache import two_tier_cache
+from app.core.redis_client import redis_client, RedisService
+
+# Часы для возраста записи (подменяются в тестах)
+_clock = time.time
+
+def with_cache_info(stats: Dict[str, Any], age: float) -> Dict[str, Any]:
+    """Ответ дашборда с возрастом данных: cache_age в секундах, cache_stale - идет фоновый пересчет"""
+    return {
+        **stats,
+        'cache_age': round(age, 1),
+        'cache_stale': age >= settings.DASHBOARD_CACHE_FRESH
+    }
+
+class DashboardCache:
+    """
+    Кэш статистики дашборда с отдачей устаревших данных (stale-while-revalidate).
+    Запись свежая DASHBOARD_CACHE_FRESH секунд; после этого она еще отдается
+    до DASHBOARD_CACHE_TTL, а пересчет один на все воркеры идет в фоне.
+    При пустом кэше параллельные запросы ждут один расчет.
+    """
+
+    @staticmethod
+    def _key(start_date: date, end_date: date) -> str:
+        return f"dashboard:{start_date.isoformat()}:{end_date.isoformat()}"
+
+    @staticmethod
+    def get_stats(
+        start_date: date,
+        end_date: date,
+        compute: Callable[[date, date], Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], float]:
+        """Статистика и ее возраст в секундах; compute(start_date, end_date) считает ее заново"""
+        key = DashboardCache._key(start_date, end_date)
+
+        entry = two_tier_cache.get(key)
+        if entry is not None:
+            age = _clock() - entry["computed_at"]
+            if age >= settings.DASHBOARD_CACHE_FRESH:
+                DashboardCache._refresh_in_background(key, lambda: compute(start_date, end_date))
+            return entry["data"], age
+
+        try:
+            with RedisService.get_lock(key, timeout=settings.DASHBOARD_CACHE_LOCK_TIMEOUT):
+                # Пока ждали блокировку, статистику мог посчитать другой запрос
+                entry = two_tier_cache.get(key)
+                if entry is not None:
+                    return entry["data"], _clock() - entry["computed_at"]
+
+                data = compute(start_date, end_date)
+                DashboardCache._store(key, data)
+                return data, 0.0
+        except LockError:
+            return compute(start_date, end_date), 0.0
+
+    @staticmethod
+    def _store(key: str, data: Dict[str, Any]) -> None:
+        if data.get("errors"):
+            # Неполную статистику не кэшируем: следующий запрос посчитает заново
+            return
+        two_tier_cache.set(
+            key, {"data": data, "computed_at": _clock()}, ttl=settings.DASHBOARD_CACHE_TTL
+        )
+
+    @staticmethod
+    def _refresh_in_background(key: str, compute: Callable[[], Dict[str, Any]]) -> Optional[threading.Thread]:
+        """Фоновый пересчет, если его еще не запустил другой запрос или воркер"""
+        if redis_client.exists(f"lock:refresh:{key}"):
+            return None
+
+        def refresh():
+            # Блокировка берется в самом потоке: Lock redis-py хранит токен в thread-local
+            lock = RedisService.get_lock(f"refresh:{key}", timeout=settings.DASHBOARD_CACHE_LOCK_TIMEOUT)
+            if not lock.acquire(blocking=False):
+                return
+            try:
+                DashboardCache._store(key, compute())
+            except Exception:
+                # Останутся устаревшие данные, следующий запрос попробует снова
+                pass
+            finally:
+                try:
+                    lock.release()
+                except LockError:
+                    pass
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        return thread
\ No newline at end of file
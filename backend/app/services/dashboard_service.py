@@ -0,0 +1,174 @@
+from datetime import date
+from typing import Any, Dict, List
+import copy
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.core.database import run_parallel_sections
+from app.models.appointment import AppointmentStatus
+from app.models.doctor import Doctor
+from app.models.finance import Invoice, PaymentStatus
+from app.models.patient import Patient
+from app.services.dashboard_views import daily_appointments_source, patient_totals_source
+
+def get_new_patients_count(db: Session, start_date: date, end_date: date) -> int:
+    """Получить количество новых пациентов за период"""
+    return db.query(Patient).filter(
+        Patient.created_at >= start_date,
+        Patient.created_at <= end_date
+    ).count()
+
+def _appointment_stats(db: Session, start_date: date, end_date: date) -> Dict[str, Any]:
+    """Статистика записей (из mv_daily_appointments)"""
+    view = daily_appointments_source(db).c
+    stats = db.query(
+        func.sum(view.appointments).label('total'),
+        func.sum(case((view.status == AppointmentStatus.COMPLETED, view.appointments), else_=0)).label('completed'),
+        func.sum(case((view.status == AppointmentStatus.CANCELLED, view.appointments), else_=0)).label('cancelled'),
+        func.sum(case((view.status == AppointmentStatus.NO_SHOW, view.appointments), else_=0)).label('no_show'),
+    ).filter(
+        view.day >= start_date,
+        view.day <= end_date
+    ).first()
+
+    return {
+        'total': stats.total or 0,
+        'completed': stats.completed or 0,
+        'cancelled': stats.cancelled or 0,
+        'no_show': stats.no_show or 0,
+        'completion_rate': (
+            (stats.completed or 0) / (stats.total or 1) * 100
+        ) if stats.total else 0
+    }
+
+def _patient_stats(db: Session, start_date: date, end_date: date) -> Dict[str, Any]:
+    """Статистика пациентов (из mv_patient_totals)"""
+    stats = db.query(patient_totals_source(db)).first()
+    if stats is None:
+        return {'total': 0, 'active': 0, 'with_appointments': 0}
+
+    return {
+        'total': stats.total,
+        'active': stats.active,
+        'with_appointments': stats.with_appointments
+    }
+
+def _finance_stats(db: Session, start_date: date, end_date: date) -> Dict[str, Any]:
+    """Финансовая статистика"""
+    stats = db.query(
+        func.sum(Invoice.total_amount).label('revenue'),
+        func.sum(Invoice.paid_amount).label('collected'),
+        func.sum(
+            case((Invoice.status == PaymentStatus.PAID, Invoice.total_amount), else_=0)
+        ).label('paid'),
+        func.sum(
+            case(
+                (Invoice.status == PaymentStatus.PENDING, Invoice.total_amount - Invoice.paid_amount),
+                else_=0
+            )
+        ).label('debt')
+    ).filter(
+        Invoice.issue_date >= start_date,
+        Invoice.issue_date <= end_date
+    ).first()
+
+    return {
+        'revenue': float(stats.revenue or 0),
+        'collected': float(stats.collected or 0),
+        'paid': float(stats.paid or 0),
+        'debt': float(stats.debt or 0),
+        'collection_rate': float(
+            (stats.collected or 0) / (stats.revenue or 1) * 100
+        ) if stats.revenue else 0
+    }
+
+def _daily_stats(db: Session, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    """Статистика по дням для графика (из mv_daily_appointments)"""
+    view = daily_appointments_source(db).c
+    rows = db.query(
+        view.day.label('date'),
+        func.sum(view.appointments).label('appointments'),
+        func.sum(case((view.status == AppointmentStatus.COMPLETED, view.appointments), else_=0)).label('completed')
+    ).filter(
+        view.day >= start_date,
+        view.day <= end_date
+    ).group_by(view.day).order_by(view.day).all()
+
+    return [
+        {
+            'date': stat.date.isoformat(),
+            'appointments': stat.appointments,
+            'completed': stat.completed or 0
+        }
+        for stat in rows
+    ]
+
+def _top_doctors(db: Session, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    """Топ врачей (из mv_daily_appointments)"""
+    view = daily_appointments_source(db).c
+    counts = db.query(
+        view.doctor_id,
+        func.sum(view.appointments).label('appointment_count')
+    ).filter(
+        view.day >= start_date,
+        view.day <= end_date
+    ).group_by(view.doctor_id).order_by(
+        func.sum(view.appointments).desc()
+    ).limit(5).subquery()
+
+    rows = db.query(Doctor, counts.c.appointment_count).join(
+        counts, Doctor.id == counts.c.doctor_id
+    ).order_by(counts.c.appointment_count.desc()).all()
+
+    return [
+        {
+            'id': str(doctor.id),
+            'name': f"{doctor.last_name} {doctor.first_name}",
+            'specialization': doctor.specialization,
+            'appointment_count': int(count)
+        }
+        for doctor, count in rows
+    ]
+
+# Секции дашборда и их значения, если секция упала или не уложилась в срок
+DASHBOARD_SECTIONS = {
+    'appointments': (_appointment_stats, {'total': 0, 'completed': 0, 'cancelled': 0, 'no_show': 0, 'completion_rate': 0}),
+    'patients': (_patient_stats, {'total': 0, 'active': 0, 'with_appointments': 0}),
+    'new_patients': (get_new_patients_count, 0),
+    'finance': (_finance_stats, {'revenue': 0.0, 'collected': 0.0, 'paid': 0.0, 'debt': 0.0, 'collection_rate': 0}),
+    'daily_stats': (_daily_stats, []),
+    'top_doctors': (_top_doctors, []),
+}
+
+def compute_dashboard_stats(start_date: date, end_date: date) -> Dict[str, Any]:
+    """
+    Расчет статистики дашборда.
+    Записи и пациенты читаются из материализованных представлений (см. dashboard_views),
+    поэтому отстают от таблиц на интервал их обновления.
+    Секции считаются параллельно на отдельных соединениях; упавшая секция
+    получает нулевые значения и перечисляется в 'errors'.
+    """
+    results, errors = run_parallel_sections({
+        name: (lambda db, section=section: section(db, start_date, end_date))
+        for name, (section, _) in DASHBOARD_SECTIONS.items()
+    })
+    sections = {
+        name: results.get(name, copy.deepcopy(default))
+        for name, (_, default) in DASHBOARD_SECTIONS.items()
+    }
+
+    stats = {
+        'period': {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        },
+        'appointments': sections['appointments'],
+        'patients': {**sections['patients'], 'new_patients': sections['new_patients']},
+        'finance': sections['finance'],
+        'daily_stats': sections['daily_stats'],
+        'top_doctors': sections['top_doctors']
+    }
+    if errors:
+        stats['errors'] = errors
+    return stats
\ No newline at end of file
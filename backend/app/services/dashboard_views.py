@@ -0,0 +1,145 @@
+from typing import Dict
+
+from sqlalchemy import Column, Date, Enum, Integer, MetaData, Numeric, Table, distinct, func, literal, select, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session
+
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.patient import Patient
+
+# Отдельные метаданные: представления создаются ensure_dashboard_views, а не create_all
+views_metadata = MetaData()
+
+# Записи по дням, врачам и статусам
+daily_appointments = Table(
+    "mv_daily_appointments", views_metadata,
+    Column("day", Date, primary_key=True),
+    Column("doctor_id", UUID(as_uuid=True), primary_key=True),
+    Column("status", Enum(AppointmentStatus, name="appointmentstatus", create_type=False), primary_key=True),
+    Column("appointments", Integer, nullable=False),
+)
+
+# Итоги по пациентам (одна строка)
+patient_totals = Table(
+    "mv_patient_totals", views_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("total", Integer, nullable=False),
+    Column("active", Integer, nullable=False),
+    Column("with_appointments", Integer, nullable=False),
+)
+
+# Итоги по счетам (одна строка)
+invoice_totals = Table(
+    "mv_invoice_totals", views_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("revenue", Numeric(14, 2), nullable=False),
+    Column("collected", Numeric(14, 2), nullable=False),
+)
+
+# Уникальный индекс обязателен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+DASHBOARD_VIEWS_DDL = [
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_daily_appointments AS
+    SELECT date(scheduled_start) AS day, doctor_id, status, count(*) AS appointments
+    FROM appointments
+    GROUP BY date(scheduled_start), doctor_id, status
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_daily_appointments
+    ON mv_daily_appointments (day, doctor_id, status)
+    """,
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_patient_totals AS
+    SELECT 1 AS id,
+           (SELECT count(*) FROM patients) AS total,
+           (SELECT count(*) FROM patients WHERE is_active) AS active,
+           (SELECT count(DISTINCT patient_id) FROM appointments) AS with_appointments
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_patient_totals ON mv_patient_totals (id)
+    """,
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_invoice_totals AS
+    SELECT 1 AS id,
+           coalesce(sum(total_amount), 0) AS revenue,
+           coalesce(sum(paid_amount), 0) AS collected
+    FROM invoices
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_invoice_totals ON mv_invoice_totals (id)
+    """,
+]
+
+DASHBOARD_VIEWS = ["mv_daily_appointments", "mv_patient_totals", "mv_invoice_totals"]
+
+# Те же колонки из таблиц - пока представления не созданы (до первого refresh_dashboard_views)
+live_daily_appointments = select(
+    func.date(Appointment.scheduled_start).label("day"),
+    Appointment.doctor_id.label("doctor_id"),
+    Appointment.status.label("status"),
+    func.count().label("appointments"),
+).group_by(
+    func.date(Appointment.scheduled_start), Appointment.doctor_id, Appointment.status
+).subquery("live_daily_appointments")
+
+live_patient_totals = select(
+    literal(1).label("id"),
+    select(func.count(Patient.id)).scalar_subquery().label("total"),
+    select(func.count(Patient.id)).where(Patient.is_active.is_(True)).scalar_subquery().label("active"),
+    select(func.count(distinct(Appointment.patient_id))).scalar_subquery().label("with_appointments"),
+).subquery("live_patient_totals")
+
+# Без блокировки: флаг меняется только с False на True, а параллельные потоки, увидевшие
+# False, просто повторят ту же проверку только для чтения и запишут тот же результат
+_views_ready = False
+
+def dashboard_views_ready(db: Session) -> bool:
+    """Созданы ли представления; положительный ответ запоминается на процесс"""
+    global _views_ready
+    if not _views_ready and db.get_bind().dialect.name == "postgresql":
+        _views_ready = all(
+            db.execute(text("SELECT to_regclass(:view) IS NOT NULL"), {"view": view}).scalar()
+            for view in DASHBOARD_VIEWS
+        )
+    return _views_ready
+
+def daily_appointments_source(db: Session):
+    return daily_appointments if dashboard_views_ready(db) else live_daily_appointments
+
+def patient_totals_source(db: Session):
+    return patient_totals if dashboard_views_ready(db) else live_patient_totals
+
+def ensure_dashboard_views(db: Session) -> None:
+    """Создание материализованных представлений дашборда (идемпотентно)"""
+    for statement in DASHBOARD_VIEWS_DDL:
+        db.execute(text(statement))
+    db.commit()
+
+def refresh_dashboard_views(db: Session) -> None:
+    """
+    Обновление представлений без блокировки чтения:
+    дашборд продолжает читать старые данные, пока строятся новые.
+    """
+    for view in DASHBOARD_VIEWS:
+        db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+        # Коммит после каждого представления, чтобы не держать блокировки обоих
+        db.commit()
+
+def load_business_totals(db: Session) -> Dict[str, int]:
+    """Значения бизнес-счетчиков (см. app.core.monitoring) из представлений"""
+    totals = {"patients": 0, "revenue_cents": 0, "collected_cents": 0}
+
+    patients = db.query(patient_totals.c.active).scalar()
+    totals["patients"] = patients or 0
+
+    invoices = db.query(invoice_totals).first()
+    if invoices is not None:
+        totals["revenue_cents"] = int(invoices.revenue * 100)
+        totals["collected_cents"] = int(invoices.collected * 100)
+
+    for status, count in db.query(
+        daily_appointments.c.status, func.sum(daily_appointments.c.appointments)
+    ).group_by(daily_appointments.c.status):
+        totals[f"appointments:{status.value}"] = int(count)
+
+    return totals
\ No newline at end of file
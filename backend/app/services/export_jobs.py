@@ -0,0 +1,122 @@
+from datetime import date, datetime
+from typing import Optional, Dict, Any
+import json
+import os
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+
+# Форматы фоновых выгрузок: расширение файла и MIME-тип
+EXPORT_FORMATS = {
+    "excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("csv", "text/csv; charset=utf-8"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+}
+
+class ExportJobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+FINISHED_STATUSES = (ExportJobStatus.DONE, ExportJobStatus.FAILED)
+
+def _job_key(job_id: str) -> str:
+    return f"export_job:{job_id}"
+
+def job_channel(job_id: str) -> str:
+    """Канал pub/sub с обновлениями прогресса задачи"""
+    return f"export_job:{job_id}:events"
+
+class ExportJobService:
+    """
+    Состояние фоновых выгрузок в Redis.
+    Статус и прогресс хранятся в hash, каждое обновление дублируется в pub/sub.
+    """
+
+    @staticmethod
+    def create_job(report_type: str, export_format: str, start_date: date, end_date: date) -> Dict[str, Any]:
+        """Регистрация новой задачи выгрузки (сама задача ставится в Celery отдельно)"""
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат выгрузки: {export_format}")
+
+        job_id = uuid.uuid4().hex
+        extension, _ = EXPORT_FORMATS[export_format]
+
+        job = {
+            "job_id": job_id,
+            "report_type": report_type,
+            "format": export_format,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "status": ExportJobStatus.QUEUED,
+            "progress": 0,
+            "rows": 0,
+            "total": 0,
+            "filename": f"{report_type}_report_{start_date}_{end_date}.{extension}",
+            "error": "",
+            "created_at": datetime.utcnow().isoformat(),
+        }
+
+        pipe = redis_client.pipeline()
+        pipe.hset(_job_key(job_id), mapping={k: str(v) for k, v in job.items()})
+        pipe.expire(_job_key(job_id), settings.EXPORT_JOB_TTL)
+        pipe.execute()
+
+        return job
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+        """Текущее состояние задачи или None, если задача не найдена или устарела"""
+        raw = redis_client.hgetall(_job_key(job_id))
+        if not raw:
+            return None
+
+        job = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in raw.items()
+        }
+        for field in ("progress", "rows", "total"):
+            job[field] = int(job.get(field) or 0)
+        return job
+
+    @staticmethod
+    def update_job(job_id: str, **fields) -> None:
+        """Обновление полей задачи с публикацией события для подписчиков; срок хранения продлевается"""
+        pipe = redis_client.pipeline()
+        pipe.hset(_job_key(job_id), mapping={k: str(v) for k, v in fields.items()})
+        pipe.expire(_job_key(job_id), settings.EXPORT_JOB_TTL)
+        pipe.publish(job_channel(job_id), json.dumps({"job_id": job_id, **fields}, default=str))
+        pipe.execute()
+
+    @staticmethod
+    def file_path(job_id: str, export_format: str) -> str:
+        """Путь к файлу выгрузки в локальном хранилище"""
+        extension, _ = EXPORT_FORMATS[export_format]
+        return os.path.join(settings.EXPORT_STORAGE_DIR, f"{job_id}.{extension}")
+
+    @staticmethod
+    def cleanup_files() -> int:
+        """
+        Удаление файлов выгрузок старше срока хранения; возвращает число удаленных.
+        Файлы (и .part) задачи, которая еще в очереди или выполняется, не удаляются:
+        XLSX пишется в .part только в конце, и его mtime не говорит о том, что задача жива.
+        """
+        storage = settings.EXPORT_STORAGE_DIR
+        if not os.path.isdir(storage):
+            return 0
+
+        expire_before = time.time() - settings.EXPORT_JOB_TTL
+        removed = 0
+        for name in os.listdir(storage):
+            path = os.path.join(storage, name)
+            if not os.path.isfile(path) or os.path.getmtime(path) >= expire_before:
+                continue
+            job = ExportJobService.get_job(name.split(".", 1)[0])
+            if job and job["status"] not in FINISHED_STATUSES:
+                continue
+            os.remove(path)
+            removed += 1
+        return removed
\ No newline at end of file
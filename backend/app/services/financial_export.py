@@ -0,0 +1,76 @@
+from io import StringIO
+from typing import BinaryIO, Iterable, Iterator
+import csv
+import json
+
+from openpyxl import Workbook
+
+# Потоковый экспорт: строк за одну выборку курсора и размер отдаваемых чанков
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+FINANCIAL_EXPORT_COLUMNS = [
+    "Номер счета", "Дата", "Пациент", "Сумма", "Скидка", "Налог",
+    "Итого", "Оплачено", "Долг", "Статус", "Способ оплаты"
+]
+
+def write_excel(rows: Iterable[tuple], output: BinaryIO) -> int:
+    """
+    Запись строк финансового отчета в XLSX в режиме write-only.
+    openpyxl сбрасывает строки на диск по мере записи, память не растет с отчетом.
+    Возвращает количество записанных строк.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Invoices")
+    sheet.append(FINANCIAL_EXPORT_COLUMNS)
+
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+
+    workbook.save(output)
+    return count
+
+def stream_csv(rows: Iterable[tuple], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """
+    Потоковый CSV из строк курсора.
+    Заголовок уходит сразу, дальше строки отдаются пачками по batch_size.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM, чтобы Excel корректно открыл кириллицу
+    buffer.write("\ufeff")
+    writer.writerow(FINANCIAL_EXPORT_COLUMNS)
+    yield _drain_buffer(buffer)
+
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield _drain_buffer(buffer)
+
+    tail = _drain_buffer(buffer)
+    if tail:
+        yield tail
+
+def stream_ndjson(rows: Iterable[tuple], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Потоковый NDJSON: одна строка JSON на счет (суммы строками без потери точности)"""
+    buffer = StringIO()
+
+    for i, row in enumerate(rows, 1):
+        buffer.write(json.dumps(dict(zip(FINANCIAL_EXPORT_COLUMNS, row)), ensure_ascii=False, default=str))
+        buffer.write("\n")
+        if i % batch_size == 0:
+            yield _drain_buffer(buffer)
+
+    tail = _drain_buffer(buffer)
+    if tail:
+        yield tail
+
+def _drain_buffer(buffer: StringIO) -> str:
+    """Забрать накопленный текст и очистить буфер"""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data
\ No newline at end of file
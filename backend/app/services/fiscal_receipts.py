@@ -0,0 +1,114 @@
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.finance import Invoice, InvoiceItem, PaymentStatus
+from app.models.patient import Patient
+from app.services.receipt_builder import build_signed_receipt
+
+# Сколько идентификаторов передается в одном IN (...)
+IN_CHUNK_SIZE = 1000
+
+def _chunks(values: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+class FiscalReceiptService:
+    """
+    Пакетная генерация чеков при закрытии дня.
+    Счета, позиции и пациенты загружаются несколькими запросами IN (...)
+    вместо ленивой загрузки по каждому счету, чеки собираются и подписываются
+    без обращения к БД и отправляются регистратору пачками NDJSON.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load_day(self, day: date) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]]]:
+        """Данные для чеков по счетам, оплаченным за день: (счет, позиции, клиент)"""
+        invoices = self.db.execute(
+            select(
+                Invoice.id, Invoice.invoice_number, Invoice.patient_id,
+                Invoice.paid_amount, Invoice.total_amount
+            ).where(
+                Invoice.paid_date == day,
+                Invoice.status == PaymentStatus.PAID
+            ).order_by(Invoice.invoice_number)
+        ).mappings().all()
+        if not invoices:
+            return []
+
+        items_by_invoice: Dict[Any, List[Dict[str, Any]]] = {}
+        for chunk in _chunks([inv["id"] for inv in invoices], IN_CHUNK_SIZE):
+            rows = self.db.execute(
+                select(
+                    InvoiceItem.invoice_id, InvoiceItem.description, InvoiceItem.quantity,
+                    InvoiceItem.unit_price, InvoiceItem.discount_percent,
+                    InvoiceItem.discount_amount, InvoiceItem.tax_rate
+                ).where(InvoiceItem.invoice_id.in_(chunk)).order_by(InvoiceItem.created_at)
+            ).mappings()
+            for row in rows:
+                items_by_invoice.setdefault(row["invoice_id"], []).append(dict(row))
+
+        clients: Dict[Any, Dict[str, Any]] = {}
+        patient_ids = list({inv["patient_id"] for inv in invoices})
+        for chunk in _chunks(patient_ids, IN_CHUNK_SIZE):
+            rows = self.db.execute(
+                select(Patient.id, Patient.email, Patient.phone).where(Patient.id.in_(chunk))
+            ).mappings()
+            for row in rows:
+                clients[row["id"]] = {"email": row["email"], "phone": row["phone"]}
+
+        return [
+            (dict(inv), items_by_invoice.get(inv["id"], []), clients.get(inv["patient_id"], {}))
+            for inv in invoices
+        ]
+
+    def build_day_receipts(self, day: date) -> List[Dict[str, Any]]:
+        """Подписанные чеки за день (порядок совпадает с порядком номеров счетов)"""
+        return [build_signed_receipt(row) for row in self.load_day(day)]
+
+    @staticmethod
+    async def send_receipts(
+        receipts: List[Dict[str, Any]],
+        url: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> int:
+        """
+        Отправка чеков регистратору потоком NDJSON.
+        Одновременно выполняется не больше concurrency запросов.
+        """
+        url = url or settings.FISCAL_REGISTRAR_URL
+        batch_size = batch_size or settings.RECEIPT_BATCH_SIZE
+        semaphore = asyncio.Semaphore(concurrency or settings.RECEIPT_SEND_CONCURRENCY)
+
+        async def ndjson(batch):
+            for receipt in batch:
+                yield (json.dumps(receipt, ensure_ascii=False) + "\n").encode()
+
+        async with httpx.AsyncClient(timeout=settings.GATEWAY_TIMEOUT) as client:
+            async def send(batch) -> int:
+                async with semaphore:
+                    response = await client.post(
+                        url, content=ndjson(batch),
+                        headers={"Content-Type": "application/x-ndjson"}
+                    )
+                    response.raise_for_status()
+                    return len(batch)
+
+            sent = await asyncio.gather(*(send(batch) for batch in _chunks(receipts, batch_size)))
+
+        return sum(sent)
+
+    def close_day(self, day: date) -> Dict[str, Any]:
+        """Сборка и отправка всех чеков за день"""
+        receipts = self.build_day_receipts(day)
+        sent = asyncio.run(self.send_receipts(receipts)) if receipts else 0
+        return {"day": day.isoformat(), "receipts": len(receipts), "sent": sent}
\ No newline at end of file
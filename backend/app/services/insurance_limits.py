@@ -0,0 +1,162 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Boolean, Date, Integer, Numeric, and_, case, column, func, or_, table, update, values
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session
+
+# Колонки insurance_contracts (модель InsuranceContract), которые читает и меняет резервирование.
+# Операторы строятся по Core-таблице: сервису не нужен пакет моделей, только SQL
+_contracts = table(
+    "insurance_contracts",
+    column("id", UUID(as_uuid=False)),
+    column("is_active", Boolean),
+    column("start_date", Date),
+    column("end_date", Date),
+    column("annual_limit", Numeric(10, 2)),
+    column("remaining_limit", Numeric(10, 2)),
+    column("visit_limit", Integer),
+    column("remaining_visits", Integer),
+)
+
+def _money(value) -> Decimal:
+    return Decimal(value).quantize(Decimal('0.01'))
+
+def _returned(remaining, amount, limit):
+    """Остаток после возврата: LEAST в Postgres пропускает NULL и ограничил бы безлимитный договор"""
+    restored = remaining + amount
+    return case(
+        (remaining.is_(None), None),
+        else_=func.least(restored, func.coalesce(limit, restored)),
+    )
+
+class InsuranceLimitService:
+    """
+    Резервирование лимитов страховых договоров.
+    Проверка и списание выполняются одним условным UPDATE ... RETURNING:
+    строка блокируется только на время этого оператора, поэтому параллельные
+    выставления счетов не ждут друг друга и не могут уйти в минус.
+    NULL в лимите означает отсутствие ограничения.
+    Сервис не фиксирует и не откатывает транзакцию: резервирование коммитится
+    вместе со счетом или заявкой, ради которых сделано, и откатывается вместе с ними.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _available(self, amount, visits, on_date: date):
+        """Условие: договор действует и остатка хватает"""
+        return and_(
+            _contracts.c.is_active.is_(True),
+            _contracts.c.start_date <= on_date,
+            _contracts.c.end_date >= on_date,
+            or_(_contracts.c.remaining_limit.is_(None), _contracts.c.remaining_limit >= amount),
+            or_(_contracts.c.remaining_visits.is_(None), _contracts.c.remaining_visits >= visits),
+        )
+
+    def reserve(
+        self,
+        contract_id: str,
+        amount: Decimal,
+        visits: int = 1,
+        on_date: Optional[date] = None
+    ) -> Tuple[Optional[Decimal], Optional[int]]:
+        """
+        Списание суммы и визитов с остатка договора.
+        Возвращает новые остатки; ValueError, если договор не действует или остатка не хватает.
+        """
+        amount = _money(amount)
+        stmt = (
+            update(_contracts)
+            .where(_contracts.c.id == contract_id, self._available(amount, visits, on_date or date.today()))
+            .values(
+                remaining_limit=_contracts.c.remaining_limit - amount,
+                remaining_visits=_contracts.c.remaining_visits - visits,
+            )
+            .returning(_contracts.c.remaining_limit, _contracts.c.remaining_visits)
+        )
+
+        row = self.db.execute(stmt).first()
+        if row is None:
+            raise ValueError("Недостаточно лимита по договору страхования или договор не действует")
+        return row.remaining_limit, row.remaining_visits
+
+    def release(self, contract_id: str, amount: Decimal, visits: int = 1) -> Tuple[Optional[Decimal], Optional[int]]:
+        """
+        Возврат суммы и визитов (отказ по заявке, частичное одобрение).
+        Остаток не поднимается выше годового лимита; NULL (без ограничения) остается NULL.
+        """
+        amount = _money(amount)
+        stmt = (
+            update(_contracts)
+            .where(_contracts.c.id == contract_id)
+            .values(
+                remaining_limit=_returned(_contracts.c.remaining_limit, amount, _contracts.c.annual_limit),
+                remaining_visits=_returned(_contracts.c.remaining_visits, visits, _contracts.c.visit_limit),
+            )
+            .returning(_contracts.c.remaining_limit, _contracts.c.remaining_visits)
+        )
+
+        row = self.db.execute(stmt).first()
+        if row is None:
+            raise ValueError("Договор страхования не найден")
+        return row.remaining_limit, row.remaining_visits
+
+    def reserve_batch(
+        self,
+        reservations: Iterable[Tuple[str, Decimal, int]],
+        on_date: Optional[date] = None
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Резервирование пачки (contract_id, сумма, визиты) одним UPDATE ... FROM (VALUES ...).
+        Суммы по одному договору складываются: договор принимается целиком или отклоняется.
+        Возвращает (принятые договоры, отклоненные договоры).
+        """
+        totals: Dict[str, List] = defaultdict(lambda: [Decimal('0.00'), 0])
+        for contract_id, amount, visits in reservations:
+            totals[str(contract_id)][0] += _money(amount)
+            totals[str(contract_id)][1] += visits
+        if not totals:
+            return [], []
+
+        requested = values(
+            column("contract_id", UUID(as_uuid=False)),
+            column("amount", Numeric(10, 2)),
+            column("visits", Integer),
+            name="requested",
+        ).data([(contract_id, amount, visits) for contract_id, (amount, visits) in totals.items()])
+
+        stmt = (
+            update(_contracts)
+            .where(
+                _contracts.c.id == requested.c.contract_id,
+                self._available(requested.c.amount, requested.c.visits, on_date or date.today()),
+            )
+            .values(
+                remaining_limit=_contracts.c.remaining_limit - requested.c.amount,
+                remaining_visits=_contracts.c.remaining_visits - requested.c.visits,
+            )
+            .returning(_contracts.c.id)
+        )
+
+        accepted = {str(contract_id) for contract_id in self.db.execute(stmt).scalars()}
+        rejected = [contract_id for contract_id in totals if contract_id not in accepted]
+        return sorted(accepted), rejected
+
+    def reserve_claims(self, claims: Iterable, on_date: Optional[date] = None) -> Tuple[List, List]:
+        """
+        Резервирование по заявкам за день (объекты с contract_id и amount_claimed, один визит на заявку).
+        Возвращает (принятые заявки, заявки по договорам, где лимита не хватило).
+        """
+        claims = list(claims)
+        accepted, _ = self.reserve_batch(
+            ((claim.contract_id, claim.amount_claimed, 1) for claim in claims),
+            on_date=on_date
+        )
+        accepted = set(accepted)
+        return (
+            [claim for claim in claims if str(claim.contract_id) in accepted],
+            [claim for claim in claims if str(claim.contract_id) not in accepted],
+        )
\ No newline at end of file
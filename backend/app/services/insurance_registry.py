@@ -0,0 +1,88 @@
+from datetime import date
+from typing import Dict, List, Optional
+import os
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.finance import InsuranceClaim, InsuranceContract, Invoice, InvoiceItem, Service
+from app.models.patient import Patient
+from app.services.registry_files import month_bounds, write_registries
+from app.services.report_service import EXPORT_BATCH_SIZE
+
+REGISTRY_COLUMNS = [
+    ("insurer", InsuranceContract.insurance_company),
+    ("contract_id", InsuranceContract.id),
+    ("contract_number", InsuranceContract.contract_number),
+    ("claim_id", InsuranceClaim.id),
+    ("claim_number", InsuranceClaim.claim_number),
+    ("submission_date", InsuranceClaim.submission_date),
+    ("amount_claimed", InsuranceClaim.amount_claimed),
+    ("status", InsuranceClaim.status),
+    ("last_name", Patient.last_name),
+    ("first_name", Patient.first_name),
+    ("middle_name", Patient.middle_name),
+    ("birth_date", Patient.birth_date),
+    ("invoice_number", Invoice.invoice_number),
+    ("service_code", Service.code),
+    ("description", InvoiceItem.description),
+    ("quantity", InvoiceItem.quantity),
+    ("unit_price", InvoiceItem.unit_price),
+    ("discount_percent", InvoiceItem.discount_percent),
+    ("discount_amount", InvoiceItem.discount_amount),
+    ("tax_rate", InvoiceItem.tax_rate),
+]
+
+class InsuranceRegistryService:
+    """
+    Ежемесячные реестры страховых заявок для страховых компаний.
+    Заявки читаются одним запросом с JOIN только нужных колонок, отсортированным
+    по страховой и договору, серверным курсором пачками; файлы реестров
+    дописываются по мере чтения, поэтому память не зависит от размера реестра.
+
+    Формат файла (разделитель ';', UTF-8):
+        H;номер реестра;период с;период по;страховая
+        C;номер договора
+        L;номер заявки;дата;ФИО;дата рождения;счет;код услуги;услуга;кол-во;цена;сумма
+        T;номер договора;количество заявок;сумма заявок
+        F;количество заявок;сумма заявок
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _rows(self, start: date, end: date):
+        stmt = (
+            select(*[expr.label(name) for name, expr in REGISTRY_COLUMNS])
+            .select_from(InsuranceClaim)
+            .join(InsuranceContract, InsuranceClaim.contract_id == InsuranceContract.id)
+            .join(Patient, InsuranceContract.patient_id == Patient.id)
+            .outerjoin(Invoice, InsuranceClaim.invoice_id == Invoice.id)
+            .outerjoin(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+            .outerjoin(Service, InvoiceItem.service_id == Service.id)
+            .where(
+                InsuranceClaim.submission_date >= start,
+                InsuranceClaim.submission_date <= end,
+                InsuranceClaim.status != "rejected",
+            )
+            .order_by(
+                InsuranceContract.insurance_company,
+                InsuranceContract.contract_number,
+                InsuranceClaim.claim_number,
+                InsuranceClaim.id,
+                InvoiceItem.created_at,
+            )
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for partition in self.db.execute(stmt).partitions():
+            yield from partition
+
+    def export_month(self, month: str, output_dir: Optional[str] = None) -> List[Dict[str, object]]:
+        """
+        Реестры за месяц, по файлу на страховую компанию.
+        Возвращает сводку по каждому файлу.
+        """
+        start, end = month_bounds(month)
+        output_dir = os.path.join(output_dir or settings.INSURANCE_REGISTRY_DIR, month)
+        return write_registries(self._rows(start, end), month, start, end, output_dir)
\ No newline at end of file
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import enum
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+
+def _watermark_key(fact: str) -> str:
+    return f"analytics_export:watermark:{fact}"
+
+def _to_arrow_value(value: Any, arrow_type: pa.DataType) -> Any:
+    """Приведение значения из БД к типу колонки Arrow (Decimal и даты остаются как есть)"""
+    if value is None:
+        return None
+    if isinstance(value, enum.Enum):
+        value = value.value
+    if pa.types.is_string(arrow_type):
+        return str(value)
+    return value
+
+def get_watermark(fact: str) -> Optional[datetime]:
+    """С какого updated_at читает следующий инкрементальный запуск"""
+    value = redis_client.get(_watermark_key(fact))
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode()
+    return datetime.fromisoformat(value)
+
+def export_fact(
+    db: Session,
+    fact: str,
+    spec: Dict[str, Any],
+    output_dir: str,
+    batch_size: int,
+    incremental: bool = True
+) -> int:
+    """
+    Выгрузка одного факта; водяная отметка сдвигается только после успешной записи.
+    updated_at ставится временем начала транзакции, а не коммита: строка, закоммиченная
+    после выгрузки, может оказаться старше последней выгруженной. Поэтому отметка
+    отстает от нее на ANALYTICS_WATERMARK_LAG, а повторно выгруженные строки
+    схлопываются по id.
+    """
+    since = get_watermark(fact) if incremental else None
+
+    rows, max_updated_at = write_partitions(db, fact, spec, output_dir, since, batch_size)
+
+    if max_updated_at:
+        watermark = max_updated_at - timedelta(seconds=settings.ANALYTICS_WATERMARK_LAG)
+        if since is None or watermark > since:
+            redis_client.set(_watermark_key(fact), watermark.isoformat())
+
+    return rows
+
+def write_partitions(
+    db: Session,
+    fact: str,
+    spec: Dict[str, Any],
+    output_dir: str,
+    since: Optional[datetime],
+    batch_size: int
+) -> Tuple[int, Optional[datetime]]:
+    """
+    Запись строк факта в {fact}/month=YYYY-MM/part-{run}.parquet по месяцу колонки partition_by.
+    Возвращает количество строк и наибольший updated_at среди них.
+    """
+    columns = spec["columns"]
+    names = [name for name, _, _ in columns]
+    schema = pa.schema([(name, arrow_type) for name, _, arrow_type in columns])
+    partition_index = names.index(spec["partition_by"])
+    updated_index = names.index("updated_at")
+
+    stmt = select(*[expr for _, expr, _ in columns])
+    if "join" in spec:
+        stmt = stmt.join(*spec["join"])
+    if since:
+        stmt = stmt.where(spec["updated_at"] >= since)
+    stmt = stmt.order_by(spec["updated_at"]).execution_options(yield_per=batch_size)
+
+    run_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    writers: Dict[str, pq.ParquetWriter] = {}
+    rows = 0
+    max_updated_at = None
+
+    try:
+        for batch in db.execute(stmt).partitions():
+            # Раскладываем пачку по месяцам и пишем по одному record batch на месяц
+            by_month: Dict[str, List[List[Any]]] = {}
+            for row in batch:
+                month = row[partition_index].strftime("%Y-%m")
+                columns_data = by_month.setdefault(month, [[] for _ in names])
+                for i, (_, _, arrow_type) in enumerate(columns):
+                    columns_data[i].append(_to_arrow_value(row[i], arrow_type))
+
+            for month, columns_data in by_month.items():
+                writer = writers.get(month)
+                if writer is None:
+                    partition_dir = os.path.join(output_dir, fact, f"month={month}")
+                    os.makedirs(partition_dir, exist_ok=True)
+                    writer = pq.ParquetWriter(
+                        os.path.join(partition_dir, f"part-{run_id}.parquet"),
+                        schema,
+                        compression="zstd"
+                    )
+                    writers[month] = writer
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(data, type=arrow_type) for data, (_, _, arrow_type) in zip(columns_data, columns)],
+                    schema=schema
+                ))
+
+            rows += len(batch)
+            # Строки отсортированы по updated_at, последняя в пачке - максимальная
+            max_updated_at = batch[-1][updated_index]
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return rows, max_updated_at
\ No newline at end of file
@@ -0,0 +1,292 @@
+from typing import Optional, Dict, Any, Tuple
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+
+from app.core.config import settings
+
+class GatewayError(Exception):
+    """Ошибка обращения к платежному шлюзу"""
+
+class GatewayUnavailableError(GatewayError):
+    """Шлюз признан недоступным (разомкнут circuit breaker или истек срок вызова)"""
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешнего сервиса.
+    После failure_threshold ошибок подряд запросы отклоняются сразу,
+    через reset_timeout пропускается один пробный запрос.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        return self.acquire()[0]
+
+    def acquire(self) -> Tuple[bool, bool]:
+        """
+        (можно ли отправить запрос, пробный ли он).
+        Пробный запрос всегда завершается release_probe, иначе цепь не закроется.
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True, False
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True, True
+            return False, False
+
+    def release_probe(self) -> None:
+        """
+        Снятие пробы, завершившейся без ответа и без сетевой ошибки
+        (отмена запроса, ошибка разбора ответа): следующий запрос станет новой пробой.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                # Неудачная проба снова размыкает цепь на полный период
+                self._opened_at = self._clock()
+
+class PaymentGatewayClient:
+    """
+    Клиент платежного шлюза с общим keep-alive пулом соединений.
+    Повторы с экспоненциальной задержкой и jitter выполняются только для запросов
+    с Idempotence-Key (шлюз не проведет платеж дважды) и только на сетевые ошибки,
+    429 и 5xx. Общий срок вызова (deadline) ограничивает все попытки вместе.
+    """
+
+    RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        base_url: str,
+        auth: Optional[Tuple[str, str]] = None,
+        timeout: float = 10.0,
+        deadline: float = 20.0,
+        max_retries: int = 3,
+        breaker: Optional[CircuitBreaker] = None,
+        backoff_base: float = 0.2,
+        backoff_cap: float = 2.0,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker(5, 30.0)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        limits = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30)
+        self._client_kwargs = {"base_url": self.base_url, "auth": auth, "limits": limits}
+        self._sync_client = httpx.Client(transport=transport, **self._client_kwargs)
+        self._async_transport = async_transport
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    # === Публичный интерфейс ===
+
+    def create_payment(self, payload: Dict[str, Any], idempotence_key: str) -> Dict[str, Any]:
+        """Создание платежа (синхронно, для обработчиков с синхронной сессией БД)"""
+        return self.request("POST", "/payments", payload, idempotence_key)
+
+    async def create_payment_async(self, payload: Dict[str, Any], idempotence_key: str) -> Dict[str, Any]:
+        """Создание платежа (асинхронно)"""
+        return await self.request_async("POST", "/payments", payload, idempotence_key)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        idempotence_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+
+        while True:
+            timeout = self._attempt_timeout(deadline_at)
+            probe = self._check_breaker()
+            try:
+                response = self._sync_client.request(
+                    method, path, json=payload,
+                    headers=self._headers(idempotence_key), timeout=timeout
+                )
+            except httpx.TransportError as e:
+                error, retryable = self._transport_failure(e)
+            else:
+                error, retryable = self._check_response(response)
+                if error is None:
+                    return response.json()
+            finally:
+                if probe:
+                    self.breaker.release_probe()
+
+            delay = self._next_delay(attempt, retryable, idempotence_key, deadline_at)
+            if delay is None:
+                raise error
+            time.sleep(delay)
+            attempt += 1
+
+    async def request_async(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        idempotence_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        client = self._get_async_client()
+
+        while True:
+            timeout = self._attempt_timeout(deadline_at)
+            probe = self._check_breaker()
+            try:
+                response = await client.request(
+                    method, path, json=payload,
+                    headers=self._headers(idempotence_key), timeout=timeout
+                )
+            except httpx.TransportError as e:
+                error, retryable = self._transport_failure(e)
+            else:
+                error, retryable = self._check_response(response)
+                if error is None:
+                    return response.json()
+            finally:
+                # Проба могла прерваться отменой задачи или ошибкой разбора ответа
+                if probe:
+                    self.breaker.release_probe()
+
+            delay = self._next_delay(attempt, retryable, idempotence_key, deadline_at)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self._sync_client.close()
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    # === Внутренняя логика ===
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # Асинхронный клиент создается лениво внутри работающего event loop
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(transport=self._async_transport, **self._client_kwargs)
+        return self._async_client
+
+    @staticmethod
+    def _headers(idempotence_key: Optional[str]) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if idempotence_key:
+            headers["Idempotence-Key"] = idempotence_key
+        return headers
+
+    def _attempt_timeout(self, deadline_at: float) -> float:
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise GatewayUnavailableError("Истек срок ожидания ответа платежного шлюза")
+        return min(self.timeout, remaining)
+
+    def _check_breaker(self) -> bool:
+        """True, если попытка - пробный запрос полуоткрытой цепи"""
+        allowed, probe = self.breaker.acquire()
+        if not allowed:
+            raise GatewayUnavailableError("Платежный шлюз временно недоступен")
+        return probe
+
+    def _transport_failure(self, error: httpx.TransportError) -> Tuple[GatewayError, bool]:
+        # Таймаут или обрыв соединения - повторяем, но засчитываем предохранителю
+        self.breaker.record_failure()
+        return GatewayError(f"Ошибка соединения со шлюзом: {error}"), True
+
+    def _check_response(self, response: httpx.Response) -> Tuple[Optional[GatewayError], bool]:
+        """(ошибка или None, можно ли повторить)"""
+        if response.status_code in self.RETRYABLE_STATUSES:
+            self.breaker.record_failure()
+            return GatewayError(f"Шлюз ответил {response.status_code}"), True
+
+        # Ответ получен - шлюз жив, даже если запрос отклонен (4xx)
+        self.breaker.record_success()
+        if response.is_error:
+            return GatewayError(f"Шлюз отклонил запрос: {response.status_code} {response.text}"), False
+        return None, False
+
+    def _next_delay(
+        self,
+        attempt: int,
+        retryable: bool,
+        idempotence_key: Optional[str],
+        deadline_at: float
+    ) -> Optional[float]:
+        """Задержка перед следующей попыткой или None, если повторять нельзя"""
+        if not retryable or not idempotence_key or attempt >= self.max_retries:
+            return None
+        # Full jitter: равномерно от 0 до экспоненциального предела
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if time.monotonic() + delay >= deadline_at:
+            return None
+        return delay
+
+_gateway_client: Optional[PaymentGatewayClient] = None
+_gateway_client_lock = threading.Lock()
+
+def get_gateway_client() -> PaymentGatewayClient:
+    """Общий на процесс клиент ЮKassa (один пул соединений и один предохранитель)"""
+    global _gateway_client
+    if _gateway_client is None:
+        with _gateway_client_lock:
+            if _gateway_client is None:
+                _gateway_client = PaymentGatewayClient(
+                    settings.YOOKASSA_API_URL,
+                    auth=(settings.YOOKASSA_SHOP_ID or "", settings.YOOKASSA_SECRET_KEY or ""),
+                    timeout=settings.GATEWAY_TIMEOUT,
+                    deadline=settings.GATEWAY_DEADLINE,
+                    max_retries=settings.GATEWAY_MAX_RETRIES,
+                    breaker=CircuitBreaker(settings.GATEWAY_BREAKER_FAILURES, settings.GATEWAY_BREAKER_RESET),
+                )
+    return _gateway_client
\ No newline at end of file
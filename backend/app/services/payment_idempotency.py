@@ -0,0 +1,41 @@
+from datetime import date, timedelta
+
+from app.core.redis_client import redis_client
+
+# Сколько дней помним обработанные transaction_id (повторные доставки приходят в течение суток)
+PROCESSED_TX_RETENTION_DAYS = 7
+
+def _processed_key(day: date) -> str:
+    return f"payments:processed-tx:{day.strftime('%Y%m%d')}"
+
+class PaymentIdempotency:
+    """
+    Быстрая проверка повторной доставки платежа.
+    Обработанные transaction_id хранятся в посуточных Redis set, старые сутки истекают сами.
+    Redis - только ускоритель: при его недоступности решение принимает
+    INSERT ... ON CONFLICT DO NOTHING в Postgres.
+    """
+
+    @staticmethod
+    def is_processed(transaction_id: str) -> bool:
+        """Проверка за последние PROCESSED_TX_RETENTION_DAYS суток одним pipeline"""
+        today = date.today()
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for offset in range(PROCESSED_TX_RETENTION_DAYS):
+                pipe.sismember(_processed_key(today - timedelta(days=offset)), transaction_id)
+            return any(pipe.execute())
+        except Exception:
+            return False
+
+    @staticmethod
+    def mark_processed(transaction_id: str) -> None:
+        """Запоминание обработанного платежа"""
+        key = _processed_key(date.today())
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.sadd(key, transaction_id)
+            pipe.expire(key, PROCESSED_TX_RETENTION_DAYS * 24 * 60 * 60)
+            pipe.execute()
+        except Exception:
+            pass
\ No newline at end of file
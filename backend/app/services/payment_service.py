@@ -3,12 +3,19 @@ from typing import Optional, Dict, Any, Tuple
 from datetime import datetime
 import hashlib
 import hmac
-import requests
+from redis.exceptions import LockError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.core.config import settings
 from app.models.finance import Invoice, Payment, PaymentMethod, PaymentStatus
-from app.core.redis_client import RedisService
+from app.core.redis_client import RedisService, AsyncRedisService
+from app.services.report_cache import ReportCache
+from app.services.payment_idempotency import PaymentIdempotency
+from app.services.payment_gateway import GatewayUnavailableError, get_gateway_client
+from app.services.receipt_builder import build_signed_receipt
+from app.services.webhook_inbox import is_transient_error
 
 class PaymentService:
     """Сервис обработки платежей (решаю проблемы интеграции из vivag3.0)"""
@@ -41,11 +48,74 @@ class PaymentService:
         if payment_amount <= 0:
             raise ValueError("Нет суммы для оплаты")
         
-        # Генерируем ID платежа
-        payment_id = f"pay_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{invoice.invoice_number[-6:]}"
+        # Повторный клик "оплатить" или перезагрузка страницы получают ту же ссылку
+        link_key = self._payment_link_key(invoice.id, payment_amount)
+        cached_link = self._get_cached_payment_link(link_key)
+        if cached_link:
+            return cached_link
         
-        # Пример для ЮKassa (можно заменить на другую систему)
-        payload = {
+        try:
+            # Параллельные запросы создают в шлюзе только один платеж
+            with RedisService.get_lock(link_key, timeout=int(settings.GATEWAY_DEADLINE) + 5):
+                cached_link = self._get_cached_payment_link(link_key)
+                if cached_link:
+                    return cached_link
+                
+                return self._create_gateway_payment(
+                    invoice, payment_amount, link_key, success_url, description
+                )
+        except LockError:
+            raise GatewayUnavailableError("Ссылка на оплату уже создается, повторите запрос")
+    
+    def _create_gateway_payment(
+        self,
+        invoice: Invoice,
+        payment_amount: Decimal,
+        link_key: str,
+        success_url: Optional[str],
+        description: Optional[str]
+    ) -> Dict[str, Any]:
+        """Создание платежа в шлюзе и сохранение ссылки для повторного использования"""
+        payment_id = self._new_payment_id(invoice)
+        
+        # Отправляем запрос к платежному шлюзу
+        response = self._make_yookassa_request(
+            payment_id, self._gateway_payload(invoice, payment_amount, success_url, description)
+        )
+        
+        # Сохраняем временные данные платежа в Redis
+        payment_data = self._pending_payment_data(invoice, payment_amount, payment_id, response)
+        
+        RedisService.cache_set(f"payment:{payment_id}", payment_data, ttl=settings.PAYMENT_LINK_TTL)
+        
+        if payment_data["confirmation_url"]:
+            # Тег счета, чтобы сбросить ссылки после оплаты или отмены
+            RedisService.cache_set(
+                link_key, payment_id, ttl=settings.PAYMENT_LINK_TTL,
+                tags=[self._payment_links_tag(invoice.id)]
+            )
+        
+        return {
+            "payment_id": payment_id,
+            "amount": payment_amount,
+            "confirmation_url": payment_data["confirmation_url"],
+            "invoice_number": invoice.invoice_number
+        }
+    
+    @staticmethod
+    def _new_payment_id(invoice: Invoice) -> str:
+        """Генерируем ID платежа"""
+        return f"pay_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{invoice.invoice_number[-6:]}"
+    
+    @staticmethod
+    def _gateway_payload(
+        invoice: Invoice,
+        payment_amount: Decimal,
+        success_url: Optional[str],
+        description: Optional[str]
+    ) -> Dict[str, Any]:
+        """Пример для ЮKassa (можно заменить на другую систему)"""
+        return {
             "amount": {
                 "value": str(payment_amount),
                 "currency": "RUB"
@@ -65,37 +135,72 @@ class PaymentService:
             },
             "capture": True
         }
-        
-        # Отправляем запрос к платежному шлюзу
-        response = self._make_yookassa_request(payment_id, payload)
-        
-        # Сохраняем временные данные платежа в Redis
-        payment_data = {
+    
+    @staticmethod
+    def _pending_payment_data(
+        invoice: Invoice,
+        payment_amount: Decimal,
+        payment_id: str,
+        response: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return {
             "invoice_id": str(invoice.id),
             "amount": float(payment_amount),
             "payment_id": payment_id,
             "yookassa_id": response.get("id"),
             "status": "pending",
-            "confirmation_url": response.get("confirmation", {}).get("confirmation_url")
+            "confirmation_url": response.get("confirmation", {}).get("confirmation_url"),
+            "invoice_number": invoice.invoice_number
         }
+    
+    @staticmethod
+    def _payment_link_key(invoice_id, amount: Decimal) -> str:
+        return f"payment-link:{invoice_id}:{Decimal(amount).quantize(Decimal('0.01'))}"
+    
+    @staticmethod
+    def _get_cached_payment_link(link_key: str) -> Optional[Dict[str, Any]]:
+        """Действующая ссылка на оплату для счета и суммы или None"""
+        payment_id = RedisService.cache_get(link_key)
+        if not payment_id:
+            return None
         
-        RedisService.cache_set(f"payment:{payment_id}", payment_data, ttl=3600)
+        payment_data = RedisService.cache_get(f"payment:{payment_id}")
+        if not payment_data or payment_data.get("status") != "pending" or not payment_data.get("confirmation_url"):
+            return None
         
         return {
             "payment_id": payment_id,
-            "amount": payment_amount,
-            "confirmation_url": response.get("confirmation", {}).get("confirmation_url"),
-            "invoice_number": invoice.invoice_number
+            "amount": Decimal(str(payment_data["amount"])).quantize(Decimal('0.01')),
+            "confirmation_url": payment_data["confirmation_url"],
+            "invoice_number": payment_data.get("invoice_number", "")
         }
     
+    @staticmethod
+    def _payment_links_tag(invoice_id) -> str:
+        return f"payment-links:{invoice_id}"
+    
+    @staticmethod
+    def invalidate_payment_links(invoice_id) -> None:
+        """Сброс сохраненных ссылок на оплату счета"""
+        try:
+            RedisService.invalidate_tags(PaymentService._payment_links_tag(invoice_id))
+        except Exception:
+            pass
+    
     def process_webhook(self, payload: Dict[str, Any]) -> Tuple[bool, str]:
         """
         Обработка вебхука от платежной системы.
         """
         # Проверяем подпись (безопасность)
-        if not self._verify_webhook_signature(payload):
+        if not self.verify_webhook_signature(payload):
             return False, "Invalid signature"
         
+        return self.apply_webhook_event(payload)
+    
+    def apply_webhook_event(self, payload: Dict[str, Any]) -> Tuple[bool, str]:
+        """
+        Применение события из очереди вебхуков (подпись проверена при приеме).
+        """
         event = payload.get("event")
         payment_data = payload.get("object", {})
         
@@ -116,32 +221,56 @@ class PaymentService:
         if not invoice_id:
             return False, "No invoice ID in metadata"
         
+        transaction_id = payment_data.get("id")
+        
+        # Быстрый путь: повторная доставка отсекается по Redis без обращения к Postgres
+        if transaction_id and PaymentIdempotency.is_processed(transaction_id):
+            return True, "Payment already processed"
+        
         # Начинаем транзакцию (исправляю потерю данных из vivag3.0)
         try:
-            invoice = self.db.query(Invoice).get(invoice_id)
+            # Блокируем счет, чтобы параллельные платежи не затерли paid_amount
+            invoice = self.db.query(Invoice).filter(
+                Invoice.id == invoice_id
+            ).with_for_update().first()
             if not invoice:
                 return False, "Invoice not found"
             
             amount = Decimal(payment_data.get("amount", {}).get("value", 0))
             
-            # Создаем запись платежа
-            payment = Payment(
-                invoice_id=invoice.id,
-                amount=amount,
-                payment_method=PaymentMethod.ONLINE,
-                transaction_id=payment_data.get("id"),
-                reference_number=payment_data.get("payment_method", {}).get("id"),
-                metadata=payment_data,
-                status="completed"
-            )
+            # Запись платежа; дубль по transaction_id не вставится и не вызовет ошибку
+            payment_id = self.db.execute(
+                pg_insert(Payment.__table__).values(
+                    invoice_id=invoice.id,
+                    amount=Decimal(amount).quantize(Decimal('0.01')),
+                    payment_method=PaymentMethod.ONLINE,
+                    transaction_id=transaction_id,
+                    reference_number=payment_data.get("payment_method", {}).get("id"),
+                    metadata=payment_data,
+                    status="completed",
+                    notes="Оплата онлайн"
+                ).on_conflict_do_nothing(
+                    index_elements=["transaction_id"]
+                ).returning(Payment.__table__.c.id)
+            ).scalar()
             
-            self.db.add(payment)
+            if payment_id is None:
+                self.db.rollback()
+                PaymentIdempotency.mark_processed(transaction_id)
+                return True, "Payment already processed"
             
-            # Обновляем счет
-            invoice.add_payment(amount, PaymentMethod.ONLINE, "Оплата онлайн")
+            # Обновляем счет (без второй записи Payment)
+            invoice.apply_payment(amount)
             
             self.db.commit()
             
+            if transaction_id:
+                PaymentIdempotency.mark_processed(transaction_id)
+            
+            # Сбрасываем кэш отчетов за день счета и ссылки на оплату (сумма долга изменилась)
+            ReportCache.invalidate_for_invoice(invoice)
+            self.invalidate_payment_links(invoice.id)
+            
             # Отправляем уведомление
             self._send_payment_notification(invoice, amount)
             
@@ -149,31 +278,28 @@ class PaymentService:
             
         except Exception as e:
             self.db.rollback()
+            if is_transient_error(e):
+                # Обрыв соединения, deadlock или таймаут блокировки: событие нужно повторить
+                raise
             return False, f"Error processing payment: {str(e)}"
     
+    def _handle_cancelled_payment(self, payment_data: Dict[str, Any]) -> Tuple[bool, str]:
+        """Обработка отмененного платежа: ссылка больше не действует"""
+        invoice_id = payment_data.get("metadata", {}).get("invoice_id")
+        if invoice_id:
+            self.invalidate_payment_links(invoice_id)
+        return True, "Payment cancelled"
+    
+    def _handle_pending_payment(self, payment_data: Dict[str, Any]) -> Tuple[bool, str]:
+        """Платеж ожидает подтверждения (capture=True, поэтому действий не требуется)"""
+        return True, "Payment pending"
+    
     def _make_yookassa_request(self, payment_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Запрос к API ЮKassa"""
-        # В продакшене используйте реальные ключи
-        headers = {
-            "Idempotence-Key": payment_id,
-            "Content-Type": "application/json"
-        }
-        
-        # Базовые auth (shopId + secret key)
-        auth = (settings.YOOKASSA_SHOP_ID, settings.YOOKASSA_SECRET_KEY)
-        
-        response = requests.post(
-            "https://api.yookassa.ru/v3/payments",
-            json=payload,
-            headers=headers,
-            auth=auth,
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        return response.json()
+        """Запрос к API ЮKassa через общий пул соединений (повторы с тем же Idempotence-Key)"""
+        return get_gateway_client().create_payment(payload, idempotence_key=payment_id)
     
-    def _verify_webhook_signature(self, payload: Dict[str, Any]) -> bool:
+    @staticmethod
+    def verify_webhook_signature(payload: Dict[str, Any]) -> bool:
         """Проверка подписи вебхука"""
         signature = payload.get("signature", "")
         body = payload.get("body", "")
@@ -203,60 +329,120 @@ class PaymentService:
         if not invoice:
             raise ValueError("Счет не найден")
         
-        # Данные для чека
-        items = []
-        for item in invoice.items:
-            items.append({
-                "name": item.description,
-                "price": float(item.unit_price),
-                "quantity": float(item.quantity),
-                "amount": float(item.total),
-                "vat_code": self._get_vat_code(item.tax_rate),
-                "payment_method": "full_payment",
-                "payment_object": "service"
-            })
-        
-        receipt = {
-            "timestamp": datetime.now().isoformat(),
-            "external_id": f"receipt_{invoice.invoice_number}",
-            "company": {
-                "email": settings.COMPANY_EMAIL,
-                "sno": settings.TAX_SYSTEM,  # Система налогообложения
-                "inn": settings.INN,
-                "payment_address": settings.PAYMENT_ADDRESS
-            },
-            "payments": [
-                {
-                    "type": "card",  # или cash
-                    "sum": float(invoice.paid_amount)
-                }
-            ],
-            "total": float(invoice.total_amount),
-            "items": items,
-            "client": {
-                "email": invoice.patient.email,
-                "phone": invoice.patient.phone
+        # Тот же формат, что у пакетной генерации при закрытии дня
+        items = [
+            {
+                "description": item.description,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "discount_percent": item.discount_percent,
+                "discount_amount": item.discount_amount,
+                "tax_rate": item.tax_rate,
             }
-        }
+            for item in invoice.items
+        ]
+        client = {"email": invoice.patient.email, "phone": invoice.patient.phone}
         
-        # Подписываем чек (для реальной системы)
-        receipt["signature"] = self._sign_receipt(receipt)
+        return build_signed_receipt((
+            {
+                "invoice_number": invoice.invoice_number,
+                "paid_amount": invoice.paid_amount,
+                "total_amount": invoice.total_amount,
+            },
+            items,
+            client,
+        ))
+
+class AsyncPaymentService:
+    """
+    Async версия создания ссылок на оплату: БД через AsyncSession, шлюз через
+    асинхронный клиент, Redis через redis.asyncio. Ключи и формат ссылок - как у PaymentService.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def create_payment_link(
+        self,
+        invoice_id: str,
+        amount: Optional[Decimal] = None,
+        success_url: Optional[str] = None,
+        cancel_url: Optional[str] = None,
+        description: Optional[str] = None
+    ) -> Dict[str, Any]:
+        invoice = await self.db.get(Invoice, invoice_id)
+        if not invoice:
+            raise ValueError("Счет не найден")
+        
+        if invoice.status == PaymentStatus.PAID:
+            raise ValueError("Счет уже оплачен")
         
-        return receipt
+        payment_amount = amount or invoice.balance_due
+        
+        if payment_amount <= 0:
+            raise ValueError("Нет суммы для оплаты")
+        
+        link_key = PaymentService._payment_link_key(invoice.id, payment_amount)
+        cached_link = await self._get_cached_payment_link(link_key)
+        if cached_link:
+            return cached_link
+        
+        try:
+            async with AsyncRedisService.get_lock(link_key, timeout=int(settings.GATEWAY_DEADLINE) + 5):
+                cached_link = await self._get_cached_payment_link(link_key)
+                if cached_link:
+                    return cached_link
+                
+                return await self._create_gateway_payment(
+                    invoice, payment_amount, link_key, success_url, description
+                )
+        except LockError:
+            raise GatewayUnavailableError("Ссылка на оплату уже создается, повторите запрос")
     
-    def _get_vat_code(self, tax_rate: Decimal) -> int:
-        """Получение кода НДС для чека"""
-        if tax_rate == Decimal('0'):
-            return 6  # Без НДС
-        elif tax_rate == Decimal('10'):
-            return 2  # НДС 10%
-        elif tax_rate == Decimal('20'):
-            return 1  # НДС 20%
-        else:
-            return 6
+    async def _create_gateway_payment(
+        self,
+        invoice: Invoice,
+        payment_amount: Decimal,
+        link_key: str,
+        success_url: Optional[str],
+        description: Optional[str]
+    ) -> Dict[str, Any]:
+        payment_id = PaymentService._new_payment_id(invoice)
+        
+        response = await get_gateway_client().create_payment_async(
+            PaymentService._gateway_payload(invoice, payment_amount, success_url, description),
+            idempotence_key=payment_id
+        )
+        
+        payment_data = PaymentService._pending_payment_data(invoice, payment_amount, payment_id, response)
+        await AsyncRedisService.cache_set(f"payment:{payment_id}", payment_data, ttl=settings.PAYMENT_LINK_TTL)
+        
+        if payment_data["confirmation_url"]:
+            await AsyncRedisService.cache_set(
+                link_key, payment_id, ttl=settings.PAYMENT_LINK_TTL,
+                tags=[PaymentService._payment_links_tag(invoice.id)]
+            )
+        
+        return {
+            "payment_id": payment_id,
+            "amount": payment_amount,
+            "confirmation_url": payment_data["confirmation_url"],
+            "invoice_number": invoice.invoice_number
+        }
     
-    def _sign_receipt(self, receipt: Dict[str, Any]) -> str:
-        """Генерация подписи чека (упрощенная)"""
-        import json
-        data = json.dumps(receipt, sort_keys=True, separators=(',', ':'))
-        return hashlib.sha256(data.encode() + settings.RECEIPT_SECRET.encode()).hexdigest()
\ No newline at end of file
+    @staticmethod
+    async def _get_cached_payment_link(link_key: str) -> Optional[Dict[str, Any]]:
+        payment_id = await AsyncRedisService.cache_get(link_key)
+        if not payment_id:
+            return None
+        
+        payment_data = await AsyncRedisService.cache_get(f"payment:{payment_id}")
+        if not payment_data or payment_data.get("status") != "pending" or not payment_data.get("confirmation_url"):
+            return None
+        
+        return {
+            "payment_id": payment_id,
+            "amount": Decimal(str(payment_data["amount"])).quantize(Decimal('0.01')),
+            "confirmation_url": payment_data["confirmation_url"],
+            "invoice_number": payment_data.get("invoice_number", "")
+        }
\ No newline at end of file
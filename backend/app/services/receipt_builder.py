@@ -0,0 +1,79 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+
+from app.core.config import settings
+from app.core.line_amounts import line_total
+
+def vat_code(tax_rate: Optional[Decimal]) -> int:
+    """Код НДС для чека"""
+    if tax_rate == Decimal('10'):
+        return 2  # НДС 10%
+    if tax_rate == Decimal('20'):
+        return 1  # НДС 20%
+    return 6  # Без НДС
+
+def build_receipt(
+    invoice: Dict[str, Any],
+    items: List[Dict[str, Any]],
+    client: Dict[str, Any],
+    timestamp: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Чек по 54-ФЗ из значений колонок счета, позиций и пациента.
+    Чистая функция без обращения к БД.
+    """
+    receipt_items = []
+    for item in items:
+        amount = line_total(
+            item["quantity"], item["unit_price"],
+            item["discount_percent"], item["discount_amount"], item["tax_rate"]
+        )
+        receipt_items.append({
+            "name": item["description"],
+            "price": float(item["unit_price"]),
+            "quantity": float(item["quantity"]),
+            "amount": float(amount),
+            "vat_code": vat_code(item["tax_rate"]),
+            "payment_method": "full_payment",
+            "payment_object": "service"
+        })
+
+    return {
+        "timestamp": (timestamp or datetime.now()).isoformat(),
+        "external_id": f"receipt_{invoice['invoice_number']}",
+        "company": {
+            "email": settings.COMPANY_EMAIL,
+            "sno": settings.TAX_SYSTEM,  # Система налогообложения
+            "inn": settings.INN,
+            "payment_address": settings.PAYMENT_ADDRESS
+        },
+        "payments": [
+            {
+                "type": "card",  # или cash
+                "sum": float(invoice["paid_amount"] or 0)
+            }
+        ],
+        "total": float(invoice["total_amount"] or 0),
+        "items": receipt_items,
+        "client": {
+            "email": client.get("email"),
+            "phone": client.get("phone")
+        }
+    }
+
+def sign_receipt(receipt: Dict[str, Any]) -> str:
+    """Генерация подписи чека (упрощенная)"""
+    data = json.dumps(receipt, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode() + settings.RECEIPT_SECRET.encode()).hexdigest()
+
+def build_signed_receipt(
+    args: Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]],
+    timestamp: Optional[datetime] = None
+) -> Dict[str, Any]:
+    invoice, items, client = args
+    receipt = build_receipt(invoice, items, client, timestamp)
+    receipt["signature"] = sign_receipt(receipt)
+    return receipt
\ No newline at end of file
@@ -0,0 +1,91 @@
+from datetime import date, datetime, timedelta
+from typing import Dict
+import os
+import uuid
+
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.finance import Payment
+from app.services.report_service import EXPORT_BATCH_SIZE
+from app.services.statement_matching import (
+    PAYMENT_COLUMNS, normalize_ids, parse_mt940, parse_statement_csv, reconcile, to_cents
+)
+
+class ReconciliationService:
+    """Сверка банковских выписок и реестров эквайера с платежами в БД"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load_payments(self, start_date: date, end_date: date, date_tolerance_days: int = 2) -> pd.DataFrame:
+        """Проведенные платежи за период выписки с запасом на допуск по дате"""
+        start = datetime.combine(start_date - timedelta(days=date_tolerance_days), datetime.min.time())
+        end = datetime.combine(end_date + timedelta(days=date_tolerance_days + 1), datetime.min.time())
+
+        stmt = select(
+            Payment.id, Payment.transaction_id, Payment.reference_number, Payment.amount, Payment.created_at
+        ).where(
+            Payment.created_at >= start,
+            Payment.created_at < end,
+            Payment.status == "completed"
+        ).execution_options(yield_per=EXPORT_BATCH_SIZE * 10)
+
+        chunks = [
+            pd.DataFrame(batch, columns=["payment_id", "transaction_id", "reference_number", "amount", "created_at"])
+            for batch in self.db.execute(stmt).partitions()
+        ]
+        if not chunks:
+            frame = pd.DataFrame(columns=["payment_id", "transaction_id", "reference_number", "amount", "created_at"])
+        else:
+            frame = pd.concat(chunks, ignore_index=True)
+
+        frame["payment_id"] = frame["payment_id"].astype(str)
+        frame["transaction_id"] = normalize_ids(frame["transaction_id"])
+        frame["reference_number"] = normalize_ids(frame["reference_number"])
+        frame["amount_cents"] = to_cents(frame["amount"]).astype("int64")
+        frame["payment_date"] = pd.to_datetime(frame["created_at"]).dt.normalize()
+        return frame[PAYMENT_COLUMNS]
+
+    def reconcile_file(
+        self,
+        path: str,
+        statement_format: str = "csv",
+        date_tolerance_days: int = 2
+    ) -> Dict[str, object]:
+        """
+        Сверка файла выписки. Результаты пишутся в CSV рядом с выгрузками:
+        {RECONCILIATION_DIR}/{run_id}/matched.csv, ambiguous.csv, unmatched_*.csv
+        """
+        if statement_format == "csv":
+            statement = parse_statement_csv(path)
+        elif statement_format == "mt940":
+            with open(path, encoding="utf-8", errors="replace") as f:
+                statement = parse_mt940(f.read())
+        else:
+            raise ValueError(f"Неподдерживаемый формат выписки: {statement_format}")
+
+        if statement.empty:
+            return {"run_id": None, "lines": 0, "matched": 0, "ambiguous": 0,
+                    "unmatched_statement": 0, "unmatched_payments": 0}
+
+        payments = self.load_payments(
+            statement["value_date"].min().date(),
+            statement["value_date"].max().date(),
+            date_tolerance_days
+        )
+        result = reconcile(statement, payments, date_tolerance_days)
+
+        run_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        output_dir = os.path.join(settings.RECONCILIATION_DIR, run_id)
+        os.makedirs(output_dir, exist_ok=True)
+
+        statement_details = statement.set_index("line_id")
+        for name, frame in (("matched", result.matched), ("ambiguous", result.ambiguous)):
+            frame.join(statement_details, on="line_id").to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+        result.unmatched_statement.to_csv(os.path.join(output_dir, "unmatched_statement.csv"), index=False)
+        result.unmatched_payments.to_csv(os.path.join(output_dir, "unmatched_payments.csv"), index=False)
+
+        return {"run_id": run_id, "lines": len(statement), **result.summary()}
\ No newline at end of file
@@ -0,0 +1,105 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Set
+import csv
+import os
+import re
+
+from app.core.line_amounts import line_total
+
+def month_bounds(month: str):
+    """'2024-03' -> (2024-03-01, 2024-03-31)"""
+    start = datetime.strptime(month, "%Y-%m").date()
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+def insurer_filename(insurer: str, used: Set[str]) -> str:
+    """
+    Имя файла реестра страховой. Разные названия могут дать одно имя ("СК Альфа" и "СК-Альфа"
+    или отличие только регистром) - тогда добавляется номер, чтобы файл не перезаписался.
+    """
+    slug = re.sub(r"[^\w\-]+", "_", insurer.strip(), flags=re.UNICODE).strip("_") or "insurer"
+    name = slug
+    suffix = 2
+    while name.lower() in used:
+        name = f"{slug}_{suffix}"
+        suffix += 1
+    used.add(name.lower())
+    return f"{name}.csv"
+
+def _format_date(value: Optional[date]) -> str:
+    return value.strftime("%d.%m.%Y") if value else ""
+
+def write_registries(rows: Iterable, month: str, start: date, end: date, output_dir: str) -> List[Dict[str, object]]:
+    """
+    Файлы реестров из строк, отсортированных по страховой, договору и заявке (по файлу на страховую).
+    Каждый файл пишется в .part и переименовывается, только когда дописан целиком:
+    страховая не получит недописанный реестр, а прежний файл за месяц останется при ошибке.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    used: Set[str] = set()
+
+    results = []
+    for insurer, insurer_rows in groupby(rows, key=lambda row: row.insurer):
+        path = os.path.join(output_dir, insurer_filename(insurer, used))
+        try:
+            with open(path + ".part", "w", newline="", encoding="utf-8") as f:
+                claims, total = _write_insurer(csv.writer(f, delimiter=";"), insurer, insurer_rows, month, start, end)
+        except BaseException:
+            os.remove(path + ".part")
+            raise
+        os.replace(path + ".part", path)
+        results.append({"insurer": insurer, "file": path, "claims": claims, "amount": str(total)})
+
+    return results
+
+def _write_insurer(writer, insurer: str, rows, month: str, start: date, end: date):
+    writer.writerow(["H", f"R-{month}", _format_date(start), _format_date(end), insurer])
+    insurer_claims = 0
+    insurer_total = Decimal("0.00")
+
+    for contract_number, contract_rows in groupby(rows, key=lambda row: row.contract_number):
+        writer.writerow(["C", contract_number])
+        contract_claims = 0
+        contract_total = Decimal("0.00")
+
+        for _, claim_rows in groupby(contract_rows, key=lambda row: row.claim_id):
+            for index, row in enumerate(claim_rows):
+                if index == 0:
+                    contract_claims += 1
+                    contract_total += row.amount_claimed or 0
+                writer.writerow(_line(row))
+
+        writer.writerow(["T", contract_number, contract_claims, f"{contract_total:.2f}"])
+        insurer_claims += contract_claims
+        insurer_total += contract_total
+
+    writer.writerow(["F", insurer_claims, f"{insurer_total:.2f}"])
+    return insurer_claims, insurer_total
+
+def _line(row) -> list:
+    full_name = " ".join(part for part in (row.last_name, row.first_name, row.middle_name) if part)
+    if row.description is None:
+        # Заявка без счета или без позиций - одна строка на всю сумму
+        service = ["", "", "", "", f"{row.amount_claimed:.2f}"]
+    else:
+        amount = line_total(
+            row.quantity, row.unit_price, row.discount_percent, row.discount_amount, row.tax_rate
+        )
+        service = [
+            row.service_code or "",
+            row.description,
+            f"{row.quantity.normalize():f}",
+            f"{row.unit_price:.2f}",
+            f"{amount:.2f}",
+        ]
+    return [
+        "L",
+        row.claim_number or "",
+        _format_date(row.submission_date),
+        full_name,
+        _format_date(row.birth_date),
+        row.invoice_number or "",
+        *service,
+    ]
\ No newline at end of file
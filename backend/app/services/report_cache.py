@@ -0,0 +1,153 @@
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+
+from redis.exceptions import LockError
+
+from app.core.config import settings
+from app.core.local_cache import two_tier_cache
+from app.core.redis_client import RedisService, AsyncRedisService
+
+# Отчет об aging зависит от всех открытых счетов, поэтому держим его недолго
+AGING_REPORT_TTL = 300
+
+def make_report_key(report_type: str, params: Dict[str, Any]) -> str:
+    """Ключ кэша по типу отчета и параметрам (порядок параметров не важен)"""
+    raw = json.dumps(params, sort_keys=True, default=str)
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return f"report:{report_type}:{digest}"
+
+def report_ttl(start_date: date, end_date: date, today: Optional[date] = None) -> int:
+    """
+    TTL отчета: закрытые периоды почти не меняются и живут долго,
+    периоды с сегодняшним днем - коротко.
+    """
+    today = today or date.today()
+    if end_date < today:
+        return settings.REPORT_CACHE_CLOSED_TTL
+    return settings.REPORT_CACHE_OPEN_TTL
+
+def _day_tag(day: date) -> str:
+    return f"invoice-day:{day.isoformat()}"
+
+def _type_tag(report_type: str) -> str:
+    return f"report-type:{report_type}"
+
+def _iter_days(start_date: date, end_date: date) -> Iterable[date]:
+    current = start_date
+    while current <= end_date:
+        yield current
+        current += timedelta(days=1)
+
+class ReportCache:
+    """
+    Кэш результатов отчетов.
+    Каждая запись помечается тегами дней периода, чтобы запись
+    счета или платежа за конкретный день сбрасывала только затронутые отчеты.
+    """
+
+    @staticmethod
+    def get_or_compute(
+        report_type: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Any],
+        period: Optional[Tuple[date, date]] = None,
+        ttl: Optional[int] = None
+    ) -> Any:
+        """
+        Получение отчета из кэша или его расчет.
+        Одинаковые параллельные запросы ждут один расчет (single-flight).
+        """
+        key = make_report_key(report_type, params)
+
+        cached = two_tier_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if ttl is None:
+            ttl = report_ttl(*period) if period else settings.REPORT_CACHE_OPEN_TTL
+
+        try:
+            with RedisService.get_lock(f"report:{key}", timeout=settings.REPORT_CACHE_LOCK_TIMEOUT):
+                # Пока ждали блокировку, отчет мог посчитать другой запрос
+                cached = two_tier_cache.get(key)
+                if cached is not None:
+                    return cached
+
+                result = compute()
+                # Отчет с упавшими секциями не кэшируем, чтобы следующий запрос пересчитал его
+                if not (isinstance(result, dict) and result.get("errors")):
+                    ReportCache._store(key, report_type, result, ttl, period)
+                return result
+        except LockError:
+            # Не дождались блокировки - считаем без кэша, чтобы не отдавать ошибку
+            return compute()
+
+    @staticmethod
+    async def get_or_compute_async(
+        report_type: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        period: Optional[Tuple[date, date]] = None,
+        ttl: Optional[int] = None
+    ) -> Any:
+        """
+        Async версия get_or_compute для async эндпоинтов: Redis через AsyncRedisService,
+        без копии в памяти воркера. Ключи и теги те же, сброс через invalidate_day действует и на нее.
+        """
+        key = make_report_key(report_type, params)
+
+        cached = await AsyncRedisService.cache_get(key)
+        if cached is not None:
+            return cached
+
+        if ttl is None:
+            ttl = report_ttl(*period) if period else settings.REPORT_CACHE_OPEN_TTL
+
+        try:
+            async with AsyncRedisService.get_lock(f"report:{key}", timeout=settings.REPORT_CACHE_LOCK_TIMEOUT):
+                cached = await AsyncRedisService.cache_get(key)
+                if cached is not None:
+                    return cached
+
+                result = await compute()
+                if not (isinstance(result, dict) and result.get("errors")):
+                    await AsyncRedisService.cache_set(key, result, ttl=ttl, tags=ReportCache._tags(report_type, period))
+                return result
+        except LockError:
+            return await compute()
+
+    @staticmethod
+    def _tags(report_type: str, period: Optional[Tuple[date, date]]) -> List[str]:
+        # По типу сбрасывается только aging. У остальных отчетов множество тега типа
+        # копило бы ключи всех записей: его срок продлевается каждой записью, а сброса нет
+        tags = [_type_tag(report_type)] if report_type == "aging" else []
+        if period:
+            tags.extend(_day_tag(day) for day in _iter_days(*period))
+        return tags
+
+    @staticmethod
+    def _store(
+        key: str,
+        report_type: str,
+        value: Any,
+        ttl: int,
+        period: Optional[Tuple[date, date]]
+    ) -> None:
+        """Сохранение отчета с тегами дней периода (запись и теги - одним скриптом)"""
+        two_tier_cache.set(key, value, ttl=ttl, tags=ReportCache._tags(report_type, period))
+
+    @staticmethod
+    def invalidate_day(day: date) -> None:
+        """Сброс всех отчетов, период которых включает указанный день"""
+        try:
+            # Aging строится по всем открытым счетам, поэтому сбрасывается всегда
+            two_tier_cache.invalidate_tags(_day_tag(day), _type_tag("aging"))
+        except Exception:
+            pass
+
+    @staticmethod
+    def invalidate_for_invoice(invoice) -> None:
+        """Сброс отчетов после записи счета или платежа по нему"""
+        ReportCache.invalidate_day(invoice.issue_date or date.today())
\ No newline at end of file
@@ -1,14 +1,21 @@
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, BinaryIO, Callable, Tuple
+import asyncio
+import logging
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, case, extract
-import pandas as pd
-from io import BytesIO
+from sqlalchemy import Date, func, or_, case, extract, literal
+import tempfile
 
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_read_db, run_parallel_sections
+from app.models.appointment import Appointment
 from app.models.finance import Invoice, Payment, PaymentStatus
 from app.models.patient import Patient
 from app.models.doctor import Doctor
+from app.services import financial_export
+from app.services.financial_export import EXPORT_BATCH_SIZE, EXPORT_CHUNK_SIZE
+from app.services.report_cache import ReportCache, AGING_REPORT_TTL
 
 class ReportService:
     """Сервис финансовой аналитики и отчетов (исправляю медленные запросы из vivag3.0)"""
@@ -20,38 +27,82 @@ class ReportService:
         self,
         start_date: date,
         end_date: date,
-        group_by: str = "day"  # day, week, month, doctor, service
+        group_by: str = "day",  # day, week, month, doctor, service
+        use_primary: bool = False
     ) -> Dict[str, Any]:
         """
         Общий финансовый обзор за период.
+        Секции независимы и считаются параллельно на отдельных соединениях (реплика, если есть);
+        упавшая секция остается пустой и перечисляется в "errors".
         """
-        # Основные метрики
+        results, errors = run_parallel_sections({
+            "metrics": lambda db: ReportService(db)._get_financial_metrics(start_date, end_date),
+            "time_series": lambda db: ReportService(db)._get_time_series(start_date, end_date, group_by),
+            "top_doctors": lambda db: ReportService(db)._get_doctor_statistics(start_date, end_date),
+            "top_services": lambda db: ReportService(db)._get_service_statistics(start_date, end_date),
+        }, use_primary=use_primary)
+        
+        overview = {
+            "period": {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat()
+            },
+            "metrics": results.get("metrics", {}),
+            "time_series": results.get("time_series", []),
+            "top_doctors": results.get("top_doctors", []),
+            "top_services": results.get("top_services", [])
+        }
+        if errors:
+            overview["errors"] = errors
+        return overview
+    
+    def _get_financial_metrics(self, start_date: date, end_date: date) -> Dict[str, Any]:
+        """Основные метрики"""
+        balance_due = Invoice.total_amount - Invoice.paid_amount
         metrics = self.db.query(
             func.count(Invoice.id).label('invoice_count'),
             func.sum(Invoice.total_amount).label('total_revenue'),
             func.sum(Invoice.paid_amount).label('collected_revenue'),
-            func.sum(Invoice.balance_due).label('outstanding_debt'),
-            func.sum(case([(Invoice.status == PaymentStatus.PAID, Invoice.total_amount)], else_=0)).label('paid_amount'),
-            func.sum(case([(Invoice.status == PaymentStatus.OVERDUE, Invoice.balance_due)], else_=0)).label('overdue_debt'),
+            func.sum(balance_due).label('outstanding_debt'),
+            func.sum(case((Invoice.status == PaymentStatus.PAID, Invoice.total_amount), else_=0)).label('paid_amount'),
+            func.sum(case((Invoice.status == PaymentStatus.OVERDUE, balance_due), else_=0)).label('overdue_debt'),
             func.avg(Invoice.total_amount).label('avg_invoice_amount')
         ).filter(
             Invoice.issue_date >= start_date,
             Invoice.issue_date <= end_date
         ).first()
         
-        # Группировка по времени
+        return {
+            "invoice_count": metrics.invoice_count or 0,
+            "total_revenue": float(metrics.total_revenue or 0),
+            "collected_revenue": float(metrics.collected_revenue or 0),
+            "outstanding_debt": float(metrics.outstanding_debt or 0),
+            "paid_amount": float(metrics.paid_amount or 0),
+            "overdue_debt": float(metrics.overdue_debt or 0),
+            "avg_invoice_amount": float(metrics.avg_invoice_amount or 0),
+            "collection_rate": float(
+                (metrics.collected_revenue or 0) / (metrics.total_revenue or 1) * 100
+            )
+        }
+    
+    def _get_time_series(self, start_date: date, end_date: date, group_by: str) -> List[Dict]:
+        """Группировка по времени"""
         if group_by == "day":
-            time_data = self._get_daily_financial_data(start_date, end_date)
-        elif group_by == "month":
-            time_data = self._get_monthly_financial_data(start_date, end_date)
-        
-        # Группировка по врачам
+            return self._get_daily_financial_data(start_date, end_date)
+        if group_by == "month":
+            return self._get_monthly_financial_data(start_date, end_date)
+        return []
+    
+    def _get_doctor_statistics(self, start_date: date, end_date: date) -> List[Dict]:
+        """Группировка по врачам"""
         doctor_stats = self.db.query(
             Doctor,
             func.count(Invoice.id).label('invoice_count'),
             func.sum(Invoice.total_amount).label('revenue')
         ).join(
-            Invoice, Doctor.id == Invoice.appointment.has(doctor_id=Doctor.id)
+            Appointment, Appointment.doctor_id == Doctor.id
+        ).join(
+            Invoice, Invoice.appointment_id == Appointment.id
         ).filter(
             Invoice.issue_date >= start_date,
             Invoice.issue_date <= end_date
@@ -59,39 +110,34 @@ class ReportService:
             func.sum(Invoice.total_amount).desc()
         ).limit(10).all()
         
-        # Группировка по услугам
-        service_stats = self._get_service_statistics(start_date, end_date)
-        
-        return {
-            "period": {
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat()
-            },
-            "metrics": {
-                "invoice_count": metrics.invoice_count or 0,
-                "total_revenue": float(metrics.total_revenue or 0),
-                "collected_revenue": float(metrics.collected_revenue or 0),
-                "outstanding_debt": float(metrics.outstanding_debt or 0),
-                "paid_amount": float(metrics.paid_amount or 0),
-                "overdue_debt": float(metrics.overdue_debt or 0),
-                "avg_invoice_amount": float(metrics.avg_invoice_amount or 0),
-                "collection_rate": (
-                    (metrics.collected_revenue or 0) / (metrics.total_revenue or 1) * 100
-                )
-            },
-            "time_series": time_data,
-            "top_doctors": [
-                {
-                    "id": doctor.id,
-                    "name": f"{doctor.last_name} {doctor.first_name}",
-                    "specialization": doctor.specialization,
-                    "invoice_count": count,
-                    "revenue": float(revenue or 0)
-                }
-                for doctor, count, revenue in doctor_stats
-            ],
-            "top_services": service_stats
-        }
+        return [
+            {
+                "id": str(doctor.id),
+                "name": f"{doctor.last_name} {doctor.first_name}",
+                "specialization": doctor.specialization,
+                "invoice_count": count,
+                "revenue": float(revenue or 0)
+            }
+            for doctor, count, revenue in doctor_stats
+        ]
+    
+    def get_cached_financial_overview(
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: str = "day"
+    ) -> Dict[str, Any]:
+        """
+        Финансовый обзор через кэш отчетов.
+        Кэшируемый отчет считается на основной БД: отстающая реплика сразу после
+        сброса кэша записала бы в него данные без нового счета на REPORT_CACHE_CLOSED_TTL.
+        """
+        return ReportCache.get_or_compute(
+            "financial_overview",
+            {"start_date": start_date, "end_date": end_date, "group_by": group_by},
+            lambda: self.get_financial_overview(start_date, end_date, group_by, use_primary=True),
+            period=(start_date, end_date)
+        )
     
     def _get_daily_financial_data(self, start_date: date, end_date: date) -> List[Dict]:
         """Финансовые данные по дням"""
@@ -117,6 +163,29 @@ class ReportService:
             for row in data
         ]
     
+    def _get_monthly_financial_data(self, start_date: date, end_date: date) -> List[Dict]:
+        """Финансовые данные по месяцам"""
+        month = func.date_trunc('month', Invoice.issue_date)
+        data = self.db.query(
+            month.label('month'),
+            func.count(Invoice.id).label('invoice_count'),
+            func.sum(Invoice.total_amount).label('revenue'),
+            func.sum(Invoice.paid_amount).label('collected')
+        ).filter(
+            Invoice.issue_date >= start_date,
+            Invoice.issue_date <= end_date
+        ).group_by(month).order_by(month).all()
+        
+        return [
+            {
+                "date": row.month.date().isoformat(),
+                "invoice_count": row.invoice_count or 0,
+                "revenue": float(row.revenue or 0),
+                "collected": float(row.collected or 0)
+            }
+            for row in data
+        ]
+    
     def _get_service_statistics(self, start_date: date, end_date: date) -> List[Dict]:
         """Статистика по услугам"""
         from app.models.finance import InvoiceItem, Service
@@ -158,39 +227,40 @@ class ReportService:
         Отчет по давности долгов (Aging Report).
         """
         today = date.today()
+        # balance_due и days_overdue у модели - Python-свойства, в SQL считаем выражениями
+        balance_due = Invoice.total_amount - Invoice.paid_amount
+        days_overdue = case((Invoice.due_date < today, literal(today, Date) - Invoice.due_date), else_=0)
         
         # Группируем счета по давности просрочки
+        age_group = case(
+            (Invoice.due_date >= today, "current"),
+            (Invoice.due_date >= today - timedelta(days=30), "1-30"),
+            (Invoice.due_date >= today - timedelta(days=60), "31-60"),
+            (Invoice.due_date >= today - timedelta(days=90), "61-90"),
+            else_="90+"
+        ).label('age_group')
         aging_data = self.db.query(
-            case([
-                (Invoice.due_date >= today, "current"),
-                (and_(Invoice.due_date < today, Invoice.due_date >= today - timedelta(days=30)), "1-30"),
-                (and_(Invoice.due_date < today - timedelta(days=30), 
-                      Invoice.due_date >= today - timedelta(days=60)), "31-60"),
-                (and_(Invoice.due_date < today - timedelta(days=60), 
-                      Invoice.due_date >= today - timedelta(days=90)), "61-90"),
-                (Invoice.due_date < today - timedelta(days=90), "90+")
-            ]).label('age_group'),
+            age_group,
             func.count(Invoice.id).label('invoice_count'),
-            func.sum(Invoice.balance_due).label('total_amount'),
-            func.avg(Invoice.days_overdue).label('avg_days_overdue')
+            func.sum(balance_due).label('total_amount'),
+            func.avg(days_overdue).label('avg_days_overdue')
         ).filter(
-            Invoice.status.in_([PaymentStatus.PENDING.value, PaymentStatus.PARTIALLY_PAID.value, 
-                              PaymentStatus.OVERDUE.value]),
-            Invoice.balance_due > 0
-        ).group_by('age_group').all()
+            Invoice.status.in_([PaymentStatus.PENDING, PaymentStatus.PARTIALLY_PAID, PaymentStatus.OVERDUE]),
+            balance_due > 0
+        ).group_by(age_group).all()
         
         # Детали по каждому пациенту с долгами
         debtor_details = self.db.query(
             Patient,
-            func.sum(Invoice.balance_due).label('total_debt'),
+            func.sum(balance_due).label('total_debt'),
             func.count(Invoice.id).label('invoice_count'),
-            func.max(Invoice.due_date).label('oldest_due_date')
+            func.min(Invoice.due_date).label('oldest_due_date')
         ).join(
             Invoice, Patient.id == Invoice.patient_id
         ).filter(
-            Invoice.balance_due > 0
+            balance_due > 0
         ).group_by(Patient.id).order_by(
-            func.sum(Invoice.balance_due).desc()
+            func.sum(balance_due).desc()
         ).limit(50).all()
         
         return {
@@ -200,7 +270,7 @@ class ReportService:
                     "age_group": row.age_group,
                     "invoice_count": row.invoice_count or 0,
                     "total_amount": float(row.total_amount or 0),
-                    "avg_days_overdue": row.avg_days_overdue or 0
+                    "avg_days_overdue": float(row.avg_days_overdue or 0)
                 }
                 for row in aging_data
             ],
@@ -217,37 +287,38 @@ class ReportService:
             ]
         }
     
-    def export_to_excel(
+    def get_cached_aging_report(self) -> Dict[str, Any]:
+        """Отчет по давности долгов через кэш (ключ включает текущую дату), считается на основной БД"""
+        def compute() -> Dict[str, Any]:
+            with get_read_db(use_primary=True, deferrable=True) as db:
+                return ReportService(db).generate_aging_report()
+        
+        return ReportCache.get_or_compute(
+            "aging",
+            {"report_date": date.today()},
+            compute,
+            ttl=AGING_REPORT_TTL
+        )
+    
+    def count_financial_export_rows(self, start_date: date, end_date: date) -> int:
+        """Количество строк финансового отчета (для прогресса фоновых выгрузок)"""
+        return self.db.query(func.count(Invoice.id)).filter(
+            Invoice.issue_date >= start_date,
+            Invoice.issue_date <= end_date
+        ).scalar() or 0
+    
+    def _iter_financial_export_rows(
         self,
         start_date: date,
         end_date: date,
-        report_type: str = "financial"
-    ) -> BytesIO:
+        on_progress: Optional[Callable[[int], None]] = None
+    ) -> Iterator[tuple]:
         """
-        Экспорт отчета в Excel (исправляю проблемы с памятью из vivag3.0).
+        Строки финансового отчета через серверный курсор (yield_per).
+        В памяти одновременно держится только одна пачка строк, без лимита на объем.
+        on_progress вызывается после каждой пачки с числом выданных строк.
         """
-        # Используем пагинацию для больших объемов данных
-        if report_type == "financial":
-            data = self._get_financial_export_data(start_date, end_date)
-        elif report_type == "aging":
-            data = self._get_aging_export_data()
-        elif report_type == "services":
-            data = self._get_services_export_data(start_date, end_date)
-        
-        # Создаем Excel файл с помощью pandas
-        output = BytesIO()
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            for sheet_name, sheet_data in data.items():
-                df = pd.DataFrame(sheet_data)
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        output.seek(0)
-        return output
-    
-    def _get_financial_export_data(self, start_date: date, end_date: date) -> Dict[str, List]:
-        """Данные для финансового отчета"""
-        invoices = self.db.query(
+        query = self.db.query(
             Invoice.invoice_number,
             Invoice.issue_date,
             Patient.last_name,
@@ -257,7 +328,7 @@ class ReportService:
             Invoice.tax_amount,
             Invoice.total_amount,
             Invoice.paid_amount,
-            Invoice.balance_due,
+            (Invoice.total_amount - Invoice.paid_amount).label('balance_due'),
             Invoice.status,
             Invoice.payment_method
         ).join(
@@ -265,23 +336,142 @@ class ReportService:
         ).filter(
             Invoice.issue_date >= start_date,
             Invoice.issue_date <= end_date
-        ).order_by(Invoice.issue_date.desc()).limit(10000).all()
+        ).order_by(Invoice.issue_date.desc()).yield_per(EXPORT_BATCH_SIZE)
         
-        return {
-            "Invoices": [
-                {
-                    "Номер счета": inv.invoice_number,
-                    "Дата": inv.issue_date.isoformat(),
-                    "Пациент": f"{inv.last_name} {inv.first_name}",
-                    "Сумма": float(inv.subtotal),
-                    "Скидка": float(inv.discount_amount),
-                    "Налог": float(inv.tax_amount),
-                    "Итого": float(inv.total_amount),
-                    "Оплачено": float(inv.paid_amount),
-                    "Долг": float(inv.balance_due),
-                    "Статус": inv.status.value if hasattr(inv.status, 'value') else inv.status,
-                    "Способ оплаты": inv.payment_method.value if inv.payment_method else None
-                }
-                for inv in invoices
-            ]
-        }
\ No newline at end of file
+        rows = 0
+        for inv in query:
+            rows += 1
+            if on_progress and rows % EXPORT_BATCH_SIZE == 0:
+                on_progress(rows)
+            yield (
+                inv.invoice_number,
+                inv.issue_date.isoformat(),
+                f"{inv.last_name} {inv.first_name}",
+                inv.subtotal,
+                inv.discount_amount,
+                inv.tax_amount,
+                inv.total_amount,
+                inv.paid_amount,
+                inv.balance_due,
+                inv.status.value if hasattr(inv.status, 'value') else inv.status,
+                inv.payment_method.value if inv.payment_method else None
+            )
+        
+        if on_progress:
+            on_progress(rows)
+    
+    def write_financial_excel(
+        self,
+        start_date: date,
+        end_date: date,
+        output: BinaryIO,
+        on_progress: Optional[Callable[[int], None]] = None
+    ) -> int:
+        """Запись финансового отчета в XLSX без ограничения на число строк; возвращает их количество"""
+        return financial_export.write_excel(
+            self._iter_financial_export_rows(start_date, end_date, on_progress), output
+        )
+    
+    def stream_financial_excel(self, start_date: date, end_date: date) -> Iterator[bytes]:
+        """Потоковая отдача XLSX чанками для StreamingResponse"""
+        with tempfile.TemporaryFile() as tmp:
+            self.write_financial_excel(start_date, end_date, tmp)
+            tmp.seek(0)
+            
+            while True:
+                chunk = tmp.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    
+    def stream_financial_csv(
+        self,
+        start_date: date,
+        end_date: date,
+        on_progress: Optional[Callable[[int], None]] = None
+    ) -> Iterator[str]:
+        """Потоковый CSV прямо из курсора: заголовок уходит сразу, дальше строки пачками"""
+        return financial_export.stream_csv(self._iter_financial_export_rows(start_date, end_date, on_progress))
+    
+    def stream_financial_ndjson(
+        self,
+        start_date: date,
+        end_date: date,
+        on_progress: Optional[Callable[[int], None]] = None
+    ) -> Iterator[str]:
+        """Потоковый NDJSON: одна строка JSON на счет (суммы строками без потери точности)"""
+        return financial_export.stream_ndjson(self._iter_financial_export_rows(start_date, end_date, on_progress))
+
+class AsyncReportService:
+    """
+    Async версия финансового обзора. Секции - те же запросы ReportService,
+    выполняются через run_sync на отдельных AsyncSession параллельно (asyncio.gather).
+    """
+    
+    @staticmethod
+    async def _run_section(section: Callable[["ReportService"], Any]) -> Any:
+        async with AsyncSessionLocal(info={"read_only": True}) as db:
+            return await asyncio.wait_for(
+                db.run_sync(lambda session: section(ReportService(session))),
+                timeout=settings.PARALLEL_SECTION_TIMEOUT
+            )
+    
+    async def _run_sections(self, sections: Dict[str, Callable[["ReportService"], Any]]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        outcomes = await asyncio.gather(
+            *(self._run_section(section) for section in sections.values()),
+            return_exceptions=True
+        )
+        
+        results: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        for name, outcome in zip(sections, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                errors[name] = "timeout"
+            elif isinstance(outcome, Exception):
+                logging.getLogger(__name__).warning("Секция %s завершилась с ошибкой: %s", name, outcome)
+                errors[name] = str(outcome)
+            else:
+                results[name] = outcome
+        return results, errors
+    
+    async def get_financial_overview(
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: str = "day"
+    ) -> Dict[str, Any]:
+        """Финансовый обзор (формат как у ReportService.get_financial_overview)"""
+        results, errors = await self._run_sections({
+            "metrics": lambda report: report._get_financial_metrics(start_date, end_date),
+            "time_series": lambda report: report._get_time_series(start_date, end_date, group_by),
+            "top_doctors": lambda report: report._get_doctor_statistics(start_date, end_date),
+            "top_services": lambda report: report._get_service_statistics(start_date, end_date),
+        })
+        
+        overview = {
+            "period": {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat()
+            },
+            "metrics": results.get("metrics", {}),
+            "time_series": results.get("time_series", []),
+            "top_doctors": results.get("top_doctors", []),
+            "top_services": results.get("top_services", [])
+        }
+        if errors:
+            overview["errors"] = errors
+        return overview
+    
+    async def get_cached_financial_overview(
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: str = "day"
+    ) -> Dict[str, Any]:
+        """Финансовый обзор через кэш отчетов (тот же ключ, что у ReportService)"""
+        return await ReportCache.get_or_compute_async(
+            "financial_overview",
+            {"start_date": start_date, "end_date": end_date, "group_by": group_by},
+            lambda: self.get_financial_overview(start_date, end_date, group_by),
+            period=(start_date, end_date)
+        )
\ No newline at end of file
@@ -0,0 +1,190 @@
+from dataclasses import dataclass
+from typing import Dict
+import re
+
+import numpy as np
+import pandas as pd
+
+STATEMENT_COLUMNS = ["line_id", "transaction_id", "reference_number", "amount_cents", "value_date"]
+PAYMENT_COLUMNS = ["payment_id", "transaction_id", "reference_number", "amount_cents", "payment_date"]
+
+# Строка проводки MT940: :61:ДатаВалютирования[ДатаПроводки]D/C[Код]Сумма N|F Тип Референс[//РеференсБанка]
+MT940_LINE = re.compile(
+    r"^:61:(?P<date>\d{6})(?:\d{4})?(?P<mark>R?[CD])[A-Z]?(?P<amount>\d+,\d{0,2})"
+    r"[NF][A-Z0-9]{3}(?P<ref>[^/\r\n]*)(?://(?P<bank_ref>\S+))?"
+)
+
+@dataclass
+class ReconciliationResult:
+    """Результат сверки: пары строка выписки - платеж и то, что не сошлось"""
+    matched: pd.DataFrame
+    ambiguous: pd.DataFrame
+    unmatched_statement: pd.DataFrame
+    unmatched_payments: pd.DataFrame
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "matched": len(self.matched),
+            "ambiguous": int(self.ambiguous["line_id"].nunique()) if len(self.ambiguous) else 0,
+            "unmatched_statement": len(self.unmatched_statement),
+            "unmatched_payments": len(self.unmatched_payments),
+        }
+
+def to_cents(values: pd.Series) -> pd.Series:
+    """Суммы вида '1 500,00' / '1500.00' в целые копейки (без ошибок округления float)"""
+    cleaned = values.astype(str).str.replace(r"[\s ]", "", regex=True).str.replace(",", ".", regex=False)
+    return (pd.to_numeric(cleaned, errors="coerce") * 100).round().astype("Int64")
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """Даты выписки: ISO (2024-03-01) или российский формат (01.03.2024)"""
+    parsed = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    missing = parsed.isna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(values[missing], format="%d.%m.%Y", errors="coerce")
+    return parsed.dt.normalize()
+
+def normalize_ids(values: pd.Series) -> pd.Series:
+    values = values.astype("string").str.strip()
+    return values.mask(values == "")
+
+def _statement_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.reset_index(drop=True)
+    frame["line_id"] = np.arange(len(frame), dtype="int64")
+    frame["transaction_id"] = normalize_ids(frame["transaction_id"])
+    frame["reference_number"] = normalize_ids(frame["reference_number"])
+    frame = frame.dropna(subset=["amount_cents", "value_date"])
+    frame["amount_cents"] = frame["amount_cents"].astype("int64")
+    return frame[STATEMENT_COLUMNS]
+
+def parse_statement_csv(source, delimiter: str = ",") -> pd.DataFrame:
+    """
+    Выписка банка или эквайера в CSV.
+    Ожидаемые колонки: transaction_id, reference_number, amount, date.
+    """
+    frame = pd.read_csv(
+        source,
+        sep=delimiter,
+        dtype={"transaction_id": "string", "reference_number": "string", "amount": "string"},
+        keep_default_na=False,
+    )
+    for column in ("transaction_id", "reference_number"):
+        if column not in frame:
+            frame[column] = ""
+
+    frame["amount_cents"] = to_cents(frame["amount"])
+    frame["value_date"] = _parse_dates(frame["date"])
+    return _statement_frame(frame)
+
+def parse_mt940(text: str) -> pd.DataFrame:
+    """
+    Упрощенный разбор MT940: берутся только проводки :61:.
+    Референс клиента считается transaction_id, референс банка - reference_number.
+    Списания (D) пропускаются - сверяются только поступления.
+    """
+    records = []
+    for line in text.splitlines():
+        match = MT940_LINE.match(line.strip())
+        if not match or match.group("mark") not in ("C", "RD"):
+            continue
+        records.append((
+            match.group("ref"),
+            match.group("bank_ref") or "",
+            match.group("amount"),
+            match.group("date"),
+        ))
+
+    frame = pd.DataFrame(records, columns=["transaction_id", "reference_number", "amount", "date"])
+    frame["amount_cents"] = to_cents(frame["amount"]) if len(frame) else pd.Series(dtype="Int64")
+    frame["value_date"] = pd.to_datetime(frame["date"], format="%y%m%d", errors="coerce")
+    return _statement_frame(frame)
+
+def _unique_pairs(pairs: pd.DataFrame):
+    """Разделение кандидатов на однозначные пары (1:1) и неоднозначные"""
+    line_counts = pairs.groupby("line_id")["payment_id"].transform("size")
+    payment_counts = pairs.groupby("payment_id")["line_id"].transform("size")
+    unique = (line_counts == 1) & (payment_counts == 1)
+    return pairs[unique], pairs[~unique]
+
+def reconcile(
+    statement: pd.DataFrame,
+    payments: pd.DataFrame,
+    date_tolerance_days: int = 2
+) -> ReconciliationResult:
+    """
+    Сверка выписки с платежами.
+    1. Точное совпадение transaction_id (хеш-соединение).
+    2. Для оставшихся - совпадение reference_number.
+    3. Для оставшихся - сумма и дата в пределах допуска. Чтобы не сравнивать всех
+       со всеми, строки соединяются по (сумма, корзина дат шириной допуск + 1 день),
+       платеж дублируется в соседние корзины, точная разница дат проверяется после.
+    Неоднозначными считаются строки, у которых несколько кандидатов,
+    или кандидаты, которые претендуют на несколько строк.
+    """
+    matched_parts = []
+    ambiguous_parts = []
+    statement_left = statement
+    payments_left = payments
+
+    for key in ("transaction_id", "reference_number"):
+        pairs = statement_left.dropna(subset=[key])[["line_id", key]].merge(
+            payments_left.dropna(subset=[key])[["payment_id", key]],
+            on=key,
+            how="inner"
+        )
+        unique, ambiguous = _unique_pairs(pairs[["line_id", "payment_id"]])
+        matched_parts.append(unique.assign(match_type=key))
+        ambiguous_parts.append(ambiguous.assign(match_type=key))
+
+        # Строки и платежи с совпавшим ключом дальше не сопоставляются, даже если пара неоднозначна
+        resolved_lines = pairs["line_id"].unique()
+        resolved_payments = pairs["payment_id"].unique()
+        statement_left = statement_left[~statement_left["line_id"].isin(resolved_lines)]
+        payments_left = payments_left[~payments_left["payment_id"].isin(resolved_payments)]
+
+    bucket_days = date_tolerance_days + 1
+    epoch = np.datetime64("1970-01-01", "D")
+    statement_days = (statement_left["value_date"].values.astype("datetime64[D]") - epoch).astype("int64")
+    payment_days = (payments_left["payment_date"].values.astype("datetime64[D]") - epoch).astype("int64")
+
+    lines = pd.DataFrame({
+        "line_id": statement_left["line_id"].values,
+        "amount_cents": statement_left["amount_cents"].values,
+        "bucket": statement_days // bucket_days,
+        "line_day": statement_days,
+    })
+    candidates = pd.DataFrame({
+        "payment_id": payments_left["payment_id"].values,
+        "amount_cents": payments_left["amount_cents"].values,
+        "bucket": payment_days // bucket_days,
+        "payment_day": payment_days,
+    })
+    # Платеж попадает в свою и соседние корзины: так находятся все пары с |разница| <= допуск
+    candidates = pd.concat(
+        [candidates.assign(bucket=candidates["bucket"] + shift) for shift in (-1, 0, 1)],
+        ignore_index=True
+    )
+
+    pairs = lines.merge(candidates, on=["amount_cents", "bucket"], how="inner")
+    pairs = pairs[(pairs["line_day"] - pairs["payment_day"]).abs() <= date_tolerance_days]
+    unique, ambiguous = _unique_pairs(pairs[["line_id", "payment_id"]])
+    matched_parts.append(unique.assign(match_type="amount_date"))
+    ambiguous_parts.append(ambiguous.assign(match_type="amount_date"))
+
+    matched = pd.concat(matched_parts, ignore_index=True)
+    ambiguous = pd.concat(ambiguous_parts, ignore_index=True)
+
+    matched_lines = matched["line_id"]
+    ambiguous_lines = ambiguous["line_id"]
+    unmatched_statement = statement[
+        ~statement["line_id"].isin(matched_lines) & ~statement["line_id"].isin(ambiguous_lines)
+    ]
+    unmatched_payments = payments[
+        ~payments["payment_id"].isin(matched["payment_id"]) & ~payments["payment_id"].isin(ambiguous["payment_id"])
+    ]
+
+    return ReconciliationResult(
+        matched=matched,
+        ambiguous=ambiguous,
+        unmatched_statement=unmatched_statement.reset_index(drop=True),
+        unmatched_payments=unmatched_payments.reset_index(drop=True),
+    )
\ No newline at end of file
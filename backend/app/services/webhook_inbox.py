@@ -0,0 +1,185 @@
+from typing import Any, Callable, Dict, List, Tuple
+import json
+import logging
+import os
+import socket
+
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError, TimeoutError as RedisTimeoutError
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Redis stream с сырыми вебхуками платежной системы (AOF в Redis включен)
+WEBHOOK_STREAM = "payments:webhook-inbox"
+WEBHOOK_GROUP = "payment-appliers"
+# События, которые не удалось применить, для ручного разбора
+WEBHOOK_DEAD_LETTER_STREAM = "payments:webhook-dead"
+
+# Не чаще одного внеочередного запуска разбора за это время (дебаунс всплесков)
+DRAIN_DEBOUNCE_SECONDS = 2
+
+# Через сколько миллисекунд чужое неподтвержденное событие забирается другим обработчиком
+CLAIM_IDLE_MS = 60_000
+
+# После стольких доставок событие с временной ошибкой уходит в dead letter
+MAX_DELIVERIES = 5
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Временная ошибка: обрыв соединения, deadlock, таймаут блокировки или запроса.
+    Такое событие повторяется, а не уходит в dead letter.
+    """
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    return isinstance(error, (RedisConnectionError, RedisTimeoutError))
+
+class WebhookInbox:
+    """
+    Входящая очередь вебхуков.
+    Эндпоинт только дописывает событие в stream и сразу отвечает 200,
+    применение платежей выполняет воркер через consumer group.
+    """
+
+    @staticmethod
+    def consumer_name() -> str:
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    @staticmethod
+    def append(payload: Dict[str, Any]) -> str:
+        """Сохранение сырого события, возвращает ID записи в stream"""
+        entry_id = redis_client.xadd(
+            WEBHOOK_STREAM,
+            {"payload": json.dumps(payload, ensure_ascii=False)}
+        )
+        return _decode(entry_id)
+
+    @staticmethod
+    def request_drain() -> bool:
+        """True, если внеочередной разбор очереди еще не запрошен за последние секунды"""
+        return bool(redis_client.set(
+            "payments:webhook-drain-requested", 1, nx=True, ex=DRAIN_DEBOUNCE_SECONDS
+        ))
+
+    @staticmethod
+    def ensure_group() -> None:
+        """Создание consumer group (идемпотентно)"""
+        try:
+            redis_client.xgroup_create(WEBHOOK_STREAM, WEBHOOK_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    @staticmethod
+    def read_batch(consumer: str, count: int = 100) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Пачка событий для обработки: сначала зависшие у упавших обработчиков,
+        затем новые.
+        """
+        _, claimed, *_ = redis_client.xautoclaim(
+            WEBHOOK_STREAM, WEBHOOK_GROUP, consumer,
+            min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=count
+        )
+        entries = list(claimed)
+
+        if len(entries) < count:
+            response = redis_client.xreadgroup(
+                WEBHOOK_GROUP, consumer, {WEBHOOK_STREAM: ">"}, count=count - len(entries)
+            )
+            for _, stream_entries in response or []:
+                entries.extend(stream_entries)
+
+        batch = []
+        orphaned = []
+        for entry_id, fields in entries:
+            if not fields:
+                # Запись удалена из stream, но осталась в списке ожидания
+                orphaned.append(_decode(entry_id))
+                continue
+            fields = {_decode(k): _decode(v) for k, v in fields.items()}
+            batch.append((_decode(entry_id), json.loads(fields["payload"])))
+
+        if orphaned:
+            redis_client.xack(WEBHOOK_STREAM, WEBHOOK_GROUP, *orphaned)
+        return batch
+
+    @staticmethod
+    def ack(entry_ids: List[str]) -> None:
+        """Подтверждение и удаление обработанных событий"""
+        if not entry_ids:
+            return
+        pipe = redis_client.pipeline()
+        pipe.xack(WEBHOOK_STREAM, WEBHOOK_GROUP, *entry_ids)
+        pipe.xdel(WEBHOOK_STREAM, *entry_ids)
+        pipe.execute()
+
+    @staticmethod
+    def deliveries(entry_id: str) -> int:
+        """Сколько раз событие выдавалось обработчикам (счетчик XPENDING)"""
+        pending = redis_client.xpending_range(
+            WEBHOOK_STREAM, WEBHOOK_GROUP, min=entry_id, max=entry_id, count=1
+        )
+        return pending[0]["times_delivered"] if pending else 0
+
+    @staticmethod
+    def drain(
+        apply: Callable[[Dict[str, Any]], Tuple[bool, str]],
+        consumer: str,
+        batch_size: int = 100,
+        max_batches: int = 50
+    ) -> int:
+        """
+        Применение событий пачками; возвращает число подтвержденных.
+        Отказ apply (неверные данные, неизвестный счет) уходит в dead letter и подтверждается.
+        Событие с временной ошибкой пропускается и остается неподтвержденным -
+        XAUTOCLAIM выдаст его снова через CLAIM_IDLE_MS; после MAX_DELIVERIES доставок
+        оно уходит в dead letter, чтобы не задерживать очередь. Остальные события пачки
+        применяются, после такой пачки разбор останавливается до следующего запуска.
+        """
+        processed = 0
+        for _ in range(max_batches):
+            batch = WebhookInbox.read_batch(consumer, count=batch_size)
+            if not batch:
+                break
+
+            done = []
+            retry_later = False
+            for entry_id, payload in batch:
+                try:
+                    success, message = apply(payload)
+                except Exception as e:
+                    if not is_transient_error(e):
+                        success, message = False, f"Error processing payment: {str(e)}"
+                    elif WebhookInbox.deliveries(entry_id) >= MAX_DELIVERIES:
+                        success, message = False, f"Retries exhausted: {str(e)}"
+                    else:
+                        logger.warning("Событие %s будет повторено: %s", entry_id, e)
+                        retry_later = True
+                        continue
+                if not success:
+                    WebhookInbox.dead_letter(entry_id, payload, message)
+                done.append(entry_id)
+
+            # Если воркер упадет до этой строки, события заберет другой обработчик
+            WebhookInbox.ack(done)
+            processed += len(done)
+            if retry_later:
+                break
+
+        return processed
+
+    @staticmethod
+    def dead_letter(entry_id: str, payload: Dict[str, Any], error: str) -> None:
+        """Сохранение события, которое не удалось применить"""
+        redis_client.xadd(
+            WEBHOOK_DEAD_LETTER_STREAM,
+            {
+                "source_id": entry_id,
+                "payload": json.dumps(payload, ensure_ascii=False),
+                "error": error,
+            }
+        )
\ No newline at end of file
@@ -0,0 +1,54 @@
+from celery import Celery
+from celery.schedules import crontab
+
+from app.core.config import settings
+
+# Настройка Celery (точка входа: celery -A app.tasks.celery_app worker)
+celery_app = Celery(
+    'vivadental_tasks',
+    broker=settings.REDIS_URL,
+    backend=settings.REDIS_URL,
+    include=[
+        'app.tasks.notification_tasks',
+        'app.tasks.export_tasks',
+        'app.tasks.payment_tasks',
+        'app.tasks.report_tasks',
+        'app.tasks.sync_tasks',
+    ]
+)
+
+# Периодические задачи (celery -A app.tasks.celery_app beat)
+celery_app.conf.beat_schedule = {
+    'cleanup-export-files': {
+        'task': 'app.tasks.export_tasks.cleanup_export_files',
+        'schedule': 60 * 60,
+    },
+    'export-finance-facts': {
+        'task': 'app.tasks.export_tasks.export_finance_facts',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'export-insurance-registries': {
+        'task': 'app.tasks.export_tasks.export_insurance_registries',
+        'schedule': crontab(day_of_month=1, hour=3, minute=0),
+    },
+    'drain-payment-webhooks': {
+        'task': 'app.tasks.payment_tasks.drain_payment_webhooks',
+        'schedule': 5.0,
+    },
+    'send-daily-receipts': {
+        'task': 'app.tasks.payment_tasks.send_daily_receipts',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'refresh-dashboard-views': {
+        'task': 'app.tasks.report_tasks.refresh_dashboard_views',
+        'schedule': settings.DASHBOARD_VIEWS_REFRESH_INTERVAL,
+    },
+    'reconcile-business-metrics': {
+        'task': 'app.tasks.report_tasks.reconcile_business_metrics',
+        'schedule': settings.BUSINESS_METRICS_RECONCILE_INTERVAL,
+    },
+    'prune-change-log': {
+        'task': 'app.tasks.sync_tasks.prune_change_log',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
\ No newline at end of file
@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+import os
+
+from app.core.config import settings
+from app.core.database import ReadSessionLocal, SessionLocal
+from app.services.analytics_export import AnalyticsExportService
+from app.services.export_jobs import ExportJobService, ExportJobStatus
+from app.services.insurance_registry import InsuranceRegistryService
+from app.services.report_service import ReportService
+from app.tasks.celery_app import celery_app
+
+@celery_app.task
+def run_export_job(job_id: str):
+    """
+    Фоновая выгрузка финансового отчета в файл.
+    Воркер API не держит соединение с БД на время выгрузки.
+    """
+    job = ExportJobService.get_job(job_id)
+    if not job:
+        return
+
+    start_date = date.fromisoformat(job["start_date"])
+    end_date = date.fromisoformat(job["end_date"])
+    export_format = job["format"]
+
+    path = ExportJobService.file_path(job_id, export_format)
+    tmp_path = f"{path}.part"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    db = ReadSessionLocal(read_only=True, deferrable=True)  # Выгрузка только читает - с реплики
+    try:
+        report_service = ReportService(db)
+        total = report_service.count_financial_export_rows(start_date, end_date)
+        ExportJobService.update_job(job_id, status=ExportJobStatus.RUNNING, total=total)
+
+        def on_progress(rows: int):
+            progress = min(99, rows * 100 // total) if total else 99
+            ExportJobService.update_job(job_id, rows=rows, progress=progress)
+
+        if export_format == "excel":
+            with open(tmp_path, "wb") as output:
+                report_service.write_financial_excel(start_date, end_date, output, on_progress)
+        else:
+            stream = (
+                report_service.stream_financial_csv
+                if export_format == "csv"
+                else report_service.stream_financial_ndjson
+            )
+            with open(tmp_path, "w", encoding="utf-8", newline="") as output:
+                for chunk in stream(start_date, end_date, on_progress):
+                    output.write(chunk)
+
+        # Файл появляется под итоговым именем только целиком
+        os.replace(tmp_path, path)
+        ExportJobService.update_job(job_id, status=ExportJobStatus.DONE, progress=100)
+
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        ExportJobService.update_job(job_id, status=ExportJobStatus.FAILED, error=str(e))
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+def cleanup_export_files():
+    """Удаление файлов выгрузок старше срока хранения задач (кроме выполняющихся)"""
+    return ExportJobService.cleanup_files()
+
+@celery_app.task
+def export_finance_facts(incremental: bool = True):
+    """Выгрузка счетов, позиций и платежей в Parquet для аналитики"""
+    db = SessionLocal()
+    try:
+        return AnalyticsExportService(db).export_all(
+            settings.ANALYTICS_EXPORT_DIR, incremental=incremental
+        )
+    finally:
+        db.close()
+
+@celery_app.task
+def export_insurance_registries(month: str = None):
+    """Реестры страховых заявок за месяц (по умолчанию - за прошлый)"""
+    if month is None:
+        month = (date.today().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+    db = SessionLocal()
+    try:
+        return InsuranceRegistryService(db).export_month(month)
+    finally:
+        db.close()
\ No newline at end of file
@@ -1,4 +1,3 @@
-from celery import Celery
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import smtplib
@@ -9,13 +8,7 @@ import requests
 from app.core.config import settings
 from app.models.appointment import Appointment
 from app.models.patient import Patient
-
-# Настройка Celery
-celery_app = Celery(
-    'vivadental_tasks',
-    broker=settings.REDIS_URL,
-    backend=settings.REDIS_URL
-)
+from app.tasks.celery_app import celery_app
 
 # Создаем сессию БД для задач
 engine = create_engine(settings.DATABASE_URL)
@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+from app.core.database import SessionLocal
+from app.services.fiscal_receipts import FiscalReceiptService
+from app.services.reconciliation import ReconciliationService
+from app.services.payment_service import PaymentService
+from app.services.webhook_inbox import WebhookInbox
+from app.tasks.celery_app import celery_app
+
+# Ограничение на один запуск, чтобы задача не занимала воркер бесконечно при потоке событий
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_MAX_BATCHES = 50
+
+@celery_app.task
+def drain_payment_webhooks():
+    """
+    Разбор очереди вебхуков пачками.
+    Платеж применяется идемпотентно по transaction_id, поэтому повторная
+    обработка события после падения воркера или временной ошибки БД безопасна.
+    """
+    WebhookInbox.ensure_group()
+
+    db = SessionLocal()
+    try:
+        return WebhookInbox.drain(
+            PaymentService(db).apply_webhook_event,
+            WebhookInbox.consumer_name(),
+            batch_size=WEBHOOK_BATCH_SIZE,
+            max_batches=WEBHOOK_MAX_BATCHES
+        )
+    finally:
+        db.close()
+
+@celery_app.task
+def send_daily_receipts(day: str = None):
+    """Чеки за день (по умолчанию - за вчера) пакетом отправляются регистратору"""
+    target_day = date.fromisoformat(day) if day else date.today() - timedelta(days=1)
+
+    db = SessionLocal()
+    try:
+        return FiscalReceiptService(db).close_day(target_day)
+    finally:
+        db.close()
+
+@celery_app.task
+def reconcile_statement(path: str, statement_format: str = "csv", date_tolerance_days: int = 2):
+    """Сверка загруженной выписки с платежами; результат - сводка и путь к файлам сверки"""
+    db = SessionLocal()
+    try:
+        return ReconciliationService(db).reconcile_file(path, statement_format, date_tolerance_days)
+    finally:
+        db.close()
\ No newline at end of file
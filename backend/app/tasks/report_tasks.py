@@ -0,0 +1,30 @@
+from app.core.database import SessionLocal
+from app.core.monitoring import set_business_metrics
+from app.services import dashboard_views
+from app.tasks.celery_app import celery_app
+
+@celery_app.task
+def refresh_dashboard_views():
+    """Обновление материализованных представлений дашборда"""
+    db = SessionLocal()
+    try:
+        # При первом запуске представлений еще нет
+        dashboard_views.ensure_dashboard_views(db)
+        dashboard_views.refresh_dashboard_views(db)
+    finally:
+        db.close()
+
+@celery_app.task
+def reconcile_business_metrics():
+    """
+    Сверка бизнес-счетчиков с итоговыми представлениями.
+    Представления обновляются прямо перед чтением, поэтому теряются только
+    изменения, закоммиченные за время самого обновления.
+    """
+    db = SessionLocal()
+    try:
+        dashboard_views.ensure_dashboard_views(db)
+        dashboard_views.refresh_dashboard_views(db)
+        set_business_metrics(dashboard_views.load_business_totals(db))
+    finally:
+        db.close()
\ No newline at end of file
@@ -0,0 +1,13 @@
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.change_feed import ChangeFeedService
+from app.tasks.celery_app import celery_app
+
+@celery_app.task
+def prune_change_log():
+    """Очистка ленты изменений старше CHANGE_LOG_RETENTION_DAYS"""
+    db = SessionLocal()
+    try:
+        return ChangeFeedService(db).prune(settings.CHANGE_LOG_RETENTION_DAYS)
+    finally:
+        db.close()
\ No newline at end of file
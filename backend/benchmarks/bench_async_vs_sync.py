@@ -0,0 +1,164 @@
+"""
+Сравнение синхронного и асинхронного пути запроса к БД под высокой конкуренцией.
+
+Поднимает в процессе uvicorn с парами одинаковых эндпоинтов:
+    /sync/{сценарий}  - def-обработчик, get_db_session (поток Starlette + psycopg2)
+    /async/{сценарий} - async-обработчик, get_async_db_session (asyncpg в event loop)
+Сценарии:
+    sleep    - запрос с pg_sleep, имитирующим задержку БД, и подсчет записей за сутки
+    patients - список пациентов: CRUDPatient.get_multi / AsyncCRUDPatient.get_multi
+    slots    - свободные слоты врача: AppointmentService / AsyncAppointmentService
+    overview - финансовый обзор без кэша: ReportService / AsyncReportService
+
+Запуск против PostgreSQL из DATABASE_URL (для slots нужен хотя бы один врач):
+    python benchmarks/bench_async_vs_sync.py --requests 5000 --concurrency 500 --db-latency 5
+    python benchmarks/bench_async_vs_sync.py --scenarios patients slots --requests 2000
+
+Печатает запросы/сек и p50/p99 задержки для каждого сценария и пути.
+Синхронный путь упирается в пул потоков (по умолчанию 40) и пул соединений,
+асинхронный - только в пул соединений.
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+
+import httpx
+import uvicorn
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal, get_async_db_session, get_db_session
+from app.crud.patient import patient as patient_crud, async_patient
+from app.models.doctor import Doctor
+from app.services.appointment_service import AppointmentService, AsyncAppointmentService
+from app.services.report_service import ReportService, AsyncReportService
+
+SCENARIOS = ("sleep", "patients", "slots", "overview")
+
+QUERY = text(
+    "SELECT pg_sleep(:delay), "
+    "(SELECT count(*) FROM appointments WHERE scheduled_start >= now() - interval '1 day') AS appointments"
+)
+
+def create_app(delay: float, doctor_id: str) -> FastAPI:
+    app = FastAPI()
+    overview_start = date.today() - timedelta(days=30)
+
+    @app.get("/sync/sleep")
+    def sync_sleep(db: Session = Depends(get_db_session)):
+        return {"appointments": db.execute(QUERY, {"delay": delay}).one().appointments}
+
+    @app.get("/async/sleep")
+    async def async_sleep(db: AsyncSession = Depends(get_async_db_session)):
+        return {"appointments": (await db.execute(QUERY, {"delay": delay})).one().appointments}
+
+    @app.get("/sync/patients")
+    def sync_patients(db: Session = Depends(get_db_session)):
+        return {"patients": len(patient_crud.get_multi(db, limit=50, is_active=True))}
+
+    @app.get("/async/patients")
+    async def async_patients(db: AsyncSession = Depends(get_async_db_session)):
+        return {"patients": len(await async_patient.get_multi(db, limit=50, is_active=True))}
+
+    @app.get("/sync/slots")
+    def sync_slots(db: Session = Depends(get_db_session)):
+        return {"slots": len(AppointmentService(db).find_available_slots(doctor_id, date.today()))}
+
+    @app.get("/async/slots")
+    async def async_slots(db: AsyncSession = Depends(get_async_db_session)):
+        return {"slots": len(await AsyncAppointmentService(db).find_available_slots(doctor_id, date.today()))}
+
+    @app.get("/sync/overview")
+    def sync_overview(db: Session = Depends(get_db_session)):
+        overview = ReportService(db).get_financial_overview(overview_start, date.today())
+        return {"errors": overview.get("errors", {})}
+
+    @app.get("/async/overview")
+    async def async_overview():
+        overview = await AsyncReportService().get_financial_overview(overview_start, date.today())
+        return {"errors": overview.get("errors", {})}
+
+    return app
+
+def first_doctor_id() -> str:
+    with SessionLocal() as db:
+        doctor_id = db.execute(select(Doctor.id).limit(1)).scalar()
+    return str(doctor_id) if doctor_id else ""
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+async def run_load(url: str, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def send():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        # Прогрев: соединения пулов и клиента
+        await asyncio.gather(*(send() for _ in range(min(concurrency, 100))))
+        latencies.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "errors": errors,
+    }
+
+def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--db-latency", type=float, default=5.0, help="Задержка запроса в БД, мс")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    doctor_id = first_doctor_id()
+    scenarios = [s for s in args.scenarios if s != "slots" or doctor_id]
+    if len(scenarios) < len(args.scenarios):
+        print("slots: пропущен, в базе нет врачей")
+
+    server = start_server(create_app(args.db_latency / 1000, doctor_id), args.port)
+    try:
+        for scenario in scenarios:
+            for path in ("sync", "async"):
+                url = f"http://127.0.0.1:{args.port}/{path}/{scenario}"
+                result = asyncio.run(run_load(url, args.requests, args.concurrency))
+                print(
+                    f"{scenario:>8} {path:>5}: {result['rps']:8.0f} req/s  "
+                    f"p50 {result['p50']:7.1f} ms  p99 {result['p99']:7.1f} ms  errors {result['errors']}"
+                )
+    finally:
+        server.should_exit = True
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
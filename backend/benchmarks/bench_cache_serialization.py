@@ -0,0 +1,124 @@
+"""
+Сравнение форматов записей кэша на типичных отчетах и статистике дашборда.
+
+Без Redis и БД: данные генерируются в форме ReportService.get_financial_overview,
+DashboardCache и карточки пациента.
+    python benchmarks/bench_cache_serialization.py --days 365 --repeat 200
+
+Для каждой пары сериализатор/сжатие печатает размер записи и время
+кодирования/декодирования одного значения (медиана).
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from app.core.cache_serialization import COMPRESSORS, SERIALIZERS, CacheCodec
+
+def financial_overview(days: int) -> dict:
+    start = date.today() - timedelta(days=days - 1)
+    return {
+        "period": {"start_date": start.isoformat(), "end_date": date.today().isoformat()},
+        "metrics": {
+            "invoice_count": 18250,
+            "total_revenue": 91250000.0,
+            "collected_revenue": 87400000.0,
+            "outstanding_debt": 3850000.0,
+            "paid_amount": 85100000.0,
+            "overdue_debt": 1200000.0,
+            "avg_invoice_amount": 5000.0,
+            "collection_rate": 95.78,
+        },
+        "time_series": [
+            {
+                "date": (start + timedelta(days=i)).isoformat(),
+                "invoice_count": random.randint(20, 80),
+                "revenue": round(random.uniform(100000, 400000), 2),
+                "collected": round(random.uniform(90000, 380000), 2),
+            }
+            for i in range(days)
+        ],
+        "top_doctors": [
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"Иванов{i} Иван",
+                "specialization": "Терапевт",
+                "invoice_count": random.randint(100, 900),
+                "revenue": round(random.uniform(1e6, 9e6), 2),
+            }
+            for i in range(10)
+        ],
+        "top_services": [
+            {"code": f"A16.07.{i:03d}", "name": f"Услуга {i}", "count": random.randint(10, 500),
+             "revenue": round(random.uniform(1e5, 2e6), 2)}
+            for i in range(10)
+        ],
+    }
+
+def dashboard_entry() -> dict:
+    return {
+        "data": {
+            "appointments": {"total": 1540, "completed": 1320, "cancelled": 95, "no_show": 41},
+            "patients": {"total": 24810, "new": 312},
+            "finance": {"revenue": 7700000.0, "collected": 7350000.0, "debt": 350000.0},
+            "daily": [{"date": (date.today() - timedelta(days=i)).isoformat(), "count": random.randint(40, 90)}
+                      for i in range(30)],
+        },
+        "computed_at": time.time(),
+    }
+
+def patient_card() -> dict:
+    """Значения с Decimal, датами и UUID - то, что pickle раньше сохранял как есть"""
+    return {
+        "id": uuid.uuid4(),
+        "birth_date": date(1985, 3, 14),
+        "balance": Decimal("-1250.00"),
+        "invoices": [
+            {"id": uuid.uuid4(), "issue_date": date.today() - timedelta(days=i),
+             "total_amount": Decimal("4500.00"), "paid_amount": Decimal("4500.00"),
+             "paid_at": datetime.now() - timedelta(days=i)}
+            for i in range(50)
+        ],
+    }
+
+def timed(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365, help="Дней во временном ряду отчета")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--compress-min-bytes", type=int, default=2048)
+    args = parser.parse_args()
+
+    random.seed(1)
+    payloads = {
+        f"report {args.days}d": financial_overview(args.days),
+        "dashboard": dashboard_entry(),
+        "patient card": patient_card(),
+    }
+
+    print(f"{'payload':<14} {'format':<16} {'bytes':>8} {'encode, us':>11} {'decode, us':>11}")
+    for payload_name, payload in payloads.items():
+        for serializer in SERIALIZERS:
+            for compression in ["none", *COMPRESSORS]:
+                codec = CacheCodec(serializer, compression, compress_min_bytes=args.compress_min_bytes)
+                encoded = codec.encode(payload)
+                encode_us = timed(lambda: codec.encode(payload), args.repeat)
+                decode_us = timed(lambda: codec.decode(encoded), args.repeat)
+                print(
+                    f"{payload_name:<14} {serializer + '+' + compression:<16} "
+                    f"{len(encoded):>8} {encode_us:>11.1f} {decode_us:>11.1f}"
+                )
+        print()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+Нагрузочный тест сверки выписки с платежами на синтетических данных.
+
+Запуск (БД не нужна):
+    python benchmarks/bench_reconciliation.py --lines 1000000
+
+Генерирует месяц поступлений: часть строк с transaction_id, часть только с
+reference_number, остальные сопоставляются по сумме и дате; печатает время
+каждого этапа и итоговую сводку.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services.statement_matching import reconcile
+
+def make_data(lines: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2024-03-01") + pd.to_timedelta(rng.integers(0, 31, lines), unit="D")
+    amounts = rng.integers(100, 5_000_000, lines)
+    kind = rng.choice(["tx", "ref", "amount"], size=lines, p=[0.6, 0.25, 0.15])
+
+    ids = pd.Series([f"id-{i}" for i in range(lines)], dtype="string")
+    payments = pd.DataFrame({
+        "payment_id": pd.Series([f"p-{i}" for i in range(lines)]),
+        "transaction_id": ids.where(kind == "tx"),
+        "reference_number": ids.where(kind == "ref"),
+        "amount_cents": amounts,
+        "payment_date": days,
+    })
+    # Банк зачисляет с задержкой до двух дней
+    statement = pd.DataFrame({
+        "line_id": np.arange(lines, dtype="int64"),
+        "transaction_id": ids.where(kind == "tx"),
+        "reference_number": ids.where(kind == "ref"),
+        "amount_cents": amounts,
+        "value_date": days + pd.to_timedelta(rng.integers(0, 3, lines), unit="D"),
+    })
+    return statement, payments
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--tolerance", type=int, default=2)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    statement, payments = make_data(args.lines)
+    print(f"generate:   {time.perf_counter() - started:.2f} s ({args.lines} lines)")
+
+    started = time.perf_counter()
+    result = reconcile(statement, payments, args.tolerance)
+    print(f"reconcile:  {time.perf_counter() - started:.2f} s")
+
+    for name, value in result.summary().items():
+        print(f"{name + ':':<22}{value}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Нагрузочный тест приема вебхуков: всплеск из 1000 платежных уведомлений.
+
+Запуск против работающего API и Redis:
+    python benchmarks/bench_webhook_intake.py --url http://localhost:8000/api/v1/finance/payment-webhook
+
+Печатает пропускную способность приема, p50/p99 задержки ответа
+и время, за которое воркер разобрал входящую очередь.
+Без --invoice-id события уходят в dead-letter (счет не найден) - это
+измеряет прием и разбор очереди; для полного пути укажите счет с долгом
+не меньше count рублей.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import time
+import uuid
+
+import httpx
+import redis
+
+WEBHOOK_STREAM = "payments:webhook-inbox"
+
+def make_payload(secret: str, invoice_id: str) -> dict:
+    """Подписанное уведомление о платеже в формате, который ждет PaymentService"""
+    payment_id = f"bench-{uuid.uuid4().hex}"
+    body = json.dumps({"id": payment_id})
+    return {
+        "event": "payment.succeeded",
+        "object": {
+            "id": payment_id,
+            "amount": {"value": "1.00", "currency": "RUB"},
+            "payment_method": {"id": payment_id},
+            "metadata": {"invoice_id": invoice_id},
+        },
+        "body": body,
+        "signature": hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest(),
+    }
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+async def send_burst(url: str, payloads: list, concurrency: int) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def send(payload):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(url, json=payload)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        await asyncio.gather(*(send(p) for p in payloads))
+
+    return latencies
+
+def wait_for_drain(redis_url: str, timeout: float) -> float:
+    """Ожидание, пока воркер разберет очередь; возвращает время в секундах"""
+    client = redis.Redis.from_url(redis_url)
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if client.xlen(WEBHOOK_STREAM) == 0:
+            return time.perf_counter() - started
+        time.sleep(0.05)
+    return float("nan")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/api/v1/finance/payment-webhook")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379"))
+    parser.add_argument("--secret", default=os.environ.get("YOOKASSA_WEBHOOK_SECRET", ""))
+    parser.add_argument("--invoice-id", default=str(uuid.uuid4()))
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    payloads = [make_payload(args.secret, args.invoice_id) for _ in range(args.count)]
+
+    started = time.perf_counter()
+    latencies = asyncio.run(send_burst(args.url, payloads, args.concurrency))
+    elapsed = time.perf_counter() - started
+
+    print(f"webhooks:      {args.count} (concurrency {args.concurrency})")
+    print(f"intake time:   {elapsed:.2f} s, {args.count / elapsed:.0f} req/s")
+    print(f"latency p50:   {statistics.median(latencies) * 1000:.1f} ms")
+    print(f"latency p99:   {percentile(latencies, 99) * 1000:.1f} ms")
+
+    drain = wait_for_drain(args.redis_url, args.drain_timeout)
+    print(f"inbox drained: {drain:.2f} s after the burst")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Локальная заглушка фискального регистратора для проверки пакетной отправки чеков.
+
+Запуск:
+    python benchmarks/fiscal_registrar_stub.py --port 8090 --delay 0.05
+
+Принимает POST /receipts с телом NDJSON (по чеку на строку), проверяет, что
+каждая строка - JSON с подписью, и отвечает количеством принятых чеков.
+--delay имитирует время обработки пачки регистратором.
+Для закрытия дня укажите FISCAL_REGISTRAR_URL=http://localhost:8090/receipts.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class RegistrarHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    received = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        accepted = 0
+        for line in self._read_lines():
+            if not line.strip():
+                continue
+            receipt = json.loads(line)
+            if "signature" not in receipt:
+                self._reply(422, {"error": f"receipt without signature: {receipt.get('external_id')}"})
+                return
+            accepted += 1
+
+        time.sleep(self.delay)
+        with RegistrarHandler.lock:
+            RegistrarHandler.received += accepted
+            total = RegistrarHandler.received
+        self._reply(200, {"accepted": accepted, "total": total})
+
+    def _read_lines(self):
+        # Клиент шлет тело потоком (chunked), поэтому Content-Length может отсутствовать
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        return body.decode().splitlines()
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    RegistrarHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), RegistrarHandler)
+    print(f"fiscal registrar stub on http://{args.host}:{args.port}/receipts")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"receipts received: {RegistrarHandler.received}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
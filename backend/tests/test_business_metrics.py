@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, Numeric
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from app.core.monitoring import track_business_metrics
+
+Base = declarative_base()
+
+# Таблицы с теми же именами и полями, что следят счетчики
+class PatientRow(Base):
+    __tablename__ = "patients"
+    id = Column(Integer, primary_key=True)
+    is_active = Column(Boolean, default=True)
+
+class AppointmentRow(Base):
+    __tablename__ = "appointments"
+    id = Column(Integer, primary_key=True)
+    status = Column(String(20))
+
+class InvoiceRow(Base):
+    __tablename__ = "invoices"
+    id = Column(Integer, primary_key=True)
+    total_amount = Column(Numeric(10, 2), default=0)
+    paid_amount = Column(Numeric(10, 2), default=0)
+
+def test_business_metric_deltas_from_flush():
+    """Тест изменений бизнес-счетчиков по созданию, отмене и оплате"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    track_business_metrics(Session)
+    db = Session()
+
+    db.add_all([
+        PatientRow(), PatientRow(is_active=False),
+        AppointmentRow(status="scheduled"),
+        InvoiceRow(total_amount=Decimal("100.50"))
+    ])
+    db.flush()
+
+    db.query(AppointmentRow).one().status = "cancelled"
+    db.query(InvoiceRow).one().paid_amount = Decimal("40.25")
+    db.flush()
+
+    deltas = db.info["business_metric_deltas"]
+    assert deltas["patients"] == 1
+    assert deltas["appointments:scheduled"] == 0
+    assert deltas["appointments:cancelled"] == 1
+    assert deltas["revenue_cents"] == 10050
+    assert deltas["collected_cents"] == 4025
+
+    db.rollback()
+    assert "business_metric_deltas" not in db.info
\ No newline at end of file
@@ -0,0 +1,66 @@
+import pickle
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+
+from app.core.cache_serialization import CacheCodec
+
+def make_payload():
+    return {
+        "invoice_id": uuid4(),
+        "amount": Decimal("1250.50"),
+        "issue_date": date(2024, 5, 31),
+        "paid_at": datetime(2024, 6, 1, 9, 30, tzinfo=timezone.utc),
+        "slot": time(14, 15),
+        "by_day": {date(2024, 5, 30): 3, date(2024, 5, 31): 5},
+        "rows": [{"revenue": 10.5, "status": "paid", "note": None}] * 3,
+    }
+
+def test_msgpack_restores_types():
+    """Тест: msgpack восстанавливает Decimal, даты, время и UUID"""
+    codec = CacheCodec(serializer="msgpack", compression="none")
+    payload = make_payload()
+
+    assert codec.decode(codec.encode(payload)) == payload
+
+def test_orjson_restores_decimal_and_dates():
+    """Тест: orjson восстанавливает Decimal и даты, UUID возвращается строкой"""
+    codec = CacheCodec(serializer="orjson", compression="none")
+    payload = make_payload()
+
+    restored = codec.decode(codec.encode(payload))
+
+    assert restored["amount"] == payload["amount"]
+    assert restored["paid_at"] == payload["paid_at"]
+    assert restored["issue_date"] == payload["issue_date"]
+    assert restored["invoice_id"] == str(payload["invoice_id"])
+
+@pytest.mark.parametrize("compression", ["zstd", "lz4"])
+def test_compression_above_threshold(compression):
+    """Тест: сжимаются только значения больше порога"""
+    codec = CacheCodec(compression=compression, compress_min_bytes=256)
+    small = {"count": 1}
+    large = {"rows": [{"date": date(2024, 1, day), "revenue": Decimal("100.00")} for day in range(1, 29)] * 10}
+
+    encoded_large = codec.encode(large)
+
+    assert codec.encode(small) == CacheCodec(compression="none").encode(small)
+    assert len(encoded_large) < len(CacheCodec(compression="none").encode(large))
+    assert codec.decode(encoded_large) == large
+
+def test_other_schema_version_is_miss():
+    """Тест: запись другой версии схемы или старый pickle - промах"""
+    old = CacheCodec(schema_version=1)
+    new = CacheCodec(schema_version=2)
+
+    assert new.decode(old.encode({"a": 1})) is None
+    assert new.decode(pickle.dumps({"a": 1})) is None
+
+def test_pickle_entries_read_only_when_selected():
+    """Тест: pickle-записи не читаются, если pickle не выбран сериализатором"""
+    entry = CacheCodec(serializer="pickle").encode({"a": 1})
+
+    assert CacheCodec(serializer="msgpack").decode(entry) is None
+    assert CacheCodec(serializer="pickle").decode(entry) == {"a": 1}
\ No newline at end of file
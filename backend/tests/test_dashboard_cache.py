@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from datetime import date
+
+import fakeredis
+import pytest
+
+from app.core import local_cache
+from app.core import redis_client as redis_module
+from app.core.config import settings
+from app.core.local_cache import LocalCache, TwoTierCache
+from app.services import dashboard_cache
+from app.services.dashboard_cache import DashboardCache, with_cache_info
+
+START, END = date(2024, 3, 1), date(2024, 3, 31)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """fakeredis, кэш с копией в памяти и управляемые часы для возраста записей"""
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis_module, "redis_client", client)
+    monkeypatch.setattr(local_cache, "redis_client", client)
+    monkeypatch.setattr(dashboard_cache, "redis_client", client)
+
+    cache = TwoTierCache(LocalCache(max_bytes=1 << 20), local_ttl=30)
+    cache._listener_pid = os.getpid()
+    cache._subscribed = True
+    monkeypatch.setattr(dashboard_cache, "two_tier_cache", cache)
+
+    now = [1_000_000.0]
+    monkeypatch.setattr(dashboard_cache, "_clock", lambda: now[0])
+    return now
+
+class Compute:
+    """Расчет статистики: номер расчета в данных, счетчик вызовов, необязательная задержка"""
+
+    def __init__(self, delay: float = 0):
+        self.calls = 0
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, start_date, end_date):
+        with self.lock:
+            self.calls += 1
+            run = self.calls
+        time.sleep(self.delay)
+        return {"run": run}
+
+def refreshes(monkeypatch):
+    """Фоновые пересчеты, запущенные DashboardCache (чтобы дождаться их в тесте)"""
+    threads = []
+    original = DashboardCache._refresh_in_background
+
+    def spy(key, compute):
+        thread = original(key, compute)
+        if thread:
+            threads.append(thread)
+        return thread
+    monkeypatch.setattr(DashboardCache, "_refresh_in_background", staticmethod(spy))
+    return threads
+
+def test_fresh_then_stale_then_refreshed(clock, monkeypatch):
+    """Тест: свежая запись отдается без пересчета, устаревшая - сразу, с пересчетом в фоне"""
+    compute = Compute()
+    threads = refreshes(monkeypatch)
+
+    assert DashboardCache.get_stats(START, END, compute) == ({"run": 1}, 0.0)
+
+    clock[0] += settings.DASHBOARD_CACHE_FRESH - 1
+    assert DashboardCache.get_stats(START, END, compute) == ({"run": 1}, settings.DASHBOARD_CACHE_FRESH - 1)
+    assert threads == []
+
+    clock[0] += 1
+    data, age = DashboardCache.get_stats(START, END, compute)
+    assert (data, age) == ({"run": 1}, settings.DASHBOARD_CACHE_FRESH)
+    assert len(threads) == 1
+    threads[0].join(timeout=2)
+
+    assert DashboardCache.get_stats(START, END, compute) == ({"run": 2}, 0.0)
+    assert compute.calls == 2
+
+def test_stale_entry_refreshed_once(clock, monkeypatch):
+    """Тест: пока идет фоновый пересчет, другие запросы его не запускают"""
+    compute = Compute(delay=0.2)
+    threads = refreshes(monkeypatch)
+    DashboardCache.get_stats(START, END, compute)
+
+    clock[0] += settings.DASHBOARD_CACHE_FRESH
+    for _ in range(3):
+        assert DashboardCache.get_stats(START, END, compute)[0] == {"run": 1}
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert compute.calls == 2
+
+def test_expired_entry_recomputed_in_request(clock, monkeypatch):
+    """Тест: после DASHBOARD_CACHE_TTL запись удалена и считается в самом запросе"""
+    monkeypatch.setattr(settings, "DASHBOARD_CACHE_TTL", 1)
+    compute = Compute()
+    DashboardCache.get_stats(START, END, compute)
+
+    time.sleep(1.1)
+    clock[0] += 1
+
+    assert DashboardCache.get_stats(START, END, compute) == ({"run": 2}, 0.0)
+
+def test_empty_cache_single_flight(clock):
+    """Тест: параллельные запросы при пустом кэше ждут один расчет"""
+    compute = Compute(delay=0.3)
+    results = []
+
+    def request():
+        results.append(DashboardCache.get_stats(START, END, compute)[0])
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert compute.calls == 1
+    assert results == [{"run": 1}] * 3
+
+def test_incomplete_stats_not_cached(clock):
+    """Тест: статистика с упавшими секциями не кэшируется"""
+    calls = []
+
+    def compute(start_date, end_date):
+        calls.append(1)
+        return {"errors": {"finance": "timeout"}}
+
+    DashboardCache.get_stats(START, END, compute)
+    DashboardCache.get_stats(START, END, compute)
+    assert len(calls) == 2
+
+def test_cache_info():
+    """Тест: cache_age округляется, cache_stale - с границы свежести"""
+    assert with_cache_info({"a": 1}, 12.345) == {"a": 1, "cache_age": 12.3, "cache_stale": False}
+    assert with_cache_info({}, settings.DASHBOARD_CACHE_FRESH)["cache_stale"] is True
\ No newline at end of file
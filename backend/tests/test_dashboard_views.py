@@ -0,0 +1,116 @@
+import enum
+import importlib
+import sys
+import types
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Boolean, Column, DateTime, Enum, Integer, String, create_engine, text
+from sqlalchemy.orm import Session, declarative_base
+
+# Заменители моделей: пакет app.models в этом дереве не импортируется
+Base = declarative_base()
+
+class AppointmentStatus(enum.Enum):
+    SCHEDULED = "scheduled"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+class Appointment(Base):
+    __tablename__ = "appointments"
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, nullable=False)
+    doctor_id = Column(String, nullable=False)
+    scheduled_start = Column(DateTime, nullable=False)
+    status = Column(Enum(AppointmentStatus), nullable=False)
+
+class Patient(Base):
+    __tablename__ = "patients"
+    id = Column(Integer, primary_key=True)
+    is_active = Column(Boolean, nullable=False)
+
+@pytest.fixture
+def views(monkeypatch):
+    """Модуль dashboard_views, собранный на моделях-заменителях"""
+    package = types.ModuleType("app.models")
+    package.__path__ = []
+    appointment = types.ModuleType("app.models.appointment")
+    appointment.Appointment, appointment.AppointmentStatus = Appointment, AppointmentStatus
+    patient = types.ModuleType("app.models.patient")
+    patient.Patient = Patient
+    for module in (package, appointment, patient):
+        monkeypatch.setitem(sys.modules, module.__name__, module)
+
+    sys.modules.pop("app.services.dashboard_views", None)
+    yield importlib.import_module("app.services.dashboard_views")
+    sys.modules.pop("app.services.dashboard_views", None)
+
+# На SQLite представления заменяются обычными таблицами с теми же колонками
+VIEW_TABLES_DDL = [
+    "CREATE TABLE mv_daily_appointments (day DATE, doctor_id CHAR(32), status VARCHAR(16), appointments INTEGER)",
+    "CREATE TABLE mv_patient_totals (id INTEGER, total INTEGER, active INTEGER, with_appointments INTEGER)",
+    "CREATE TABLE mv_invoice_totals (id INTEGER, revenue NUMERIC(14, 2), collected NUMERIC(14, 2))",
+]
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+def test_sources_fall_back_to_live_tables_before_views_exist(views, db):
+    """Тест: без представлений дашборд считает по таблицам, флаг готовности не взводится"""
+    db.add_all([Patient(id=1, is_active=True), Patient(id=2, is_active=True), Patient(id=3, is_active=False)])
+    db.add_all([
+        Appointment(patient_id=1, doctor_id="d1", scheduled_start=datetime(2024, 3, 5, 9), status=AppointmentStatus.COMPLETED),
+        Appointment(patient_id=1, doctor_id="d1", scheduled_start=datetime(2024, 3, 5, 11), status=AppointmentStatus.COMPLETED),
+        Appointment(patient_id=2, doctor_id="d2", scheduled_start=datetime(2024, 3, 6, 9), status=AppointmentStatus.CANCELLED),
+    ])
+    db.commit()
+
+    source = views.daily_appointments_source(db)
+    rows = db.query(source.c.doctor_id, source.c.status, source.c.appointments).order_by(source.c.doctor_id).all()
+    totals = views.patient_totals_source(db)
+
+    assert source is views.live_daily_appointments
+    assert rows == [("d1", AppointmentStatus.COMPLETED, 2), ("d2", AppointmentStatus.CANCELLED, 1)]
+    assert db.query(totals.c.total, totals.c.active, totals.c.with_appointments).one() == (3, 2, 2)
+    assert views.dashboard_views_ready(db) is False
+
+def test_sources_switch_to_views_once_ready(views, db, monkeypatch):
+    """Тест: после создания представлений чтение идет из них"""
+    monkeypatch.setattr(views, "_views_ready", True)
+
+    assert views.daily_appointments_source(db) is views.daily_appointments
+    assert views.patient_totals_source(db) is views.patient_totals
+
+def test_load_business_totals_reads_views(views, db):
+    """Тест: бизнес-счетчики берутся из представлений, суммы в копейках, записи по статусам"""
+    for statement in VIEW_TABLES_DDL:
+        db.execute(text(statement))
+    db.execute(views.patient_totals.insert().values(id=1, total=3, active=2, with_appointments=2))
+    db.execute(views.invoice_totals.insert().values(id=1, revenue=Decimal("1500.50"), collected=Decimal("700.25")))
+    d1, d2 = uuid.uuid4(), uuid.uuid4()
+    db.execute(views.daily_appointments.insert(), [
+        {"day": date(2024, 3, 5), "doctor_id": d1, "status": AppointmentStatus.COMPLETED, "appointments": 2},
+        {"day": date(2024, 3, 6), "doctor_id": d1, "status": AppointmentStatus.COMPLETED, "appointments": 3},
+        {"day": date(2024, 3, 6), "doctor_id": d2, "status": AppointmentStatus.CANCELLED, "appointments": 1},
+    ])
+
+    assert views.load_business_totals(db) == {
+        "patients": 2,
+        "revenue_cents": 150050,
+        "collected_cents": 70025,
+        "appointments:completed": 5,
+        "appointments:cancelled": 1,
+    }
+
+def test_load_business_totals_defaults_to_zero_on_empty_views(views, db):
+    """Тест: пустые представления дают нули, а не ошибку"""
+    for statement in VIEW_TABLES_DDL:
+        db.execute(text(statement))
+
+    assert views.load_business_totals(db) == {"patients": 0, "revenue_cents": 0, "collected_cents": 0}
\ No newline at end of file
@@ -0,0 +1,43 @@
+import os
+import time
+from datetime import date
+
+import fakeredis
+import pytest
+
+from app.core.config import settings
+from app.services import export_jobs
+from app.services.export_jobs import ExportJobService, ExportJobStatus
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    monkeypatch.setattr(export_jobs, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(settings, "EXPORT_STORAGE_DIR", str(tmp_path))
+    return tmp_path
+
+def make_file(job_id, export_format, age, suffix=""):
+    path = ExportJobService.file_path(job_id, export_format) + suffix
+    with open(path, "w") as f:
+        f.write("data")
+    past = time.time() - age
+    os.utime(path, (past, past))
+    return os.path.basename(path)
+
+def test_cleanup_keeps_files_of_running_jobs(storage):
+    """Тест: старый .part выполняющейся задачи остается, старые файлы завершенных и забытых задач удаляются"""
+    old = settings.EXPORT_JOB_TTL + 60
+    running = ExportJobService.create_job("financial", "excel", date(2024, 1, 1), date(2024, 12, 31))
+    ExportJobService.update_job(running["job_id"], status=ExportJobStatus.RUNNING)
+    done = ExportJobService.create_job("financial", "csv", date(2024, 1, 1), date(2024, 1, 31))
+    ExportJobService.update_job(done["job_id"], status=ExportJobStatus.DONE)
+
+    kept = [
+        make_file(running["job_id"], "excel", old, ".part"),
+        make_file("fresh", "csv", 60),
+    ]
+    make_file(done["job_id"], "csv", old)
+    make_file("expired-job", "ndjson", old)
+    make_file("crashed-job", "excel", old, ".part")
+
+    assert ExportJobService.cleanup_files() == 3
+    assert sorted(os.listdir(storage)) == sorted(kept)
\ No newline at end of file
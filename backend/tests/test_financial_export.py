@@ -0,0 +1,62 @@
+import csv
+import json
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from openpyxl import load_workbook
+
+from app.services.financial_export import FINANCIAL_EXPORT_COLUMNS, stream_csv, stream_ndjson, write_excel
+
+ROWS = [
+    ("INV-2", "2024-03-02", "Петров Петр", Decimal("200.00"), Decimal("0.00"), Decimal("0.00"),
+     Decimal("200.00"), Decimal("50.00"), Decimal("150.00"), "partially_paid", "card"),
+    ("INV-1", "2024-03-01", "Иванов Иван", Decimal("100.50"), Decimal("10.00"), Decimal("0.00"),
+     Decimal("90.50"), Decimal("90.50"), Decimal("0.00"), "paid", None),
+]
+
+def test_excel_has_header_and_all_rows():
+    """Тест: XLSX содержит заголовок и все строки в порядке курсора"""
+    output = BytesIO()
+
+    assert write_excel(iter(ROWS), output) == 2
+
+    output.seek(0)
+    sheet = load_workbook(output, read_only=True)["Invoices"]
+    values = list(sheet.iter_rows(values_only=True))
+    assert list(values[0]) == FINANCIAL_EXPORT_COLUMNS
+    assert [row[0] for row in values[1:]] == ["INV-2", "INV-1"]
+    assert values[2][2] == "Иванов Иван"
+    assert Decimal(str(values[2][3])) == Decimal("100.50")
+    assert values[1][9:] == ("partially_paid", "card")
+    assert values[2][9] == "paid"
+
+def test_csv_sends_bom_and_header_before_reading_rows():
+    """Тест: BOM и заголовок уходят до первой строки курсора, строки - пачками"""
+    consumed = []
+
+    def cursor():
+        for row in ROWS:
+            consumed.append(row[0])
+            yield row
+
+    chunks = stream_csv(cursor(), batch_size=1)
+    first = next(chunks)
+    assert consumed == []
+    assert first.startswith("\ufeff")
+
+    rest = list(chunks)
+    assert len(rest) == 2
+    parsed = list(csv.reader(StringIO((first + "".join(rest))[1:])))
+    assert parsed[0] == FINANCIAL_EXPORT_COLUMNS
+    assert parsed[1][:4] == ["INV-2", "2024-03-02", "Петров Петр", "200.00"]
+    assert parsed[2][-1] == ""
+
+def test_ndjson_keeps_amounts_exact():
+    """Тест: одна строка JSON на счет, суммы строками без потери точности"""
+    lines = "".join(stream_ndjson(iter(ROWS))).splitlines()
+
+    records = [json.loads(line) for line in lines]
+    assert [record["Номер счета"] for record in records] == ["INV-2", "INV-1"]
+    assert records[1]["Сумма"] == "100.50"
+    assert records[1]["Способ оплаты"] is None
+    assert list(stream_ndjson(iter([]))) == []
\ No newline at end of file
@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+from app.core.line_amounts import line_total
+from app.services.receipt_builder import build_receipt, build_signed_receipt, sign_receipt
+
+ITEM = {
+    "description": "Пломба",
+    "quantity": Decimal("2"),
+    "unit_price": Decimal("1999.99"),
+    "discount_percent": Decimal("10"),
+    "discount_amount": Decimal("0"),
+    "tax_rate": Decimal("20"),
+}
+
+def test_line_total():
+    """Тест расчета позиции: скидка в процентах, ограничение скидки суммой, налог"""
+    # 2 * 1999.99 = 3999.98; скидка 10% = 400.00; база 3599.98; НДС 20% = 720.00
+    assert line_total(
+        ITEM["quantity"], ITEM["unit_price"], ITEM["discount_percent"],
+        ITEM["discount_amount"], ITEM["tax_rate"]
+    ) == Decimal("4319.98")
+    # Скидка 10% (400.00) ограничена суммой 100.00, без налога
+    assert line_total(Decimal("2"), Decimal("1999.99"), Decimal("10"), Decimal("100"), None) == Decimal("3899.98")
+    assert line_total(Decimal("1.5"), Decimal("100"), None, None, None) == Decimal("150.00")
+
+def test_signed_receipt():
+    """Тест сборки и подписи чека без обращения к БД"""
+    invoice = {"invoice_number": "INV-20240101-0001", "paid_amount": Decimal("4319.98"), "total_amount": Decimal("4319.98")}
+    receipt = build_signed_receipt((invoice, [ITEM], {"email": "patient@example.com", "phone": "+79990000000"}))
+
+    assert receipt["external_id"] == "receipt_INV-20240101-0001"
+    assert receipt["items"][0]["amount"] == 4319.98
+    assert receipt["items"][0]["vat_code"] == 1
+
+    unsigned = {k: v for k, v in receipt.items() if k != "signature"}
+    assert receipt["signature"] == sign_receipt(unsigned)
+    assert build_receipt(invoice, [], {})["items"] == []
\ No newline at end of file
@@ -0,0 +1,161 @@
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.services.insurance_limits import InsuranceLimitService
+
+Remaining = namedtuple("Remaining", ["remaining_limit", "remaining_visits"])
+
+class RecordingSession:
+    """Сессия без БД: запоминает SQL операторов в диалекте Postgres и возвращает заданную строку"""
+
+    def __init__(self, row=None, ids=()):
+        self.row = row
+        self.ids = ids
+        self.statements = []
+        self.committed = False
+        self.rolled_back = False
+
+    def execute(self, stmt):
+        self.statements.append(str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})))
+        return self
+
+    def first(self):
+        return self.row
+
+    def scalars(self):
+        return iter(self.ids)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+def test_reserve_is_conditional_update():
+    """Тест: проверка остатка и списание - один UPDATE с условием, без строки - ValueError"""
+    db = RecordingSession(row=Remaining(Decimal("500.00"), 2))
+    service = InsuranceLimitService(db)
+
+    assert service.reserve("c1", Decimal("1500"), on_date=date(2024, 6, 1)) == (Decimal("500.00"), 2)
+    sql = db.statements[0]
+    assert sql.startswith("UPDATE insurance_contracts SET")
+    assert "remaining_limit IS NULL OR insurance_contracts.remaining_limit >= 1500.00" in sql
+    assert "remaining_visits IS NULL OR insurance_contracts.remaining_visits >= 1" in sql
+    assert "RETURNING insurance_contracts.remaining_limit, insurance_contracts.remaining_visits" in sql
+
+    db = RecordingSession(row=None)
+    with pytest.raises(ValueError):
+        InsuranceLimitService(db).reserve("c1", Decimal("1500"))
+    # Транзакцией владеет вызывающий код
+    assert not db.rolled_back and not db.committed
+
+def test_release_keeps_unlimited_contract_unlimited():
+    """Тест: возврат не превращает NULL-остаток в годовой лимит"""
+    db = RecordingSession(row=Remaining(None, None))
+
+    InsuranceLimitService(db).release("c1", Decimal("1500"))
+
+    sql = db.statements[0]
+    assert (
+        "remaining_limit=CASE WHEN (insurance_contracts.remaining_limit IS NULL) THEN NULL "
+        "ELSE least(insurance_contracts.remaining_limit + 1500.00, "
+        "coalesce(insurance_contracts.annual_limit, insurance_contracts.remaining_limit + 1500.00)) END"
+    ) in sql
+    assert "remaining_visits=CASE WHEN (insurance_contracts.remaining_visits IS NULL) THEN NULL" in sql
+
+def test_reserve_batch_sums_per_contract():
+    """Тест: суммы по одному договору складываются в одну строку VALUES"""
+    db = RecordingSession(ids=["c1"])
+
+    accepted, rejected = InsuranceLimitService(db).reserve_batch(
+        [("c1", Decimal("100"), 1), ("c1", Decimal("50.5"), 1), ("c2", Decimal("10"), 1)],
+        on_date=date(2024, 6, 1)
+    )
+
+    assert accepted == ["c1"] and rejected == ["c2"]
+    assert not db.committed
+    sql = db.statements[0]
+    assert "FROM (VALUES ('c1', 150.50, 2), ('c2', 10.00, 1)) AS requested" in sql
+    assert "insurance_contracts.remaining_limit >= requested.amount" in sql
+
+@pytest.fixture
+def db():
+    """SQLite с таблицей договоров; least ведет себя как в Postgres (NULL пропускается)"""
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def add_least(dbapi_connection, _):
+        dbapi_connection.create_function(
+            "least", 2, lambda *args: min((a for a in args if a is not None), default=None)
+        )
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE insurance_contracts (id VARCHAR PRIMARY KEY, is_active BOOLEAN, "
+            "start_date DATE, end_date DATE, annual_limit NUMERIC(10, 2), remaining_limit NUMERIC(10, 2), "
+            "visit_limit INTEGER, remaining_visits INTEGER)"
+        ))
+        conn.execute(text(
+            "INSERT INTO insurance_contracts VALUES "
+            "('limited', 1, '2024-01-01', '2024-12-31', 1000, 300, 10, 2), "
+            "('unlimited', 1, '2024-01-01', '2024-12-31', NULL, NULL, NULL, NULL)"
+        ))
+    with Session(engine) as session:
+        yield session
+
+def remaining(db, contract_id):
+    return tuple(db.execute(
+        text("SELECT remaining_limit, remaining_visits FROM insurance_contracts WHERE id = :id"), {"id": contract_id}
+    ).one())
+
+JUNE = date(2024, 6, 1)
+
+def test_limit_never_goes_negative(db):
+    """Тест: резерв сверх остатка отклоняется, остаток не меняется"""
+    service = InsuranceLimitService(db)
+
+    with pytest.raises(ValueError):
+        service.reserve("limited", Decimal("300.01"), on_date=JUNE)
+    assert service.reserve("limited", Decimal("300"), on_date=JUNE) == (Decimal("0.00"), 1)
+    with pytest.raises(ValueError):
+        service.reserve("limited", Decimal("0.01"), on_date=JUNE)
+    with pytest.raises(ValueError):
+        service.reserve("limited", Decimal("300"), on_date=date(2025, 1, 1))
+
+    assert remaining(db, "limited") == (0, 1)
+
+def test_null_limit_is_unlimited(db):
+    """Тест: NULL - без ограничения, и после резерва, и после возврата"""
+    service = InsuranceLimitService(db)
+
+    assert service.reserve("unlimited", Decimal("1000000"), visits=100, on_date=JUNE) == (None, None)
+    assert service.release("unlimited", Decimal("500")) == (None, None)
+
+def test_release_is_capped_at_annual_limit(db):
+    """Тест: возврат не поднимает остаток выше годового лимита"""
+    service = InsuranceLimitService(db)
+
+    assert service.release("limited", Decimal("100")) == (Decimal("400.00"), 3)
+    assert service.release("limited", Decimal("5000"), visits=50) == (Decimal("1000.00"), 10)
+    with pytest.raises(ValueError):
+        service.release("missing", Decimal("1"))
+
+def test_reservation_is_part_of_caller_transaction(db):
+    """Тест: откат счета откатывает резерв; отказ в резерве не откатывает чужие изменения"""
+    service = InsuranceLimitService(db)
+
+    service.reserve("limited", Decimal("100"), on_date=JUNE)
+    db.rollback()
+    assert remaining(db, "limited") == (300, 2)
+
+    db.execute(text("UPDATE insurance_contracts SET visit_limit = 12 WHERE id = 'limited'"))
+    with pytest.raises(ValueError):
+        service.reserve("limited", Decimal("5000"), on_date=JUNE)
+    db.commit()
+    assert db.execute(text("SELECT visit_limit FROM insurance_contracts WHERE id = 'limited'")).scalar() == 12
\ No newline at end of file
@@ -0,0 +1,76 @@
+import csv
+import os
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.services.registry_files import month_bounds, write_registries
+
+Row = namedtuple("Row", [
+    "insurer", "contract_id", "contract_number", "claim_id", "claim_number", "submission_date",
+    "amount_claimed", "status", "last_name", "first_name", "middle_name", "birth_date",
+    "invoice_number", "service_code", "description", "quantity", "unit_price",
+    "discount_percent", "discount_amount", "tax_rate",
+])
+
+def row(insurer, contract, claim, amount, description=None, quantity=None, unit_price=None):
+    return Row(
+        insurer, contract, contract, claim, claim, date(2024, 3, 5),
+        Decimal(amount), "submitted", "Иванов", "Иван", None, date(1990, 1, 1),
+        "INV-1" if description else None, "S-1" if description else None, description,
+        Decimal(quantity) if quantity else None, Decimal(unit_price) if unit_price else None,
+        Decimal("0"), Decimal("0"), Decimal("0"),
+    )
+
+def read(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f, delimiter=";"))
+
+def test_registries_grouped_by_insurer_and_contract(tmp_path):
+    """Тест: файл на страховую, итоги по договорам, заявка с позициями считается один раз"""
+    start, end = month_bounds("2024-03")
+    rows = [
+        row("СК Альфа", "A-1", "CL-1", "300.00", "Осмотр", "1", "100.00"),
+        row("СК Альфа", "A-1", "CL-1", "300.00", "Снимок", "2", "100.00"),
+        row("СК Альфа", "A-2", "CL-2", "50.00"),
+        row("СК Бета", "B-1", "CL-3", "70.00"),
+    ]
+
+    results = write_registries(rows, "2024-03", start, end, str(tmp_path))
+
+    assert [(r["insurer"], r["claims"], r["amount"]) for r in results] == [
+        ("СК Альфа", 2, "350.00"), ("СК Бета", 1, "70.00")
+    ]
+    alfa = read(results[0]["file"])
+    assert alfa[0] == ["H", "R-2024-03", "01.03.2024", "31.03.2024", "СК Альфа"]
+    assert [line[0] for line in alfa] == ["H", "C", "L", "L", "T", "C", "L", "T", "F"]
+    assert alfa[3][-3:] == ["2", "100.00", "200.00"]
+    assert alfa[4] == ["T", "A-1", "1", "300.00"]
+    assert alfa[-1] == ["F", "2", "350.00"]
+    assert sorted(os.listdir(tmp_path)) == ["СК_Альфа.csv", "СК_Бета.csv"]
+
+def test_colliding_insurer_names_get_separate_files(tmp_path):
+    """Тест: названия с одинаковым именем файла не перезаписывают друг друга"""
+    start, end = month_bounds("2024-03")
+    rows = [row("СК Альфа", "A-1", "CL-1", "10.00"), row("СК-Альфа", "A-2", "CL-2", "20.00"), row("ск альфа", "A-3", "CL-3", "30.00")]
+
+    results = write_registries(rows, "2024-03", start, end, str(tmp_path))
+
+    files = [os.path.basename(r["file"]) for r in results]
+    assert len(set(name.lower() for name in files)) == 3
+    assert [read(r["file"])[0][-1] for r in results] == ["СК Альфа", "СК-Альфа", "ск альфа"]
+
+def test_failed_write_keeps_previous_registry(tmp_path):
+    """Тест: при ошибке записи прежний реестр остается, временный .part удаляется"""
+    start, end = month_bounds("2024-03")
+    write_registries([row("СК Альфа", "A-1", "CL-1", "10.00")], "2024-03", start, end, str(tmp_path))
+    previous = read(tmp_path / "СК_Альфа.csv")
+
+    broken = row("СК Альфа", "A-1", "CL-1", "10.00")._replace(amount_claimed=None)
+    with pytest.raises(TypeError):
+        write_registries([broken], "2024-03", start, end, str(tmp_path))
+
+    assert read(tmp_path / "СК_Альфа.csv") == previous
+    assert os.listdir(tmp_path) == ["СК_Альфа.csv"]
\ No newline at end of file
@@ -0,0 +1,81 @@
+import json
+import time
+
+import fakeredis
+
+from app.core import local_cache
+from app.core import redis_client as redis_module
+from app.core.local_cache import LocalCache, TwoTierCache
+from app.core.redis_client import RedisService, _INVALIDATE_TAGS
+
+def test_lru_eviction_by_size():
+    """Тест: при превышении объема вытесняются давно использованные записи"""
+    cache = LocalCache(max_bytes=1000)
+    cache.set("a", {"v": 1}, ttl=60, size=250)
+    cache.set("b", {"v": 2}, ttl=60, size=250)
+    cache.set("c", {"v": 3}, ttl=60, size=250)
+
+    assert cache.get("a") == {"v": 1}  # "a" становится недавно использованной
+    cache.set("d", {"v": 4}, ttl=60, size=250)
+    cache.set("e", {"v": 5}, ttl=60, size=200)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("d") == {"v": 4}
+    assert cache.size == 950
+
+def test_ttl_and_large_entries():
+    """Тест: истекшие записи не отдаются, слишком крупные не сохраняются"""
+    cache = LocalCache(max_bytes=1000)
+    cache.set("short", 1, ttl=0.01, size=10)
+    cache.set("huge", 2, ttl=60, size=600)
+    time.sleep(0.02)
+
+    assert cache.get("short") is None
+    assert cache.get("huge") is None
+    assert len(cache) == 0 and cache.size == 0
+
+def test_invalidation_message_from_other_worker():
+    """Тест: сообщение другого воркера сбрасывает ключи, свое - игнорируется"""
+    cache = TwoTierCache(LocalCache(max_bytes=1000), local_ttl=30)
+    cache.local.set("report:a", 1, ttl=60, size=10)
+    cache.local.set("report:b", 2, ttl=60, size=10)
+
+    cache._apply(json.dumps({"origin": cache._origin(), "keys": ["report:a"]}))
+    assert cache.local.get("report:a") == 1
+
+    cache._apply(json.dumps({"origin": "other-worker", "keys": ["report:a", "report:b"]}))
+    assert cache.local.get("report:a") is None
+    assert cache.local.get("report:b") is None
+
+def test_fill_after_invalidation_is_skipped():
+    """Тест: значение, прочитанное из Redis до сброса, не попадает в память"""
+    cache = LocalCache(max_bytes=1000)
+    generation = cache.generation
+
+    cache.delete("report:a")  # сброс от другого воркера во время чтения из Redis
+    cache.set("report:a", "old", ttl=60, size=10, generation=generation)
+    assert cache.get("report:a") is None
+
+    cache.set("report:a", "new", ttl=60, size=10, generation=cache.generation)
+    assert cache.get("report:a") == "new"
+
+def test_invalidation_survives_redis_outage(monkeypatch):
+    """Тест: недоступный Redis не роняет запись - ошибка логируется, копия в памяти сбрасывается"""
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(local_cache, "redis_client", client)
+    monkeypatch.setattr(redis_module, "redis_client", client)
+    monkeypatch.setattr(RedisService, "_invalidate_tags", client.register_script(_INVALIDATE_TAGS))
+
+    cache = TwoTierCache(LocalCache(max_bytes=1000), local_ttl=30)
+    cache.local.set("services:list", 1, ttl=60, size=10)
+    cache.local.set("services:active", 2, ttl=60, size=10)
+    server.connected = False
+
+    cache.invalidate("services:list")
+    assert cache.local.get("services:list") is None
+    assert cache.local.get("services:active") == 2
+
+    cache.invalidate_tags("services")
+    assert len(cache.local) == 0
\ No newline at end of file
@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.core import database
+from app.core.database import RoutingSession, run_parallel_sections
+
+@pytest.fixture
+def single_worker(monkeypatch):
+    """Секции на SQLite и пул из одного потока, как у занятого общего пула"""
+    engine = create_engine("sqlite://")
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(database, "ReadSessionLocal", lambda **kwargs: RoutingSession(primary=engine, replicas=[], **kwargs))
+    monkeypatch.setattr(database, "_section_executor", executor)
+    yield
+    executor.shutdown(wait=True)
+
+def sleeping(seconds: float):
+    def section(db):
+        time.sleep(seconds)
+        return db.execute(text("SELECT 1")).scalar()
+    return section
+
+def test_deadline_counts_from_section_start(single_worker):
+    """Тест: секция, ждавшая в очереди, получает полный срок от своего начала"""
+    results, errors = run_parallel_sections({"first": sleeping(0.2), "second": sleeping(0.2)}, timeout=0.3)
+
+    assert results == {"first": 1, "second": 1}
+    assert errors == {}
+
+def test_stuck_and_queued_sections_time_out(single_worker):
+    """Тест: зависшая секция и секция, не дождавшаяся потока, отдаются как timeout в срок"""
+    started = time.monotonic()
+    results, errors = run_parallel_sections({"stuck": sleeping(1.0), "queued": sleeping(0)}, timeout=0.2)
+    elapsed = time.monotonic() - started
+
+    assert results == {}
+    assert errors == {"stuck": "timeout", "queued": "timeout"}
+    assert elapsed < 0.6
\ No newline at end of file
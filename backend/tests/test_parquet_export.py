@@ -0,0 +1,100 @@
+import enum
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import fakeredis
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import Column, Date, DateTime, Enum, MetaData, Numeric, String, Table, create_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services import parquet_export
+from app.services.parquet_export import export_fact, get_watermark
+
+class Status(enum.Enum):
+    PAID = "paid"
+    OVERDUE = "overdue"
+
+metadata = MetaData()
+invoices = Table(
+    "invoices", metadata,
+    Column("id", String(36), primary_key=True),
+    Column("issue_date", Date),
+    Column("total_amount", Numeric(10, 2)),
+    Column("status", Enum(Status)),
+    Column("updated_at", DateTime),
+)
+
+SPEC = {
+    "columns": [
+        ("id", invoices.c.id, pa.string()),
+        ("issue_date", invoices.c.issue_date, pa.date32()),
+        ("total_amount", invoices.c.total_amount, pa.decimal128(10, 2)),
+        ("status", invoices.c.status, pa.string()),
+        ("updated_at", invoices.c.updated_at, pa.timestamp("us")),
+    ],
+    "updated_at": invoices.c.updated_at,
+    "partition_by": "issue_date",
+}
+
+NOON = datetime(2024, 4, 10, 12, 0)
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(parquet_export, "redis_client", fakeredis.FakeRedis())
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+def add(db, id, issue_date, amount, updated_at, status=Status.PAID):
+    db.execute(invoices.insert().values(
+        id=id, issue_date=issue_date, total_amount=Decimal(amount), status=status, updated_at=updated_at
+    ))
+    db.commit()
+
+def read(output_dir, month):
+    return pq.read_table(output_dir / "invoices" / f"month={month}").sort_by("id")
+
+def test_rows_partitioned_by_month_with_arrow_types(db, tmp_path):
+    """Тест: файлы по месяцам, деньги decimal, даты date32, enum - значением"""
+    add(db, "a", date(2024, 3, 30), "100.50", NOON)
+    add(db, "b", date(2024, 4, 1), "20.00", NOON + timedelta(minutes=1), Status.OVERDUE)
+    add(db, "c", date(2024, 4, 2), "3.10", NOON + timedelta(minutes=2))
+
+    assert export_fact(db, "invoices", SPEC, str(tmp_path), batch_size=2, incremental=False) == 3
+
+    march, april = read(tmp_path, "2024-03"), read(tmp_path, "2024-04")
+    assert march.schema.field("total_amount").type == pa.decimal128(10, 2)
+    assert march.schema.field("issue_date").type == pa.date32()
+    assert march.to_pylist() == [{
+        "id": "a", "issue_date": date(2024, 3, 30), "total_amount": Decimal("100.50"),
+        "status": "paid", "updated_at": NOON,
+    }]
+    assert april.column("id").to_pylist() == ["b", "c"]
+    assert april.column("status").to_pylist() == ["overdue", "paid"]
+
+def test_incremental_run_keeps_rows_committed_late(db, tmp_path):
+    """Тест: строка с updated_at старше прошлой выгрузки (долгая транзакция) попадает в следующую"""
+    add(db, "old", date(2024, 4, 1), "1.00", NOON - timedelta(days=1))
+    add(db, "a", date(2024, 4, 1), "1.00", NOON)
+    assert export_fact(db, "invoices", SPEC, str(tmp_path), batch_size=10) == 2
+
+    lag = timedelta(seconds=settings.ANALYTICS_WATERMARK_LAG)
+    assert get_watermark("invoices") == NOON - lag
+
+    # Транзакция началась до выгрузки, а закоммичена после нее
+    add(db, "late", date(2024, 4, 2), "2.00", NOON - lag / 2)
+    add(db, "new", date(2024, 4, 2), "3.00", NOON + timedelta(hours=1))
+    assert export_fact(db, "invoices", SPEC, str(tmp_path), batch_size=10) == 3
+
+    ids = read(tmp_path, "2024-04").column("id").to_pylist()
+    # "a" выгружена дважды и схлопывается по id, "old" - только в первый раз
+    assert sorted(ids) == ["a", "a", "late", "new", "old"]
+    assert get_watermark("invoices") == NOON + timedelta(hours=1) - lag
+
+    # Запуск без новых строк не сдвигает отметку назад
+    assert export_fact(db, "invoices", SPEC, str(tmp_path), batch_size=10) == 1
+    assert get_watermark("invoices") == NOON + timedelta(hours=1) - lag
\ No newline at end of file
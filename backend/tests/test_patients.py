@@ -1,16 +1,20 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.core.database import get_db_session
+from app.core.database import get_db_session, get_async_db_session, get_async_read_db_session
 from app.models.base import Base
 
 # Тестовая база данных
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async эндпоинты (список и карточка пациента) читают тот же файл через aiosqlite
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 # Фикстура для БД
 @pytest.fixture(scope="function")
@@ -32,7 +36,14 @@ def client(db):
         finally:
             db.close()
     
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as async_db:
+            yield async_db
+            await async_db.commit()
+    
     app.dependency_overrides[get_db_session] = override_get_db
+    app.dependency_overrides[get_async_db_session] = override_get_async_db
+    app.dependency_overrides[get_async_read_db_session] = override_get_async_db
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -74,4 +85,18 @@ def test_duplicate_phone(client):
     })
     
     assert response.status_code == 400
-    assert "уже существует" in response.json()["detail"]
\ No newline at end of file
+    assert "уже существует" in response.json()["detail"]
+
+def test_list_patients(client):
+    """Тест: созданный пациент виден в async списке"""
+    client.post("/api/v1/patients/", json={
+        "first_name": "Иван",
+        "last_name": "Иванов",
+        "phone": "+998934566336",
+        "birth_date": "1990-01-01"
+    })
+    
+    response = client.get("/api/v1/patients/", params={"search": "Иван"})
+    
+    assert response.status_code == 200
+    assert [item["phone"] for item in response.json()["items"]] == ["+998934566336"]
\ No newline at end of file
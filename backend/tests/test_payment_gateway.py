@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.payment_gateway import (
+    CircuitBreaker, GatewayError, GatewayUnavailableError, PaymentGatewayClient
+)
+
+def make_client(handler, breaker=None, **kwargs):
+    """Клиент против локального фейкового шлюза без сети и без задержек между повторами"""
+    return PaymentGatewayClient(
+        "https://gateway.test/v3",
+        breaker=breaker or CircuitBreaker(5, 30.0),
+        backoff_base=0,
+        transport=httpx.MockTransport(handler),
+        async_transport=httpx.MockTransport(handler),
+        **kwargs
+    )
+
+def test_retry_keeps_idempotence_key():
+    """Тест повторов: 5xx повторяется с тем же ключом идемпотентности"""
+    keys = []
+
+    def handler(request):
+        keys.append(request.headers.get("Idempotence-Key"))
+        if len(keys) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"id": "yk-1"})
+
+    client = make_client(handler)
+    result = client.create_payment({"amount": {"value": "10.00"}}, idempotence_key="pay-1")
+
+    assert result == {"id": "yk-1"}
+    assert keys == ["pay-1", "pay-1", "pay-1"]
+
+def test_client_error_is_not_retried():
+    """Тест: 4xx не повторяется"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"description": "bad request"})
+
+    client = make_client(handler)
+    with pytest.raises(GatewayError):
+        client.create_payment({}, idempotence_key="pay-2")
+
+    assert len(calls) == 1
+
+def test_breaker_opens_and_recovers():
+    """Тест предохранителя: размыкание после серии ошибок и пробный запрос после паузы"""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=lambda: now[0])
+    healthy = [False]
+
+    def handler(request):
+        if healthy[0]:
+            return httpx.Response(200, json={"id": "yk-3"})
+        raise httpx.ConnectError("connection refused")
+
+    client = make_client(handler, breaker=breaker, max_retries=1)
+    with pytest.raises(GatewayError):
+        client.create_payment({}, idempotence_key="pay-3")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Пока цепь разомкнута, запросы отклоняются без обращения к шлюзу
+    with pytest.raises(GatewayUnavailableError):
+        client.create_payment({}, idempotence_key="pay-3")
+
+    now[0] += 10.0
+    healthy[0] = True
+    assert asyncio.run(client.create_payment_async({}, idempotence_key="pay-3")) == {"id": "yk-3"}
+    assert breaker.state == CircuitBreaker.CLOSED
+
+@pytest.mark.parametrize("failure", ["corrupt", "cancel"])
+def test_interrupted_probe_does_not_block_breaker(failure):
+    """Тест: проба, прерванная ошибкой чтения ответа или отменой, не блокирует предохранитель навсегда"""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=lambda: now[0])
+    mode = ["down"]
+
+    async def handler(request):
+        if mode[0] == "down":
+            raise httpx.ConnectError("connection refused")
+        if mode[0] == "cancel":
+            await asyncio.sleep(60)
+        if mode[0] == "corrupt":
+            return httpx.Response(200, content=b"not gzip", headers={"Content-Encoding": "gzip"})
+        return httpx.Response(200, json={"id": "yk-4"})
+
+    client = PaymentGatewayClient(
+        "https://gateway.test/v3", breaker=breaker, max_retries=0,
+        async_transport=httpx.MockTransport(handler)
+    )
+
+    async def scenario():
+        with pytest.raises(GatewayError):
+            await client.create_payment_async({}, idempotence_key="pay-4")
+        now[0] += 10.0
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+        mode[0] = failure
+        if failure == "corrupt":
+            with pytest.raises(httpx.DecodingError):
+                await client.create_payment_async({}, idempotence_key="pay-4")
+        else:
+            task = asyncio.create_task(client.create_payment_async({}, idempotence_key="pay-4"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        # Следующий запрос становится новой пробой
+        mode[0] = "up"
+        return await client.create_payment_async({}, idempotence_key="pay-4")
+
+    assert asyncio.run(scenario()) == {"id": "yk-4"}
+    assert breaker.state == CircuitBreaker.CLOSED
\ No newline at end of file
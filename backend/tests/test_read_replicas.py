@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine, insert, select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import declarative_base
+
+from app.core.database import ReplicaLagMonitor, RoutingSession
+
+Base = declarative_base()
+
+class Mark(Base):
+    __tablename__ = "marks"
+    id = Column(Integer, primary_key=True)
+    source = Column(String(16))
+
+metadata = Base.metadata
+marks = Mark.__table__
+
+class FixedLagMonitor(ReplicaLagMonitor):
+    def __init__(self, lag: float):
+        super().__init__(max_lag=5.0, check_interval=0)
+        self.fixed_lag = lag
+
+    def _measure(self, replica) -> float:
+        return self.fixed_lag
+
+def make_engine(path, source: str):
+    """SQLite-файл вместо отдельного сервера; строка source показывает, откуда пришло чтение"""
+    engine = create_engine(f"sqlite:///{path}")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(marks).values(source=source))
+    return engine
+
+def read_source(db) -> str:
+    return db.execute(select(marks.c.source).order_by(marks.c.id)).scalars().first()
+
+def test_reads_go_to_replica(tmp_path):
+    """Тест: чтение с реплики, запись и последующее чтение - с основной"""
+    primary = make_engine(tmp_path / "primary.db", "primary")
+    replica = make_engine(tmp_path / "replica.db", "replica")
+
+    db = RoutingSession(primary=primary, replicas=[replica], lag_monitor=FixedLagMonitor(0))
+    try:
+        assert read_source(db) == "replica"
+
+        db.execute(insert(marks).values(source="written"))
+        assert read_source(db) == "primary"
+        db.commit()
+    finally:
+        db.close()
+
+    with primary.connect() as conn:
+        assert conn.execute(select(marks.c.source).where(marks.c.source == "written")).scalar() == "written"
+
+def test_lagging_replica_falls_back_to_primary(tmp_path):
+    """Тест: отстающая реплика пропускается, без реплик и с use_primary - основная"""
+    primary = make_engine(tmp_path / "primary.db", "primary")
+    replica = make_engine(tmp_path / "replica.db", "replica")
+
+    lagging = RoutingSession(primary=primary, replicas=[replica], lag_monitor=FixedLagMonitor(60))
+    no_replicas = RoutingSession(primary=primary, replicas=[])
+    forced = RoutingSession(primary=primary, replicas=[replica], lag_monitor=FixedLagMonitor(0), use_primary=True)
+
+    for db in (lagging, no_replicas, forced):
+        try:
+            assert read_source(db) == "primary"
+        finally:
+            db.close()
+
+def test_read_only_session_refuses_flush(tmp_path):
+    """Тест: сессия только для чтения читает, но не сохраняет изменения"""
+    primary = make_engine(tmp_path / "primary.db", "primary")
+
+    db = RoutingSession(primary=primary, replicas=[], read_only=True)
+    try:
+        assert read_source(db) == "primary"
+
+        db.add(Mark(source="written"))
+        with pytest.raises(InvalidRequestError):
+            db.flush()
+    finally:
+        db.close()
\ No newline at end of file
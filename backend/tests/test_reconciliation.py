@@ -0,0 +1,54 @@
+import io
+
+import pandas as pd
+
+from app.services.statement_matching import parse_mt940, parse_statement_csv, reconcile
+
+def make_payments(rows):
+    frame = pd.DataFrame(rows, columns=["payment_id", "transaction_id", "reference_number", "amount_cents", "payment_date"])
+    frame["transaction_id"] = frame["transaction_id"].astype("string")
+    frame["reference_number"] = frame["reference_number"].astype("string")
+    frame["payment_date"] = pd.to_datetime(frame["payment_date"])
+    return frame
+
+def test_reconcile_by_ids_and_amount():
+    """Тест сверки: по transaction_id, по reference_number, по сумме и дате, неоднозначные и лишние строки"""
+    statement = parse_statement_csv(io.StringIO(
+        "transaction_id,reference_number,amount,date\n"
+        "tx-1,,1500.00,2024-03-01\n"
+        ',REF-2,"2 000,50",2024-03-01\n'
+        ",,700.00,2024-03-03\n"
+        ",,900.00,2024-03-05\n"
+        ",,123.45,2024-03-05\n"
+    ))
+    payments = make_payments([
+        ("p1", "tx-1", None, 150000, "2024-03-01"),
+        ("p2", None, "REF-2", 200050, "2024-03-02"),
+        ("p3", None, None, 70000, "2024-03-01"),
+        ("p4", None, None, 90000, "2024-03-04"),
+        ("p5", None, None, 90000, "2024-03-06"),
+        ("p6", None, None, 55500, "2024-03-05"),
+    ])
+
+    result = reconcile(statement, payments, date_tolerance_days=2)
+
+    matched = dict(zip(result.matched["line_id"], result.matched["payment_id"]))
+    assert matched == {0: "p1", 1: "p2", 2: "p3"}
+    assert set(result.matched["match_type"]) == {"transaction_id", "reference_number", "amount_date"}
+    assert set(result.ambiguous["payment_id"]) == {"p4", "p5"}
+    assert list(result.unmatched_statement["line_id"]) == [4]
+    assert list(result.unmatched_payments["payment_id"]) == ["p6"]
+
+def test_parse_mt940_credits_only():
+    """Тест разбора MT940: берутся поступления, списания пропускаются"""
+    statement = parse_mt940(
+        ":20:STATEMENT\n"
+        ":61:2403010301C1500,00NTRFtx-1//BANK-1\n"
+        ":86:Оплата счета\n"
+        ":61:2403010301D99,90NTRFfee\n"
+    )
+
+    assert len(statement) == 1
+    assert statement.iloc[0]["transaction_id"] == "tx-1"
+    assert statement.iloc[0]["reference_number"] == "BANK-1"
+    assert statement.iloc[0]["amount_cents"] == 150000
\ No newline at end of file
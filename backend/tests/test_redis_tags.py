@@ -0,0 +1,52 @@
+import fakeredis
+import pytest
+
+from app.core import redis_client as redis_module
+from app.core.redis_client import RedisService, _INVALIDATE_TAGS, _SET_WITH_TAGS
+
+@pytest.fixture
+def redis(monkeypatch):
+    """Сервис кэша на fakeredis; Lua-скрипты регистрируются на том же клиенте"""
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis_module, "redis_client", client)
+    monkeypatch.setattr(RedisService, "_set_with_tags", client.register_script(_SET_WITH_TAGS))
+    monkeypatch.setattr(RedisService, "_invalidate_tags", client.register_script(_INVALIDATE_TAGS))
+    return client
+
+def test_invalidate_tags_removes_only_tagged_entries(redis):
+    """Тест: сбрасываются ровно записи с тегом, остальные остаются"""
+    RedisService.cache_set("report:march", {"total": 1}, ttl=60, tags=["day:2024-03-05"])
+    RedisService.cache_set("report:q1", {"total": 2}, ttl=600, tags=["day:2024-03-05", "day:2024-01-10"])
+    RedisService.cache_set("report:january", {"total": 3}, ttl=60, tags=["day:2024-01-10"])
+    RedisService.cache_set("patients:list", {"count": 4}, ttl=60)
+
+    assert redis.ttl("tag:day:2024-03-05") >= 600
+
+    removed = RedisService.invalidate_tags("day:2024-03-05")
+
+    assert sorted(removed) == ["report:march", "report:q1"]
+    assert RedisService.cache_get("report:march") is None
+    assert RedisService.cache_get("report:q1") is None
+    assert RedisService.cache_get("report:january") == {"total": 3}
+    assert RedisService.cache_get("patients:list") == {"count": 4}
+    assert not redis.exists("tag:day:2024-03-05")
+    assert RedisService.invalidate_tags() == []
+
+def test_invalidate_pattern_unlinks_scanned_keys_in_batches(redis, monkeypatch):
+    """Тест: очистка по шаблону удаляет найденные SCAN ключи пачками не больше SCAN_BATCH_SIZE"""
+    monkeypatch.setattr(redis_module, "SCAN_BATCH_SIZE", 3)
+    for i in range(8):
+        redis.set(f"cache:report:{i}", b"x")
+    redis.set("cache:patients:list", b"x")
+    redis.set("report:0", b"x")
+
+    batches = []
+    unlink = redis.unlink
+    monkeypatch.setattr(redis, "unlink", lambda *keys: batches.append(len(keys)) or unlink(*keys))
+
+    assert RedisService.invalidate_pattern("report:*") == 8
+
+    assert sum(batches) == 8
+    assert max(batches) <= 3
+    assert redis.keys("cache:report:*") == []
+    assert redis.exists("cache:patients:list", "report:0") == 2
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+from datetime import date, timedelta
+
+import fakeredis
+import pytest
+
+from app.core import local_cache
+from app.core import redis_client as redis_module
+from app.core.config import settings
+from app.core.local_cache import LocalCache, TwoTierCache
+from app.core.redis_client import RedisService, _INVALIDATE_TAGS, _SET_WITH_TAGS
+from app.services import report_cache
+from app.services.report_cache import ReportCache, make_report_key, report_ttl
+
+def test_report_key_ignores_param_order():
+    """Тест стабильности ключа кэша отчета"""
+    key_a = make_report_key("financial_overview", {"start_date": date(2024, 1, 1), "group_by": "day"})
+    key_b = make_report_key("financial_overview", {"group_by": "day", "start_date": date(2024, 1, 1)})
+    key_c = make_report_key("financial_overview", {"group_by": "month", "start_date": date(2024, 1, 1)})
+
+    assert key_a == key_b
+    assert key_a != key_c
+    assert key_a.startswith("report:financial_overview:")
+
+def test_report_ttl_by_period():
+    """Тест TTL: закрытый период - долгий, период с сегодняшним днем - короткий"""
+    today = date(2024, 6, 15)
+
+    closed = report_ttl(date(2024, 5, 1), date(2024, 5, 31), today=today)
+    open_period = report_ttl(date(2024, 6, 1), today, today=today)
+    future = report_ttl(date(2024, 6, 1), today + timedelta(days=10), today=today)
+
+    assert closed == settings.REPORT_CACHE_CLOSED_TTL
+    assert open_period == settings.REPORT_CACHE_OPEN_TTL
+    assert future == settings.REPORT_CACHE_OPEN_TTL
+    assert closed > open_period
+
+@pytest.fixture
+def redis(monkeypatch):
+    """Кэш отчетов на fakeredis; копия в памяти включена без потока подписки"""
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis_module, "redis_client", client)
+    monkeypatch.setattr(local_cache, "redis_client", client)
+    monkeypatch.setattr(RedisService, "_set_with_tags", client.register_script(_SET_WITH_TAGS))
+    monkeypatch.setattr(RedisService, "_invalidate_tags", client.register_script(_INVALIDATE_TAGS))
+
+    cache = TwoTierCache(LocalCache(max_bytes=1 << 20), local_ttl=30)
+    cache._listener_pid = os.getpid()
+    cache._subscribed = True
+    monkeypatch.setattr(report_cache, "two_tier_cache", cache)
+    return client
+
+def counting(result):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return result
+    return compute, calls
+
+MARCH = (date(2024, 3, 1), date(2024, 3, 31))
+APRIL = (date(2024, 4, 1), date(2024, 4, 30))
+
+def test_invalidate_day_drops_only_reports_with_that_day(redis):
+    """Тест: счет за день сбрасывает отчеты с этим днем в периоде и aging, остальные остаются"""
+    march, march_calls = counting({"total": 1})
+    april, april_calls = counting({"total": 2})
+    aging, aging_calls = counting({"buckets": []})
+
+    for _ in range(2):
+        assert ReportCache.get_or_compute("financial_overview", {"p": "march"}, march, period=MARCH) == {"total": 1}
+        assert ReportCache.get_or_compute("financial_overview", {"p": "april"}, april, period=APRIL) == {"total": 2}
+        assert ReportCache.get_or_compute("aging", {}, aging, ttl=300) == {"buckets": []}
+    assert (len(march_calls), len(april_calls), len(aging_calls)) == (1, 1, 1)
+
+    ReportCache.invalidate_day(date(2024, 3, 15))
+
+    ReportCache.get_or_compute("financial_overview", {"p": "march"}, march, period=MARCH)
+    ReportCache.get_or_compute("financial_overview", {"p": "april"}, april, period=APRIL)
+    ReportCache.get_or_compute("aging", {}, aging, ttl=300)
+    assert (len(march_calls), len(april_calls), len(aging_calls)) == (2, 1, 2)
+
+def test_only_aging_gets_report_type_tag(redis):
+    """Тест: множество тега типа создается только для aging, который по нему сбрасывается"""
+    ReportCache.get_or_compute("financial_overview", {}, counting({"total": 1})[0], period=MARCH)
+    ReportCache.get_or_compute("aging", {}, counting({"buckets": []})[0], ttl=300)
+
+    assert not redis.exists("tag:report-type:financial_overview")
+    assert redis.exists("tag:report-type:aging")
+    assert redis.exists("tag:invoice-day:2024-03-31")
+
+def test_report_with_errors_is_not_cached(redis):
+    """Тест: отчет с упавшими секциями пересчитывается следующим запросом"""
+    compute, calls = counting({"total": None, "errors": {"revenue": "timeout"}})
+
+    ReportCache.get_or_compute("financial_overview", {}, compute, period=MARCH)
+    ReportCache.get_or_compute("financial_overview", {}, compute, period=MARCH)
+
+    assert len(calls) == 2
+    assert redis.keys("cache:*") == []
\ No newline at end of file
@@ -0,0 +1,78 @@
+import fakeredis
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.services import webhook_inbox
+from app.services.webhook_inbox import MAX_DELIVERIES, WEBHOOK_DEAD_LETTER_STREAM, WEBHOOK_GROUP, WEBHOOK_STREAM, WebhookInbox
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(webhook_inbox, "redis_client", client)
+    WebhookInbox.ensure_group()
+    return client
+
+def test_transient_error_leaves_event_for_redelivery(redis, monkeypatch):
+    """Тест: отказ - в dead letter, временная ошибка БД - событие остается в очереди и повторяется"""
+    for tx in ("ok", "unknown-invoice", "db-down", "after"):
+        WebhookInbox.append({"event": "payment.succeeded", "object": {"id": tx}})
+
+    def apply_with_outage(payload):
+        tx = payload["object"]["id"]
+        if tx == "unknown-invoice":
+            return False, "Invoice not found"
+        if tx == "db-down":
+            raise OperationalError("SELECT 1", {}, Exception("server closed the connection unexpectedly"))
+        return True, "Payment processed successfully"
+
+    assert WebhookInbox.drain(apply_with_outage, "worker-1") == 3
+
+    dead = redis.xrange(WEBHOOK_DEAD_LETTER_STREAM)
+    assert [fields[b"error"] for _, fields in dead] == [b"Invoice not found"]
+    # Не подтверждено только событие с ошибкой, следующее за ним применено
+    assert redis.xpending(WEBHOOK_STREAM, WEBHOOK_GROUP)["pending"] == 1
+
+    monkeypatch.setattr(webhook_inbox, "CLAIM_IDLE_MS", 0)
+    applied = []
+    assert WebhookInbox.drain(lambda payload: (applied.append(payload["object"]["id"]) or True, "ok"), "worker-2") == 1
+
+    assert applied == ["db-down"]
+    assert redis.xpending(WEBHOOK_STREAM, WEBHOOK_GROUP)["pending"] == 0
+    assert redis.xlen(WEBHOOK_DEAD_LETTER_STREAM) == 1
+
+def test_unexpected_error_is_dead_lettered(redis):
+    """Тест: постоянная ошибка (неверные данные) не блокирует очередь"""
+    WebhookInbox.append({"event": "payment.succeeded", "object": {"amount": "abc"}})
+
+    def apply_bad_payload(payload):
+        raise ValueError("invalid amount")
+
+    assert WebhookInbox.drain(apply_bad_payload, "worker-1") == 1
+    assert redis.xpending(WEBHOOK_STREAM, WEBHOOK_GROUP)["pending"] == 0
+    assert redis.xlen(WEBHOOK_DEAD_LETTER_STREAM) == 1
+
+def test_event_failing_every_time_is_dead_lettered(redis, monkeypatch):
+    """Тест: вечная временная ошибка одного события не останавливает очередь"""
+    monkeypatch.setattr(webhook_inbox, "CLAIM_IDLE_MS", 0)
+    WebhookInbox.append({"event": "payment.succeeded", "object": {"id": "deadlock"}})
+
+    applied = []
+
+    def apply_with_deadlock(payload):
+        tx = payload["object"]["id"]
+        if tx == "deadlock":
+            raise OperationalError("UPDATE invoices", {}, Exception("deadlock detected"))
+        applied.append(tx)
+        return True, "Payment processed successfully"
+
+    for run in range(1, MAX_DELIVERIES + 1):
+        # Зависшее событие забирается первым, новые за ним все равно применяются
+        WebhookInbox.append({"event": "payment.succeeded", "object": {"id": f"tx-{run}"}})
+        WebhookInbox.drain(apply_with_deadlock, "worker-1")
+        assert applied[-1] == f"tx-{run}"
+        assert redis.xlen(WEBHOOK_DEAD_LETTER_STREAM) == (1 if run == MAX_DELIVERIES else 0)
+
+    dead = redis.xrange(WEBHOOK_DEAD_LETTER_STREAM)
+    assert dead[0][1][b"error"].startswith(b"Retries exhausted")
+    assert applied == [f"tx-{run}" for run in range(1, MAX_DELIVERIES + 1)]
+    assert redis.xpending(WEBHOOK_STREAM, WEBHOOK_GROUP)["pending"] == 0
\ No newline at end of file